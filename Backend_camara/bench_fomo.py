@@ -0,0 +1,149 @@
+"""
+Backend_camara/bench_fomo.py
+
+Verificación y benchmark del post-procesamiento FOMO en el host.
+
+1. Genera tensores FOMO sintéticos (semilla fija) con varias formas y roi.
+2. Los procesa con el port escalar línea a línea de ``fomo_post_process`` y
+   del bucle principal de ei_object_detection.py
+   (``FomoPostProcessor.process_scalar``, find_blobs y get_statistics
+   emulados en Python puro) y con la versión NumPy en lotes.
+3. Las detecciones deben coincidir exactamente; si no, lista las
+   diferencias y termina con código 1.
+4. Reporta el tiempo por tensor de cada versión y tamaño de lote, y el de
+   ``process`` (que usa el port escalar con menos de SCALAR_BATCH tensores).
+
+Con ``--capture`` también verifica los tensores de una captura de la cámara
+(.omcap de openmv_replay.py o bytes crudos) contra el port escalar.
+
+Uso:
+    python bench_fomo.py [--tensors 200] [--repeat 5]
+    python bench_fomo.py --capture captura.omcap
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from openmv_fomo import SCALAR_BATCH, FomoPostProcessor
+from openmv_protocol import BinaryFrameDecoder, FomoTensor
+
+
+SEED = 1234
+
+# (alto, ancho, clases), roi (x, y, w, h)
+SHAPES = [
+    ((12, 12, 3), (0, 0, 240, 240)),
+    ((30, 30, 4), (0, 0, 240, 240)),
+    ((15, 20, 3), (10, 5, 320, 240)),
+]
+
+BATCH_SIZES = (1, 8, 16, 64)
+
+
+def make_tensors(count, seed=SEED):
+    """Mapas de calor con ruido, manchas gaussianas y píxeles sueltos sobre el umbral"""
+    rng = np.random.default_rng(seed)
+    tensors = []
+    for index in range(count):
+        (height, width, classes), roi = SHAPES[index % len(SHAPES)]
+        heat = rng.uniform(0, 150, size=(height, width, classes))
+        yy, xx = np.mgrid[0:height, 0:width]
+        for _ in range(rng.integers(0, 6)):
+            c = rng.integers(0, classes)
+            cy, cx = rng.uniform(0, height), rng.uniform(0, width)
+            radius = rng.uniform(0.6, 3.0)
+            peak = rng.uniform(150, 255)
+            heat[..., c] = np.maximum(heat[..., c], peak * np.exp(-((yy - cy) ** 2 + (xx - cx) ** 2) / (2 * radius ** 2)))
+        salt = rng.random(heat.shape) < 0.01
+        heat[salt] = rng.uniform(180, 255, size=salt.sum())
+        data = np.clip(heat, 0, 255).astype(np.uint8).tobytes()
+        tensors.append(FomoTensor(index, 10.0, (height, width, classes), roi, data))
+    return tensors
+
+
+def read_capture(path):
+    """Tensores de una captura .omcap o de bytes crudos del puerto"""
+    from openmv_replay import MAGIC, iter_capture
+
+    tensors = []
+    decoder = BinaryFrameDecoder(on_tensor=tensors.append)
+    with open(path, 'rb') as f:
+        is_capture = f.read(len(MAGIC)) == MAGIC
+    if is_capture:
+        for _, chunk in iter_capture(path):
+            decoder.feed(chunk)
+    else:
+        with open(path, 'rb') as f:
+            decoder.feed(f.read())
+    return tensors
+
+
+def compare(tensors, processor):
+    """Diferencias entre el port escalar y la versión NumPy (``processor`` con scalar_batch=1)"""
+    expected = [processor.process_scalar(tensor) for tensor in tensors]
+    actual = processor.process(tensors)
+    mismatches = []
+    for tensor, want, got in zip(tensors, expected, actual):
+        if [tuple(d) for d in got] != want:
+            mismatches.append((tensor.seq, tensor.shape, want, got))
+    detections = sum(len(want) for want in expected)
+    return mismatches, detections
+
+
+def measure(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        func()
+        samples.append(time.perf_counter_ns() - start)
+    return min(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument('--tensors', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--confidence', type=float, default=0.7)
+    parser.add_argument('--capture', help='verificar también los tensores de una captura')
+    args = parser.parse_args()
+
+    # Siempre NumPy (sin el atajo escalar de lotes chicos) y el comportamiento por defecto
+    processor = FomoPostProcessor(args.confidence, scalar_batch=1)
+    auto = FomoPostProcessor(args.confidence)
+    tensors = make_tensors(args.tensors)
+
+    mismatches, detections = compare(tensors, processor)
+    print(f"Sinteticos: {len(tensors)} tensores, {detections} detecciones, {len(mismatches)} diferencias")
+
+    if args.capture:
+        captured = read_capture(args.capture)
+        capture_mismatches, capture_detections = compare(captured, processor)
+        print(f"Captura: {len(captured)} tensores, {capture_detections} detecciones, "
+              f"{len(capture_mismatches)} diferencias")
+        mismatches += capture_mismatches
+
+    for seq, shape, want, got in mismatches[:10]:
+        print(f"  tensor {seq} {shape}:\n    camara: {want}\n    host:   {[tuple(d) for d in got]}")
+
+    print(f"\n{'version':24} {'us/tensor':>10}")
+    elapsed = measure(lambda: [processor.process_scalar(t) for t in tensors], args.repeat)
+    print(f"{'escalar (camara)':24} {elapsed / len(tensors) / 1000.0:>10.1f}")
+    for size in BATCH_SIZES:
+        batches = [tensors[i:i + size] for i in range(0, len(tensors), size)]
+        elapsed = measure(lambda: [processor.process(batch) for batch in batches], args.repeat)
+        print(f"{f'numpy lote {size}':24} {elapsed / len(tensors) / 1000.0:>10.1f}")
+    for size in BATCH_SIZES:
+        batches = [tensors[i:i + size] for i in range(0, len(tensors), size)]
+        elapsed = measure(lambda: [auto.process(batch) for batch in batches], args.repeat)
+        print(f"{f'process lote {size}':24} {elapsed / len(tensors) / 1000.0:>10.1f}")
+    print(f"(process usa el port escalar con menos de {SCALAR_BATCH} tensores de la misma forma)")
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+Backend_camara/bench_ingestion.py
+
+Microbenchmarks de CPU de la ruta de ingestión (sin puerto serie ni red).
+
+Genera flujos sintéticos en el formato de ei_object_detection.py (y en el
+protocolo binario) con semilla fija y mide cada etapa por separado: división
+en líneas, parseo de frames, aplicación + alertas y codificación de los
+mensajes websocket. Reporta tiempo por línea y por frame, el techo de frames
+por segundo de cada etapa y la memoria pico asignada.
+
+Los resultados se comparan con una línea base guardada en
+bench_ingestion_baseline.json; una etapa más lenta que la tolerancia se marca
+como REGRESION y el programa termina con código 1.
+
+Uso:
+    python bench_ingestion.py [--frames 2000] [--repeat 7]
+    python bench_ingestion.py --save-baseline
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from openmv_devices import CameraDevice
+from openmv_encoding import available_encodings, compute_delta, encode
+from openmv_frames import FrameAssembler
+from openmv_protocol import BinaryFrameDecoder, encode_frame, encode_labels
+from openmv_serial import LineSplitter
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_ingestion_baseline.json')
+SEED = 1234
+CHUNK_SIZE = 4096
+
+# nombre: (detecciones por frame, fracción de líneas malformadas, etiquetas distintas)
+SCENARIOS = {
+    'simple': (1, 0.0, 1),
+    'muchas_detecciones': (40, 0.0, 4),
+    'malformadas': (3, 0.2, 4),
+    'cambio_etiquetas': (3, 0.0, 100),
+}
+
+
+def make_stream(frames, detections, malformed, labels, seed=SEED):
+    """Texto tal como lo imprime la cámara; devuelve (bytes, líneas, frames binarios)"""
+    rng = random.Random(seed)
+    names = [f"nivel_{(i * 7) % 101}" for i in range(labels)]
+    lines = []
+    binary = [encode_labels(0, names)]
+
+    for seq in range(frames):
+        frame_labels = rng.sample(names, min(len(names), 2))
+        records = []
+        for label in frame_labels:
+            lines.append(f"********** {label} **********")
+            for _ in range(max(1, detections // len(frame_labels))):
+                x, y, score = rng.randrange(320), rng.randrange(240), rng.random()
+                records.append((names.index(label), x, y, 8, 8, score))
+                if rng.random() < malformed:
+                    lines.append(rng.choice(["x \ty", "x abc\ty 1\tscore z", "x 1 y 2 score 3"]))
+                else:
+                    lines.append(f"x {x}\ty {y}\tscore {score:.2f}")
+        if rng.random() < malformed:
+            lines.append("FPS: ???")
+        lines.append(f"FPS: {rng.uniform(1, 30):.2f}")
+        lines.append("")
+        binary.append(encode_frame(seq + 1, 10.0, records))
+
+    raw = ("\n".join(lines) + "\n").encode()
+    return raw, lines, b''.join(binary)
+
+
+def chunks_of(raw, size=CHUNK_SIZE):
+    return [raw[i:i + size] for i in range(0, len(raw), size)]
+
+
+def collect_frames(lines):
+    assembler = FrameAssembler()
+    frames = []
+    for line in lines:
+        frame = assembler.feed(line)
+        if frame:
+            frames.append(frame)
+    return frames
+
+
+def make_payloads(frames):
+    """Mensajes tank_data / tank_delta como los construye el servidor"""
+    device = CameraDevice('bench', None)
+    device.is_monitoring = True
+    payloads = []
+    previous = None
+    for frame in frames:
+        device.apply_frame(frame)
+        data = device.snapshot()
+        payloads.append(({'type': 'tank_data', 'device_id': 'bench', 'seq': device.frame_seq, 'data': data}, previous))
+        previous = data
+    return payloads
+
+
+def stages(raw, lines, binary, frames):
+    """Etapas a medir: nombre -> función sin argumentos que procesa todo el flujo"""
+    chunks = chunks_of(raw)
+    binary_chunks = chunks_of(binary)
+    payloads = make_payloads(frames)
+
+    def split():
+        splitter = LineSplitter()
+        for chunk in chunks:
+            splitter.feed(chunk)
+
+    def parse():
+        assembler = FrameAssembler()
+        for line in lines:
+            assembler.feed(line)
+
+    def alerts():
+        device = CameraDevice('bench', None)
+        device.is_monitoring = True
+        for frame in frames:
+            device.apply_frame(frame)
+            device.check_alerts()
+
+    def binary_decode():
+        decoder = BinaryFrameDecoder()
+        for chunk in binary_chunks:
+            decoder.feed(chunk)
+
+    def make_encoder(encoding):
+        def run():
+            for payload, _ in payloads:
+                encode(payload, encoding)
+        return run
+
+    def delta():
+        for payload, previous in payloads:
+            encode({'type': 'tank_delta', 'data': compute_delta(previous, payload['data'])}, 'json')
+
+    result = {
+        'split': split,
+        'parse': parse,
+        'alertas': alerts,
+        'binario': binary_decode,
+        'json': make_encoder('json'),
+        'delta_json': delta,
+    }
+    if 'msgpack' in available_encodings():
+        result['msgpack'] = make_encoder('msgpack')
+    return result
+
+
+def measure(func, repeat):
+    """Mejor tiempo de ``repeat`` ejecuciones en ns (con el GC desactivado)
+
+    El mínimo es el estimador más estable frente al ruido de otros procesos.
+    """
+    func()
+    samples = []
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter_ns()
+            func()
+            samples.append(time.perf_counter_ns() - start)
+    finally:
+        gc.enable()
+    return min(samples)
+
+
+def measure_peak_memory(func):
+    """Memoria pico asignada (tracemalloc) durante una ejecución, en bytes"""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(frames, repeat):
+    results = {}
+    for name, (detections, malformed, labels) in SCENARIOS.items():
+        raw, lines, binary = make_stream(frames, detections, malformed, labels)
+        parsed = collect_frames(lines)
+        for stage, func in stages(raw, lines, binary, parsed).items():
+            elapsed = measure(func, repeat)
+            per_frame = elapsed / max(1, len(parsed))
+            results[f"{name}/{stage}"] = {
+                'ns_linea': round(elapsed / max(1, len(lines)), 1),
+                'us_frame': round(per_frame / 1000.0, 3),
+                'frames_s': int(1e9 / per_frame) if per_frame else 0,
+                'pico_kib': round(measure_peak_memory(func) / 1024.0, 1),
+            }
+    return results
+
+
+def machine_info():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'processor': platform.processor() or platform.machine(),
+    }
+
+
+def print_results(results, baseline, tolerance, frames):
+    """Tabla de resultados; devuelve la lista de regresiones"""
+    reference = (baseline or {}).get('results', {})
+    regressions = []
+
+    print(f"{'escenario/etapa':34} {'ns/linea':>10} {'us/frame':>10} {'frames/s':>11} {'pico KiB':>9} {'vs base':>9}")
+    for key, row in results.items():
+        compare = ''
+        base = reference.get(key)
+        if base and base['us_frame']:
+            change = row['us_frame'] / base['us_frame'] - 1
+            compare = f"{change:+.0%}"
+            if change > tolerance:
+                compare += ' REGRESION'
+                regressions.append(key)
+        print(f"{key:34} {row['ns_linea']:>10} {row['us_frame']:>10} {row['frames_s']:>11} {row['pico_kib']:>9} {compare:>9}")
+
+    if baseline and baseline.get('frames') != frames:
+        print(f"\nAviso: la linea base usa --frames {baseline.get('frames')}; los tiempos no son comparables")
+    if baseline and baseline.get('machine') != machine_info():
+        print("\nAviso: la linea base se midio en otra maquina/version de Python:")
+        print(f"  {baseline.get('machine')}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument('--frames', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='aumento relativo de us/frame considerado regresion')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args()
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = run(args.frames, args.repeat)
+    regressions = print_results(results, None if args.save_baseline else baseline, args.tolerance, args.frames)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({
+                'machine': machine_info(),
+                'frames': args.frames,
+                'repeat': args.repeat,
+                'results': results
+            }, f, indent=2)
+        print(f"\nLinea base guardada en {args.baseline}")
+    elif regressions:
+        print(f"\n{len(regressions)} etapa(s) con regresion (> {args.tolerance:.0%})")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Backend_camara/bench_serial_latency.py
+
+Benchmark de latencia serie -> websocket del servidor OpenMV.
+
+Crea un pseudo-terminal (solo POSIX) que simula la cámara, escribe frames en
+el formato de ei_object_detection.py y mide cuánto tarda cada frame en llegar
+a un cliente websocket simulado. Compara el lector antiguo (hilo que sondea
+``in_waiting`` y duerme 100 ms) con el transporte actual del event loop.
+
+Uso:
+    python bench_serial_latency.py [--frames 200] [--interval 0.02]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import statistics
+import time
+import tty
+import serial
+from threading import Thread
+
+from openmv_server import OpenMVServer
+
+
+class FakeClient:
+    """Cliente websocket simulado que registra la hora de cada envío"""
+
+    remote_address = ('bench', 0)
+
+    def __init__(self):
+        self.waiters = {}
+
+    async def send(self, message):
+        if isinstance(message, bytes):
+            return
+        data = json.loads(message)
+        if data.get('type') != 'tank_data':
+            return
+        percentage = data['data'].get('percentage')
+        future = self.waiters.pop(percentage, None)
+        if future and not future.done():
+            future.set_result(time.perf_counter())
+
+
+class LegacyPollingReader:
+    """Réplica del read_openmv_data original (hilo + sondeo + hop por línea)"""
+
+    def __init__(self, device):
+        self.device = device
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=2)
+
+    def run(self):
+        device = self.device
+        while self.running:
+            try:
+                if device.serial_connection.in_waiting:
+                    line = device.serial_connection.readline().decode('utf-8', errors='ignore').strip()
+                    device.loop.call_soon_threadsafe(device.process_line, line)
+                else:
+                    time.sleep(0.1)
+            except Exception:
+                time.sleep(0.5)
+
+
+def frame_bytes(percentage, fps):
+    """Construir un frame en el formato de ei_object_detection.py"""
+    return (
+        f"********** nivel_{percentage} **********\n"
+        f"x 120\ty 96\tscore 0.912\n"
+        f"FPS: {fps:.2f}\n"
+        f"\n"
+    ).encode()
+
+
+async def run_mode(mode, frames, interval):
+    """Medir latencias y CPU para un modo de lectura"""
+    master, slave = os.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+    port = os.ttyname(slave)
+
+    server = OpenMVServer(db_path=None)
+    server.loop = server.devices.loop = asyncio.get_running_loop()
+    server.is_running = True
+    server.is_monitoring = True
+
+    device = server.devices.add('bench', port)
+    device.serial_connection = serial.Serial(port, 115200, timeout=3)
+
+    client = FakeClient()
+    server.broadcaster.add(client)
+
+    if mode == 'antes':
+        device.is_monitoring = True
+        reader = LegacyPollingReader(device)
+        reader.start()
+    else:
+        reader = None
+        device.start_reading()
+
+    latencies = []
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+
+    for i in range(frames):
+        percentage = i % 100
+        future = server.loop.create_future()
+        client.waiters[percentage] = future
+
+        sent_at = time.perf_counter()
+        os.write(master, frame_bytes(percentage, 2.0 + i % 7))
+
+        try:
+            received_at = await asyncio.wait_for(future, timeout=2)
+            latencies.append((received_at - sent_at) * 1000)
+        except asyncio.TimeoutError:
+            client.waiters.pop(percentage, None)
+
+        await asyncio.sleep(interval)
+
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    # CPU en reposo: un segundo sin datos
+    idle_start = time.process_time()
+    await asyncio.sleep(1.0)
+    idle_cpu = time.process_time() - idle_start
+
+    if reader:
+        reader.stop()
+    device.close()
+    os.close(master)
+    os.close(slave)
+
+    return latencies, cpu / wall, idle_cpu, frames - len(latencies)
+
+
+def report(mode, latencies, cpu_ratio, idle_cpu, lost):
+    if not latencies:
+        print(f"{mode:>8}: sin datos ({lost} frames perdidos)")
+        return
+    ordered = sorted(latencies)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    print(
+        f"{mode:>8}: p50 {statistics.median(ordered):7.2f} ms  "
+        f"p95 {p95:7.2f} ms  max {ordered[-1]:7.2f} ms  "
+        f"CPU {cpu_ratio * 100:5.1f}%  CPU reposo {idle_cpu * 1000:6.1f} ms/s  "
+        f"perdidos {lost}"
+    )
+
+
+async def main(frames, interval):
+    results = {}
+    for mode in ('antes', 'despues'):
+        with contextlib.redirect_stdout(io.StringIO()):
+            results[mode] = await run_mode(mode, frames, interval)
+
+    print("\n" + "="*50)
+    print("LATENCIA SERIE -> WEBSOCKET")
+    print("="*50)
+    for mode, result in results.items():
+        report(mode, *result)
+    print("="*50 + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--interval', type=float, default=0.02)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.frames, args.interval))
@@ -1,12 +1,13 @@
 import serial.tools.list_ports
-import serial
-import time
+
+from openmv_discovery import PortCache, match_port, probe_ports, usb_ids
 
 print("\n" + "="*60)
 print("DIAGNOSTICO DE PUERTOS SERIALES - OpenMV Cam RT1062")
 print("="*60 + "\n")
 
 ports = serial.tools.list_ports.comports()
+cache = PortCache()
 
 if not ports:
     print("ERROR: No se encontraron puertos seriales")
@@ -16,45 +17,49 @@ if not ports:
     print("  - Prueba otro puerto USB")
 else:
     print(f"Se encontraron {len(ports)} puerto(s):\n")
-    
+
+    # Probar en paralelo todos los candidatos (handshake con la salida OpenMV)
+    ids = usb_ids()
+    matches = {port.device: match_port(port, ids) for port in ports}
+    results = probe_ports([device for device, match in matches.items() if match])
+    cached_ports = {entry['port']: device_id for device_id, entry in cache.entries.items()}
+
     for i, port in enumerate(ports, 1):
         print(f"Puerto #{i}: {port.device}")
         print(f"  Descripcion: {port.description}")
         print(f"  HWID: {port.hwid}")
-        
-        # Detectar OpenMV
-        desc = port.description.lower()
-        hwid = port.hwid.lower()
-        
-        is_openmv = any(kw in desc or kw in hwid 
-                       for kw in ['openmv', 'stm32', 'usb serial', 'ch340'])
-        
-        if is_openmv:
-            print(f"  >>> POSIBLE OPENMV DETECTADA <<<")
-            
-            # Intentar conectar
-            print(f"  Probando conexion a {port.device}...")
-            try:
-                ser = serial.Serial(port.device, 115200, timeout=1)
-                time.sleep(1)
-                
-                if ser.in_waiting > 0:
-                    data = ser.read(min(ser.in_waiting, 100))
-                    print(f"  ESTADO: Puerto responde - {len(data)} bytes recibidos")
-                    print(f"  DATOS: {data[:50]}")
-                else:
-                    print(f"  ESTADO: Puerto abierto pero sin datos")
-                    print(f"  NOTA: Ejecuta el script en la OpenMV primero")
-                
-                ser.close()
-                print(f"  RESULTADO: Conexion exitosa")
-                
-            except serial.SerialException as e:
-                print(f"  ERROR: {e}")
-                if "PermissionError" in str(e) or "denegado" in str(e).lower():
+        if port.vid is not None or port.pid is not None:
+            # Puertos sin USB completo (ttyS*, Bluetooth) pueden traer solo uno de los dos
+            vid = f"{port.vid:04X}" if port.vid is not None else '----'
+            pid = f"{port.pid:04X}" if port.pid is not None else '----'
+            print(f"  VID:PID: {vid}:{pid}  Serie: {port.serial_number or '-'}")
+        if port.device in cached_ports:
+            print(f"  Ultimo puerto conocido de la camara {cached_ports[port.device]}")
+
+        match = matches[port.device]
+        if match:
+            if match == 'usb_id':
+                print(f"  >>> OPENMV DETECTADA (VID/PID) <<<")
+            else:
+                print(f"  >>> POSIBLE OPENMV DETECTADA (descripcion) <<<")
+
+            result = results[port.device]
+            if result['error']:
+                print(f"  ERROR: {result['error']}")
+                if "PermissionError" in result['error'] or "denegado" in result['error'].lower():
                     print(f"  CAUSA: Puerto ocupado por VS Code u otro programa")
                     print(f"  SOLUCION: Desconecta la extension OpenMV en VS Code")
-        
+            elif result['protocol']:
+                print(f"  ESTADO: Salida OpenMV reconocida (protocolo {result['protocol']})")
+                print(f"  DATOS: {result['sample'][:50]}")
+                print(f"  RESULTADO: Conexion exitosa")
+            elif result['bytes']:
+                print(f"  ESTADO: Puerto responde - {result['bytes']} bytes, formato no reconocido")
+                print(f"  DATOS: {result['sample'][:50]}")
+            else:
+                print(f"  ESTADO: Puerto abierto pero sin datos")
+                print(f"  NOTA: Ejecuta el script en la OpenMV primero")
+
         print()
 
 print("="*60)
@@ -64,4 +69,4 @@ print("1. Identifica el puerto donde esta la OpenMV")
 print("2. Ejecuta el script ei_object_detection.py en VS Code")
 print("3. DESCONECTA la extension OpenMV (boton Disconnect)")
 print("4. Ejecuta: python openmv_server.py")
-print("="*60 + "\n")
\ No newline at end of file
+print("="*60 + "\n")
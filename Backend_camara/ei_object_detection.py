@@ -1,7 +1,28 @@
 # ei_object_detection.py - CORREGIDO PARA GRAYSCALE
 # Edge Impulse - OpenMV FOMO Object Detection con escala de grises
 
-import sensor, image, time, ml, math, uos, gc
+import sensor, image, time, ml, math, uos, gc, struct, sys
+from ulab import numpy as np
+
+# Formato de salida por USB:
+#   "text"   -> líneas legibles (útil para depurar en OpenMV IDE)
+#   "binary" -> registros COBS + CRC16 (ver openmv_protocol.py en el servidor)
+PROTOCOL = "text"
+
+# Vista previa JPEG anotada (solo con PROTOCOL = "binary"). Se comprime una
+# imagen cada PREVIEW_EVERY frames y se envía en fragmentos, como mucho
+# PREVIEW_BUDGET bytes por iteración y siempre después del registro de frame,
+# para que la telemetría nunca espere detrás de una imagen.
+PREVIEW = False
+PREVIEW_EVERY = 4
+PREVIEW_QUALITY = 35
+PREVIEW_CHUNK = 1024
+PREVIEW_BUDGET = 8192
+
+# Post-procesamiento FOMO en el servidor (solo con PROTOCOL = "binary"): la
+# cámara envía la salida del modelo cuantizada a 0-255 y openmv_fomo.py hace
+# umbral, blobs y scores. Libera CPU en la cámara; sin círculos en la imagen.
+FOMO_ON_HOST = False
 
 # Intentar resetear el sensor. Si falla, imprimimos una pista de depuración
 # y mantenemos el dispositivo en un bucle de espera para que puedas leer
@@ -52,6 +73,112 @@ colors = [
 
 threshold_list = [(math.ceil(min_confidence * 255), 255)]
 
+# ---- Protocolo binario (mismo formato que openmv_protocol.py) ----
+try:
+    _usb_out = sys.stdout.buffer
+except AttributeError:
+    _usb_out = sys.stdout
+
+def _crc16_table():
+    table = []
+    for index in range(256):
+        crc = index << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ 0x1021) & 0xFFFF
+            else:
+                crc = (crc << 1) & 0xFFFF
+        table.append(crc)
+    return table
+
+# Tabla de 256 entradas (una vez al arrancar): un paso por byte en vez de ocho
+CRC16_TABLE = _crc16_table()
+
+def crc16(data):
+    """CRC-16/CCITT-FALSE"""
+    table = CRC16_TABLE
+    crc = 0xFFFF
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ byte]
+    return crc
+
+def cobs_encode(data):
+    """Codificar con COBS (sin bytes 0x00)
+
+    Los bloques largos entre ceros (JPEG, tensores densos) se copian con
+    find y slices en lugar de recorrer byte a byte en Python.
+    """
+    out = bytearray()
+    start = 0
+    length = len(data)
+    while True:
+        # Bloques de 0 o 1 byte (tensor con las clases intercaladas): sin find
+        if start < length and data[start] == 0:
+            out.append(1)
+            start += 1
+            continue
+        if start + 1 < length and data[start + 1] == 0:
+            out.append(2)
+            out.append(data[start])
+            start += 2
+            continue
+        limit = min(start + 254, length)
+        zero = data.find(b"\x00", start, limit)
+        if zero >= 0:
+            out.append(zero - start + 1)
+            out += data[start:zero]
+            start = zero + 1
+            continue
+        out.append(limit - start + 1)
+        out += data[start:limit]
+        if limit - start < 254:
+            return out
+        start = limit
+
+def send_record(record_type, seq, payload):
+    """Enviar un registro: cabecera + payload + CRC, codificado con COBS y 0x00"""
+    body = struct.pack("<2sBBH", b"OM", 1, record_type, seq & 0xFFFF) + payload
+    _usb_out.write(cobs_encode(body + struct.pack("<H", crc16(body))) + b"\x00")
+
+def send_labels(seq):
+    send_record(2, seq, "\n".join(labels).encode())
+
+def send_frame(seq, fps, detections):
+    # Mismo recorte que encode_frame en el host: un valor fuera de rango no debe lanzar struct.error
+    detections = detections[:255]
+    payload = struct.pack("<HB", int(round(fps * 100)) & 0xFFFF, len(detections))
+    for class_index, x, y, w, h, score in detections:
+        payload += struct.pack(
+            "<BHHHHB", class_index & 0xFF, int(x) & 0xFFFF, int(y) & 0xFFFF, int(w) & 0xFFFF, int(h) & 0xFFFF,
+            max(0, min(255, int(round(score * 255))))
+        )
+    send_record(1, seq, payload)
+
+def send_tensor(seq, fps, heatmap, roi):
+    """Enviar la salida FOMO sin post-procesar (alto x ancho x clases, uint8)"""
+    oh, ow, oc = heatmap.shape
+    data = np.array(heatmap * 255, dtype=np.uint8).tobytes()
+    # Mismo redondeo de fps que send_frame
+    payload = struct.pack(
+        "<HBBBHHHH", int(round(fps * 100)) & 0xFFFF, oh, ow, oc,
+        roi[0] & 0xFFFF, roi[1] & 0xFFFF, roi[2] & 0xFFFF, roi[3] & 0xFFFF
+    )
+    send_record(4, seq, payload + data)
+
+def send_preview(seq, data, offset):
+    """Enviar fragmentos del JPEG desde offset; devuelve el nuevo offset"""
+    total = len(data)
+    end = min(total, offset + PREVIEW_BUDGET)
+    while offset < end:
+        chunk = bytes(data[offset:offset + PREVIEW_CHUNK])
+        send_record(3, seq, struct.pack("<II", offset, total) + chunk)
+        offset += len(chunk)
+    return offset
+
+def fomo_tensor(model, inputs, outputs):
+    """Salida FOMO sin post-procesar y la ROI real de la entrada del modelo"""
+    return outputs[0][0], inputs[0].roi
+
 def fomo_post_process(model, inputs, outputs):
     """Procesar las salidas del modelo FOMO"""
     ob, oh, ow, oc = model.output_shape[0]
@@ -86,9 +213,20 @@ def fomo_post_process(model, inputs, outputs):
 
 print("Sistema iniciado - Esperando detecciones...")
 print("Modo: GRAYSCALE")
+print("Protocolo:", PROTOCOL)
 print("=" * 50)
 
 clock = time.clock()
+frame_seq = 0
+
+# JPEG pendiente de enviar (imagen comprimida, bytes, secuencia, posición)
+preview_img = None
+preview_data = None
+preview_seq = 0
+preview_offset = 0
+
+if PROTOCOL == "binary":
+    _usb_out.write(b"\x00")  # Delimitador inicial para resincronizar el servidor
 
 while(True):
     clock.tick()
@@ -98,20 +236,32 @@ while(True):
 
     # Realizar predicción
     detections_found = False
+    binary_detections = []
     
-    for i, detection_list in enumerate(net.predict([img], callback=fomo_post_process)):
+    if PROTOCOL == "binary" and FOMO_ON_HOST:
+        # Solo inferencia: el servidor post-procesa el tensor
+        heatmap, heatmap_roi = net.predict([img], callback=fomo_tensor)
+        detection_lists = []
+    else:
+        detection_lists = net.predict([img], callback=fomo_post_process)
+
+    for i, detection_list in enumerate(detection_lists):
         if i == 0: continue  # Saltar clase background
         if len(detection_list) == 0: continue  # No hay detecciones para esta clase
         
         detections_found = True
-        print("********** %s **********" % labels[i])
+        if PROTOCOL == "text":
+            print("********** %s **********" % labels[i])
         
         for x, y, w, h, score in detection_list:
             center_x = math.floor(x + (w / 2))
             center_y = math.floor(y + (h / 2))
             
             # Imprimir detección
-            print(f"x {center_x}\ty {center_y}\tscore {score:.3f}")
+            if PROTOCOL == "text":
+                print(f"x {center_x}\ty {center_y}\tscore {score:.3f}")
+            else:
+                binary_detections.append((i, center_x, center_y, w, h, score))
             
             # Dibujar círculo en la detección (visible incluso en grayscale)
             img.draw_circle((center_x, center_y, 12), color=colors[i], thickness=2)
@@ -119,14 +269,38 @@ while(True):
             # Dibujar etiqueta
             img.draw_string(center_x - 20, center_y - 30, labels[i], color=colors[i])
 
-    # Mostrar FPS
     fps = clock.fps()
-    print(f"FPS: {fps:.2f}")
-    
-    if not detections_found:
-        print("[Sin detecciones]")
     
-    print("")  # Línea en blanco para separar frames
+    if PROTOCOL == "binary":
+        # Reenviar etiquetas periódicamente por si el servidor se conecta tarde
+        if frame_seq % 50 == 0:
+            send_labels(frame_seq)
+        frame_seq += 1
+        if FOMO_ON_HOST:
+            send_tensor(frame_seq, fps, heatmap, heatmap_roi)
+        else:
+            send_frame(frame_seq, fps, binary_detections)
+
+        if PREVIEW:
+            # La imagen ya tiene los círculos y etiquetas dibujados
+            if preview_data is None and frame_seq % PREVIEW_EVERY == 0:
+                preview_img = img.compressed(quality=PREVIEW_QUALITY)
+                preview_data = preview_img.bytearray()
+                preview_seq = frame_seq
+                preview_offset = 0
+            if preview_data is not None:
+                preview_offset = send_preview(preview_seq, preview_data, preview_offset)
+                if preview_offset >= len(preview_data):
+                    preview_img = None
+                    preview_data = None
+    else:
+        # Mostrar FPS
+        print(f"FPS: {fps:.2f}")
+        
+        if not detections_found:
+            print("[Sin detecciones]")
+        
+        print("")  # Línea en blanco para separar frames
     
     # Pequeña pausa para evitar sobrecarga
     time.sleep_ms(500) # 1 segundos entre capturas
\ No newline at end of file
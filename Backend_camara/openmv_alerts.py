@@ -0,0 +1,232 @@
+"""
+Backend_camara/openmv_alerts.py
+
+Motor de reglas de alerta incremental (una evaluación O(1) por muestra).
+
+Las reglas se leen de openmv_alerts.json (u OPENMV_ALERT_RULES) y se recargan
+con el comando ``reload_alert_rules`` sin reiniciar el servidor:
+
+    {
+      "default": [ {regla}, ... ],
+      "devices": { "<device_id>": [ {regla}, ... ] }
+    }
+
+Campos comunes de una regla:
+    id          nombre único dentro de la cámara
+    type        threshold | rate | no_detection
+    level       info | warning | critical
+    message     texto; admite {percentage} y {value}
+    min / max   la condición se cumple con min <= valor <= max
+    hysteresis  margen para desactivar: la alerta se rearma solo cuando el
+                valor sale de [min - hysteresis, max + hysteresis]
+    for         segundos que la condición debe mantenerse antes de alertar
+
+``threshold`` evalúa el porcentaje de llenado; ``rate`` la velocidad de
+llenado en %/min sobre una ventana deslizante de ``window`` segundos;
+``no_detection`` se cumple mientras no haya detecciones.
+"""
+
+import json
+import os
+from collections import deque
+
+
+# Reglas incluidas en el repositorio: también son las reglas por defecto
+SHIPPED_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'openmv_alerts.json')
+RULES_PATH = os.environ.get('OPENMV_ALERT_RULES', SHIPPED_RULES_PATH)
+
+
+class Rule:
+    """Condición sobre un valor con histéresis y tiempo mínimo (debounce)"""
+
+    def __init__(self, config):
+        self.id = str(config['id'])
+        self.level = config.get('level', 'warning')
+        self.message = config.get('message', self.id)
+        self.minimum = config.get('min')
+        self.maximum = config.get('max')
+        self.hysteresis = float(config.get('hysteresis', 0))
+        self.hold = float(config.get('for', 0))
+        self.active = False
+        self._since = None
+
+    def value(self, percentage, detected, timestamp):
+        return percentage
+
+    def _inside(self, value, margin):
+        return (
+            (self.minimum is None or value >= self.minimum - margin) and
+            (self.maximum is None or value <= self.maximum + margin)
+        )
+
+    def update(self, percentage, detected, timestamp):
+        """Procesar una muestra; devuelve el valor si la alerta se activa ahora"""
+        value = self.value(percentage, detected, timestamp)
+        if value is None:
+            return None
+
+        if self.active:
+            if not self._inside(value, self.hysteresis):
+                self.active = False
+                self._since = None
+            return None
+
+        if not self._inside(value, 0):
+            self._since = None
+            return None
+
+        if self._since is None:
+            self._since = timestamp
+        if timestamp - self._since >= self.hold:
+            self.active = True
+            return value
+        return None
+
+    def reset(self):
+        self.active = False
+        self._since = None
+
+    def format(self, percentage, value):
+        try:
+            return self.message.format(percentage=percentage, value=round(value, 2))
+        except (KeyError, IndexError, ValueError):
+            return self.message
+
+    def describe(self):
+        return {
+            'id': self.id,
+            'type': self.kind,
+            'level': self.level,
+            'min': self.minimum,
+            'max': self.maximum,
+            'hysteresis': self.hysteresis,
+            'for': self.hold,
+            'active': self.active
+        }
+
+
+class ThresholdRule(Rule):
+    kind = 'threshold'
+
+
+class NoDetectionRule(Rule):
+    """Activa mientras no haya detecciones (valor 1) y se limpia con una detección"""
+
+    kind = 'no_detection'
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.minimum = 1
+        self.maximum = None
+        self.hysteresis = 0.0
+
+    def value(self, percentage, detected, timestamp):
+        return 0 if detected else 1
+
+
+class RateRule(Rule):
+    """Velocidad de llenado (%/min) entre la muestra más antigua y la actual de la ventana
+
+    Cada muestra entra y sale una sola vez del deque: coste amortizado O(1).
+    """
+
+    kind = 'rate'
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.window = float(config.get('window', 60))
+        self._samples = deque()
+
+    def value(self, percentage, detected, timestamp):
+        samples = self._samples
+        samples.append((timestamp, percentage))
+        while timestamp - samples[0][0] > self.window:
+            samples.popleft()
+
+        first_time, first_value = samples[0]
+        elapsed = timestamp - first_time
+        # Esperar media ventana de datos para no alertar con dos muestras
+        if elapsed < self.window / 2:
+            return None
+        return (percentage - first_value) * 60.0 / elapsed
+
+    def reset(self):
+        super().reset()
+        self._samples.clear()
+
+    def describe(self):
+        info = super().describe()
+        info['window'] = self.window
+        return info
+
+
+RULE_TYPES = {
+    'threshold': ThresholdRule,
+    'rate': RateRule,
+    'no_detection': NoDetectionRule,
+}
+
+
+def build_rules(configs):
+    """Instanciar reglas; lanza ValueError si alguna es inválida"""
+    rules = []
+    for config in configs:
+        rule_class = RULE_TYPES.get(config.get('type', 'threshold'))
+        if rule_class is None or 'id' not in config:
+            raise ValueError(f"Regla de alerta invalida: {config}")
+        rules.append(rule_class(config))
+    return rules
+
+
+def default_rules():
+    """Reglas ``default`` del openmv_alerts.json incluido en el repositorio"""
+    with open(SHIPPED_RULES_PATH, encoding='utf-8') as f:
+        return json.load(f).get('default', [])
+
+
+def load_rule_config(path=RULES_PATH):
+    """Configuración de reglas desde JSON (las incluidas si no hay archivo)"""
+    config = {'default': None, 'devices': {}}
+    if path and os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            loaded = json.load(f)
+        config['default'] = loaded.get('default')
+        config['devices'] = loaded.get('devices', {})
+    if config['default'] is None:
+        config['default'] = default_rules()
+
+    # Validar todo antes de aplicar
+    build_rules(config['default'])
+    for rules in config['devices'].values():
+        build_rules(rules)
+    return config
+
+
+def rules_for(config, device_id):
+    """Reglas de una cámara: las propias si existen, si no las por defecto"""
+    return config['devices'].get(device_id, config['default'])
+
+
+class AlertEngine:
+    """Estado de las reglas de una cámara"""
+
+    def __init__(self, rule_configs=None):
+        self.rules = build_rules(default_rules() if rule_configs is None else rule_configs)
+
+    def evaluate(self, percentage, detected, timestamp):
+        """Reglas que se activan con esta muestra como [(regla, valor)]"""
+        fired = None
+        for rule in self.rules:
+            value = rule.update(percentage, detected, timestamp)
+            if value is not None:
+                if fired is None:
+                    fired = []
+                fired.append((rule, value))
+        return fired or ()
+
+    def reset(self):
+        for rule in self.rules:
+            rule.reset()
+
+    def describe(self):
+        return [rule.describe() for rule in self.rules]
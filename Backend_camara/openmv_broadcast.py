@@ -0,0 +1,545 @@
+"""
+Backend_camara/openmv_broadcast.py
+"""
+
+import asyncio
+import json
+import secrets
+import time
+from collections import deque
+from openmv_encoding import DEFAULT_ENCODING, encode
+
+
+# Política por tipo de mensaje cuando la cola del cliente está llena
+DROP_OLDEST = 'drop_oldest'
+NEVER_DROP = 'never_drop'
+
+MESSAGE_POLICIES = {
+    'tank_data': DROP_OLDEST,
+    'tank_delta': DROP_OLDEST,
+    'alert': NEVER_DROP,
+    'status': NEVER_DROP,
+    'device_state': NEVER_DROP,
+    'response': NEVER_DROP,
+    'history': NEVER_DROP,
+}
+
+# Actualizaciones que se guardan para reanudar clientes que reconectan
+REPLAY_SIZE = 1024
+
+
+class ClientChannel:
+    """Cola de salida acotada y tarea de envío de un cliente websocket"""
+
+    def __init__(self, websocket, maxsize=64, hard_limit=None, latency=None):
+        self.websocket = websocket
+        # Histograma de latencia lectura serie -> envío (opcional)
+        self.latency = latency
+        self.maxsize = maxsize
+        self.hard_limit = hard_limit or maxsize * 4
+        self.queue = deque()
+        self.sent = 0
+        self.dropped = {}
+        self.closed = False
+        self.close_reason = None
+        self.devices = None
+        self.types = None
+        self.min_interval = 0.0
+        self.conflated = 0
+        # Vista previa: solo la última imagen por cámara (mensaje compartido)
+        self.previews = {}
+        self.previews_sent = 0
+        self.previews_skipped = 0
+        self._pending = {}
+        self._last_emit = {}
+        self._timers = {}
+        self.encoding = DEFAULT_ENCODING
+        self.delta = False
+        self.keyframe_pending = set()
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        self._task = None
+
+    @property
+    def shed_total(self):
+        return sum(self.dropped.values())
+
+    def wants_device(self, device_id):
+        """Filtro de suscripción por cámara (None = todas)"""
+        return device_id is None or self.devices is None or device_id in self.devices
+
+    def wants(self, kind, device_id):
+        """Filtro de suscripción por tipo de mensaje y cámara"""
+        return (self.types is None or kind in self.types) and self.wants_device(device_id)
+
+    def wants_preview(self, device_id):
+        """La vista previa requiere suscripción explícita al tipo 'preview'"""
+        return self.types is not None and 'preview' in self.types and self.wants_device(device_id)
+
+    def subscribe(self, types=None, devices=None, max_rate=None):
+        """Configurar tipos, cámaras y frecuencia máxima de tank_data (Hz)"""
+        self.types = None if types in (None, '*') else set(types)
+        self.devices = None if devices in (None, '*') else set(devices)
+        self.min_interval = 1.0 / float(max_rate) if max_rate else 0.0
+        if not self.min_interval:
+            for device_id in list(self._pending):
+                self._release(device_id)
+        for device_id in list(self.previews):
+            if not self.wants_preview(device_id):
+                del self.previews[device_id]
+
+    def has_pending(self, device_id):
+        return device_id in self._pending
+
+    def offer(self, kind, message, device_id, origin=None):
+        """Encolar tank_data respetando la frecuencia máxima del cliente
+
+        Dentro de cada intervalo gana el último valor (conflación): el
+        mensaje pendiente se reemplaza y se envía al vencer el intervalo.
+        """
+        if not self.min_interval:
+            return self.push(kind, message, device_id, origin)
+
+        now = time.monotonic()
+        last = self._last_emit.get(device_id, 0.0)
+
+        if device_id not in self._pending and now - last >= self.min_interval:
+            self._last_emit[device_id] = now
+            return self.push(kind, message, device_id, origin)
+
+        if device_id in self._pending:
+            self.conflated += 1
+        self._pending[device_id] = (kind, message, origin)
+
+        if device_id not in self._timers:
+            delay = max(0.0, last + self.min_interval - now)
+            self._timers[device_id] = asyncio.get_running_loop().call_later(
+                delay, self._release, device_id
+            )
+        return True
+
+    def _release(self, device_id):
+        """Enviar el último valor conflado de una cámara"""
+        timer = self._timers.pop(device_id, None)
+        if timer:
+            timer.cancel()
+        pending = self._pending.pop(device_id, None)
+        if pending and not self.closed:
+            self._last_emit[device_id] = time.monotonic()
+            kind, message, origin = pending
+            self.push(kind, message, device_id, origin)
+
+    def replay(self, messages):
+        """Encolar de una vez los mensajes perdidos por un cliente que reanuda
+
+        Entran aunque superen ``maxsize`` (Broadcaster.missed ya comprobó que
+        caben antes del límite duro).
+        """
+        if self.closed:
+            return False
+        self.queue.extend(messages)
+        self._wakeup.set()
+        return True
+
+    def offer_preview(self, device_id, message):
+        """Dejar la última vista previa de una cámara para enviar
+
+        Si el cliente no alcanzó a enviar la anterior, se reemplaza (el
+        visor lento salta a la imagen más reciente).
+        """
+        if self.closed:
+            return False
+        if device_id in self.previews:
+            self.previews_skipped += 1
+        self.previews[device_id] = message
+        self._wakeup.set()
+        return True
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._writer())
+
+    def push(self, kind, message, device_id=None, origin=None):
+        """Encolar un mensaje ya codificado sin esperar al cliente
+
+        ``origin`` es el instante (perf_counter) de lectura serie del dato.
+        """
+        if self.closed:
+            return False
+
+        policy = MESSAGE_POLICIES.get(kind, NEVER_DROP)
+
+        if len(self.queue) >= self.maxsize:
+            if policy == DROP_OLDEST:
+                if not self._drop_oldest():
+                    self._count_drop(kind, device_id)
+                    return False
+                if kind == 'tank_delta' and device_id in self.keyframe_pending:
+                    # Se descartó un mensaje anterior de esta cámara: el delta
+                    # ya no tiene base; el próximo envío será un keyframe
+                    self._count_drop(kind, device_id)
+                    return False
+            elif len(self.queue) >= self.hard_limit:
+                # El cliente no consume ni siquiera lo que nunca se descarta
+                self.close('Cliente lento: cola de salida llena')
+                return False
+
+        self.queue.append((kind, message, device_id, origin))
+        self._wakeup.set()
+        return True
+
+    def _drop_oldest(self):
+        """Descartar el mensaje más antiguo descartable de la cola"""
+        for index, (queued_kind, _, device_id, _) in enumerate(self.queue):
+            if MESSAGE_POLICIES.get(queued_kind, NEVER_DROP) == DROP_OLDEST:
+                del self.queue[index]
+                self._count_drop(queued_kind, device_id)
+                if self.delta and device_id is not None:
+                    self._drop_chained_deltas(index, device_id)
+                return True
+        return False
+
+    def _drop_chained_deltas(self, start, device_id):
+        """Quitar los deltas encolados que se aplican sobre un tank_data descartado
+
+        Cada delta lleva como ``base`` el mensaje anterior de la cámara: sin
+        él, los deltas siguientes hasta el próximo tank_data completo dejarían
+        al cliente en un estado equivocado. El próximo envío será un keyframe.
+        """
+        index = start
+        while index < len(self.queue):
+            kind, _, queued_device, _ = self.queue[index]
+            if queued_device == device_id:
+                if kind == 'tank_data':
+                    return
+                if kind == 'tank_delta':
+                    del self.queue[index]
+                    self._count_drop(kind, device_id)
+                    continue
+            index += 1
+
+        # Sin un completo encolado, el delta conflado también depende del descartado
+        pending = self._pending.get(device_id)
+        if pending and pending[0] == 'tank_delta':
+            del self._pending[device_id]
+            self._count_drop(pending[0], device_id)
+
+    def _count_drop(self, kind, device_id=None):
+        self.dropped[kind] = self.dropped.get(kind, 0) + 1
+        # Un delta perdido rompe la cadena: el próximo envío será un keyframe
+        if self.delta and device_id is not None:
+            self.keyframe_pending.add(device_id)
+
+    async def _writer(self):
+        """Enviar la cola al cliente en orden
+
+        La vista previa solo se envía con la cola vacía: la telemetría
+        encolada nunca espera detrás de un JPEG.
+        """
+        try:
+            while not self.closed:
+                if not self.queue:
+                    if self.previews:
+                        device_id = next(iter(self.previews))
+                        await self.websocket.send(self.previews.pop(device_id))
+                        self.previews_sent += 1
+                        continue
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+
+                _, message, _, origin = self.queue.popleft()
+                self._space.set()
+                await self.websocket.send(message)
+                self.sent += 1
+                if origin is not None and self.latency is not None:
+                    self.latency.observe(time.perf_counter() - origin)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self.closed = True
+            self.close_reason = self.close_reason or f"Error de envio: {e}"
+
+    async def wait_for_space(self):
+        """Esperar a que la cola baje de la mitad (control de flujo para envíos largos)"""
+        while not self.closed and len(self.queue) >= self.maxsize // 2:
+            self._space.clear()
+            await self._space.wait()
+        return not self.closed
+
+    def close(self, reason=None):
+        """Cerrar el canal y la conexión del cliente"""
+        if self.closed:
+            return
+
+        self.closed = True
+        self.close_reason = reason
+        self.queue.clear()
+        self.previews.clear()
+        self._wakeup.set()
+        self._space.set()
+
+        close = getattr(self.websocket, 'close', None)
+        if reason and close:
+            asyncio.get_running_loop().create_task(close(code=1013, reason=reason))
+
+    def stop(self):
+        """Detener la tarea de envío"""
+        self.closed = True
+        self._space.set()
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        self._pending.clear()
+        self.previews.clear()
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+    def stats(self):
+        return {
+            'queued': len(self.queue),
+            'sent': self.sent,
+            'dropped': dict(self.dropped),
+            'devices': sorted(self.devices) if self.devices is not None else None,
+            'types': sorted(self.types) if self.types is not None else None,
+            'max_rate': round(1.0 / self.min_interval, 3) if self.min_interval else None,
+            'conflated': self.conflated,
+            'previews_sent': self.previews_sent,
+            'previews_skipped': self.previews_skipped,
+            'encoding': self.encoding,
+            'delta': self.delta,
+            'closed': self.closed,
+            'close_reason': self.close_reason
+        }
+
+
+class ReplayLog:
+    """Últimas actualizaciones difundidas, numeradas con ``stream_seq``
+
+    Cada entrada guarda el mensaje ya codificado por codificación; al
+    reanudar un cliente se reenvían esos mismos bytes.
+    """
+
+    def __init__(self, size=REPLAY_SIZE):
+        self.entries = deque(maxlen=size)
+        self.seq = 0
+
+    def next_seq(self):
+        self.seq += 1
+        return self.seq
+
+    def append(self, seq, kind, device_id, payload, encoded):
+        """``payload`` puede ser None si el mensaje llega ya codificado en JSON"""
+        self.entries.append((seq, kind, device_id, payload, encoded))
+        self.seq = max(self.seq, seq)
+
+    def since(self, seq):
+        """Entradas posteriores a ``seq``, o None si el log ya no las tiene todas"""
+        if seq > self.seq:
+            return None
+        if seq == self.seq:
+            return []
+        if not self.entries or self.entries[0][0] > seq + 1:
+            return None
+        entries = [entry for entry in self.entries if entry[0] > seq]
+        # Los procesos websocket pueden haber perdido entradas del buffer compartido
+        return entries if len(entries) == self.seq - seq else None
+
+
+class Broadcaster:
+    """Difusión a todos los clientes: se codifica una vez y se encola a cada uno"""
+
+    def __init__(self, queue_size=64, latency=None, replay_size=REPLAY_SIZE):
+        self.queue_size = queue_size
+        self.latency = latency
+        self.channels = {}
+        self.disconnects = 0
+        # RingWriter opcional: copia de cada mensaje para los procesos websocket
+        self.ring = None
+        # Identifica esta secuencia: un stream_seq de otra ejecución no se reanuda
+        self.stream_id = secrets.token_hex(6)
+        self.replay_log = ReplayLog(replay_size)
+        self.resumes = {'replay': 0, 'snapshot': 0}
+
+    def __len__(self):
+        return len(self.channels)
+
+    def add(self, websocket):
+        """Registrar un cliente y arrancar su tarea de envío"""
+        channel = ClientChannel(websocket, self.queue_size, latency=self.latency)
+        self.channels[websocket] = channel
+        channel.start()
+        return channel
+
+    def remove(self, websocket):
+        """Quitar un cliente; devuelve su canal"""
+        channel = self.channels.pop(websocket, None)
+        if channel:
+            channel.stop()
+            self.disconnects += 1
+        return channel
+
+    def publish(self, kind, payload, device_id=None, delta_payload=None, origin=None, sample=None):
+        """Codificar una vez por variante y encolar para los clientes suscritos
+
+        Las variantes son (codificación, completo/delta): con cientos de
+        clientes cada mensaje se serializa como mucho una vez por variante.
+        Cada mensaje recibe el siguiente ``stream_seq`` y queda en el log de
+        reanudación con sus codificaciones completas. ``sample`` (muestra de
+        historial de un tank_data) viaja al buffer compartido junto al JSON.
+        """
+        seq = self.replay_log.next_seq()
+        payload['stream_seq'] = seq
+        if delta_payload is not None:
+            delta_payload['stream_seq'] = seq
+
+        full = {}
+        if self.ring is not None:
+            full['json'] = encode(payload)
+            self.ring.publish(kind, full['json'], device_id, origin, seq, sample)
+        self.replay_log.append(seq, kind, device_id, payload, full)
+
+        if not self.channels:
+            return 0
+
+        encoded = {(encoding, False): message for encoding, message in full.items()}
+        closed = []
+
+        for websocket, channel in self.channels.items():
+            if channel.closed:
+                closed.append(websocket)
+                continue
+            if not channel.wants(kind, device_id):
+                continue
+
+            # Un delta que reemplaza a otro pendiente (conflación) perdería
+            # cambios: en ese caso se envía el mensaje completo
+            use_delta = (
+                delta_payload is not None and channel.delta
+                and device_id not in channel.keyframe_pending
+                and not channel.has_pending(device_id)
+            )
+            if channel.delta:
+                channel.keyframe_pending.discard(device_id)
+
+            key = (channel.encoding, use_delta)
+            message = encoded.get(key)
+            if message is None:
+                message = encoded[key] = encode(delta_payload if use_delta else payload, channel.encoding)
+                if not use_delta:
+                    full[channel.encoding] = message
+
+            if kind == 'tank_data':
+                channel.offer('tank_delta' if use_delta else kind, message, device_id, origin)
+            else:
+                channel.push(kind, message, device_id, origin)
+
+        for websocket in closed:
+            self.remove(websocket)
+
+        return len(self.channels)
+
+    def publish_encoded(self, kind, message, device_id=None, origin=None, stream_seq=None):
+        """Difundir un mensaje que ya llega codificado en JSON (desde el buffer compartido)
+
+        Los clientes JSON reciben el mismo texto; para otras codificaciones se
+        decodifica y recodifica una vez. Los clientes delta reciben mensajes
+        completos. ``stream_seq`` es el que asignó el proceso de ingestión.
+        """
+        encoded = {'json': message}
+        if stream_seq:
+            self.replay_log.append(stream_seq, kind, device_id, None, encoded)
+
+        if not self.channels:
+            return 0
+
+        closed = []
+
+        for websocket, channel in self.channels.items():
+            if channel.closed:
+                closed.append(websocket)
+                continue
+            if not channel.wants(kind, device_id):
+                continue
+
+            encoded_message = encoded.get(channel.encoding)
+            if encoded_message is None:
+                encoded_message = encoded[channel.encoding] = encode(json.loads(message), channel.encoding)
+
+            if kind == 'tank_data':
+                channel.offer(kind, encoded_message, device_id, origin)
+            else:
+                channel.push(kind, encoded_message, device_id, origin)
+
+        for websocket in closed:
+            self.remove(websocket)
+
+        return len(self.channels)
+
+    def missed(self, websocket, seq, stream=None):
+        """Mensajes posteriores a ``seq`` para un cliente que reanuda, ya codificados
+
+        Devuelve None si hay que mandar un snapshot: otro ``stream``, un hueco
+        más viejo que el log o más mensajes de los que entran en su cola.
+        """
+        channel = self.channels.get(websocket)
+        entries = None
+        if channel is not None and (stream is None or stream == self.stream_id):
+            entries = self.replay_log.since(seq)
+        if entries is None:
+            self.resumes['snapshot'] += 1
+            return None
+
+        messages = []
+        for _, kind, device_id, payload, encoded in entries:
+            if not channel.wants(kind, device_id):
+                continue
+            message = encoded.get(channel.encoding)
+            if message is None:
+                if payload is None:
+                    payload = json.loads(encoded['json'])
+                message = encoded[channel.encoding] = encode(payload, channel.encoding)
+            messages.append((kind, message, device_id, None))
+
+        if len(channel.queue) + len(messages) > channel.hard_limit:
+            self.resumes['snapshot'] += 1
+            return None
+        self.resumes['replay'] += 1
+        return messages
+
+    def publish_preview(self, device_id, message):
+        """Ofrecer una vista previa ya armada a los clientes suscritos
+
+        Todos los clientes comparten el mismo objeto ``bytes``: la imagen se
+        guarda una vez y se envía tal cual.
+        """
+        count = 0
+        for channel in self.channels.values():
+            if not channel.closed and channel.wants_preview(device_id):
+                channel.offer_preview(device_id, message)
+                count += 1
+        return count
+
+    def send_to(self, websocket, kind, payload):
+        """Encolar un mensaje para un único cliente"""
+        channel = self.channels.get(websocket)
+        if channel is None:
+            return False
+        return channel.push(kind, encode(payload, channel.encoding))
+
+    def stats(self):
+        return {
+            'clients': len(self.channels),
+            'disconnects': self.disconnects,
+            'stream': self.stream_id,
+            'stream_seq': self.replay_log.seq,
+            'resumes': dict(self.resumes),
+            'per_client': {
+                self.client_id(ws): channel.stats()
+                for ws, channel in self.channels.items()
+            }
+        }
+
+    @staticmethod
+    def client_id(websocket):
+        address = getattr(websocket, 'remote_address', None) or ('?', 0)
+        return f"{address[0]}:{address[1]}"
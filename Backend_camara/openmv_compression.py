@@ -0,0 +1,156 @@
+"""
+Backend_camara/openmv_compression.py
+
+Compresión de muestras de nivel antes de difundir y guardar.
+
+- Difusión (websocket): banda muerta. Se envía un frame cuando el nivel se
+  aleja al menos ``deadband`` puntos del último enviado, cuando aparece o
+  desaparece la detección, con una alerta, o cada ``heartbeat`` segundos.
+  Error máximo del valor mostrado: ``deadband``.
+- Almacenamiento: swinging door. Se guardan solo los puntos necesarios para
+  que la interpolación lineal entre puntos guardados quede a lo sumo a
+  ``deviation`` puntos de todas las muestras descartadas; además se guarda
+  un punto cada ``heartbeat`` segundos aunque el nivel no cambie.
+
+Con ``deadband`` y ``deviation`` en 0 todas las muestras pasan.
+"""
+
+INFINITY = float('inf')
+
+
+class SwingingDoor:
+    """Swinging door trending en línea sobre puntos (t, v, item)
+
+    Mantiene el último punto guardado (ancla), la última muestra recibida y
+    las pendientes de las dos "puertas". Cuando la recta desde el ancla a
+    la muestra nueva sale de las puertas, la muestra anterior se guarda y
+    pasa a ser la nueva ancla. Coste O(1) por muestra.
+    """
+
+    def __init__(self, deviation):
+        self.deviation = deviation
+        self._anchor = None
+        self._held = None
+        self._upper = INFINITY
+        self._lower = -INFINITY
+
+    def add(self, t, v, item):
+        """Procesar una muestra; devuelve los items a guardar"""
+        if self._anchor is None:
+            self._start(t, v)
+            return [item]
+
+        anchor_t, anchor_v = self._anchor
+        dt = t - anchor_t
+        if dt <= 0:
+            return []
+
+        # La recta ancla -> muestra debe pasar por la puerta de todas las
+        # muestras intermedias; si no, la muestra anterior es un vértice
+        slope = (v - anchor_v) / dt
+        if self._held is not None and not (self._lower <= slope <= self._upper):
+            held_t, held_v, held_item = self._held
+            self._start(held_t, held_v)
+            return [held_item] + self.add(t, v, item)
+
+        self._upper = min(self._upper, (v + self.deviation - anchor_v) / dt)
+        self._lower = max(self._lower, (v - self.deviation - anchor_v) / dt)
+        self._held = (t, v, item)
+        return []
+
+    def restart(self, t, v):
+        """Fijar un punto ya guardado como ancla (heartbeat, alerta)"""
+        self._start(t, v)
+
+    def flush(self):
+        """Muestra pendiente sin guardar (o None)"""
+        held, self._held = self._held, None
+        return held[2] if held else None
+
+    def _start(self, t, v):
+        self._anchor = (t, v)
+        self._held = None
+        self._upper = INFINITY
+        self._lower = -INFINITY
+
+
+class SampleFilter:
+    """Decidir qué frames de una cámara se difunden y cuáles se guardan"""
+
+    def __init__(self, deadband=1.0, deviation=1.0, heartbeat=30.0):
+        self.deadband = deadband
+        self.deviation = deviation
+        self.heartbeat = heartbeat
+        self.door = SwingingDoor(deviation)
+        self._published = None
+        self._archived_t = None
+        self.received = 0
+        self.published = 0
+        self.archived = 0
+
+    @property
+    def enabled(self):
+        return bool(self.deadband or self.deviation)
+
+    def update(self, frame, force=False):
+        """Devuelve (difundir, [frames a guardar]); ``force`` con alertas"""
+        self.received += 1
+        if not self.enabled:
+            self.published += 1
+            self.archived += 1
+            return True, [frame]
+
+        publish = self._should_publish(frame, force)
+        archive = self._archive(frame, force)
+
+        if publish:
+            self._published = (frame.timestamp, frame.percentage)
+            self.published += 1
+        self.archived += len(archive)
+        return publish, archive
+
+    def _should_publish(self, frame, force):
+        if force or self._published is None:
+            return True
+
+        last_t, last_v = self._published
+        v = frame.percentage
+        if (v is None) != (last_v is None):
+            return True
+        if frame.timestamp - last_t >= self.heartbeat:
+            return True
+        return v is not None and abs(v - last_v) >= self.deadband
+
+    def _archive(self, frame, force):
+        # Sin nivel no hay nada que guardar
+        if frame.percentage is None:
+            return []
+
+        t, v = frame.timestamp, frame.percentage
+        if force or (self._archived_t is not None and t - self._archived_t >= self.heartbeat):
+            held = self.door.flush()
+            self.door.restart(t, v)
+            archive = [held, frame] if held is not None else [frame]
+        else:
+            archive = self.door.add(t, v, frame)
+
+        if archive:
+            self._archived_t = archive[-1].timestamp
+        return archive
+
+    def flush(self):
+        """Frame pendiente al detener la lectura (para no perder el último punto)"""
+        held = self.door.flush()
+        if held is not None:
+            self.archived += 1
+        return held
+
+    def stats(self):
+        return {
+            'deadband': self.deadband,
+            'deviation': self.deviation,
+            'heartbeat': self.heartbeat,
+            'received': self.received,
+            'published': self.published,
+            'archived': self.archived
+        }
@@ -0,0 +1,129 @@
+"""
+Backend_camara/openmv_connection.py
+"""
+
+import asyncio
+import random
+from openmv_logging import logger
+
+
+class ConnectionManager:
+    """Mantener conectadas las cámaras sin bloquear el event loop
+
+    Cada cámara tiene una tarea supervisora: abre el puerto en el executor
+    (apertura, estabilización y limpieza de buffers son bloqueantes), espera
+    a que se desconecte y reintenta con backoff exponencial con jitter. Antes
+    de cada intento se vuelven a enumerar los puertos para seguir a la cámara
+    si el sistema la asignó a otro puerto. Un escaneo periódico agrega las
+    cámaras que se conectan en caliente.
+    """
+
+    def __init__(self, devices, on_state=None, base_delay=1.0, max_delay=30.0, scan_interval=5.0):
+        self.devices = devices
+        self.on_state = on_state
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.scan_interval = scan_interval
+        self.running = False
+        self._tasks = {}
+        self._wakeups = {}
+        self._scan_task = None
+
+    def start(self):
+        """Supervisar todas las cámaras registradas y escanear nuevas"""
+        if self.running:
+            return
+        self.running = True
+        for device in self.devices:
+            self.watch(device)
+        if self.devices.discover_ports and self.scan_interval:
+            self._scan_task = asyncio.get_running_loop().create_task(self._scan())
+
+    def stop(self):
+        """Cancelar supervisores y escaneo (las cámaras siguen abiertas)"""
+        self.running = False
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+        self._wakeups.clear()
+        if self._scan_task is not None:
+            self._scan_task.cancel()
+            self._scan_task = None
+
+    def watch(self, device):
+        if device.device_id in self._tasks or not device.reconnectable:
+            return
+        device.on_state = self._state_changed
+        self._wakeups[device.device_id] = asyncio.Event()
+        self._tasks[device.device_id] = asyncio.get_running_loop().create_task(
+            self._supervise(device)
+        )
+
+    def backoff(self, attempt):
+        """Espera antes del intento ``attempt``: exponencial con jitter (mitad fija)"""
+        delay = min(self.max_delay, self.base_delay * 2 ** max(0, attempt - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _state_changed(self, device, state, info):
+        if state == 'disconnected':
+            wakeup = self._wakeups.get(device.device_id)
+            if wakeup:
+                wakeup.set()
+        if self.on_state:
+            self.on_state(device, state, info)
+
+    async def _supervise(self, device):
+        loop = asyncio.get_running_loop()
+        wakeup = self._wakeups[device.device_id]
+        attempt = 0
+
+        while self.running:
+            if device.is_connected and device.is_monitoring:
+                wakeup.clear()
+                await wakeup.wait()
+                continue
+
+            device.set_state('connecting', attempt=attempt, port=device.port)
+
+            try:
+                ports = await loop.run_in_executor(
+                    None, self.devices.scan_ports, self.devices.claimed_ports()
+                )
+            except Exception:
+                # SerialException/OSError al enumerar: reintentar con backoff
+                # en lugar de terminar el supervisor de la cámara
+                logger.exception("[%s] Error enumerando puertos", device.device_id)
+                ok = False
+            else:
+                port = self.devices.locate(device, ports)
+                if port != device.port:
+                    logger.info("[%s] Camara re-enumerada: %s -> %s", device.device_id, device.port, port)
+                    device.port = port
+                ok = await loop.run_in_executor(None, device.open)
+            if not self.running:
+                break
+
+            if ok:
+                attempt = 0
+                self.devices.start_device(device)
+                continue
+
+            attempt += 1
+            delay = self.backoff(attempt)
+            device.set_state('reconnecting', attempt=attempt, retry_in=round(delay, 1))
+            await asyncio.sleep(delay)
+
+    async def _scan(self):
+        """Detectar cámaras conectadas en caliente"""
+        loop = asyncio.get_running_loop()
+        while self.running:
+            await asyncio.sleep(self.scan_interval)
+            try:
+                ports = await loop.run_in_executor(
+                    None, self.devices.scan_ports, self.devices.claimed_ports()
+                )
+            except Exception as e:
+                logger.warning("Error enumerando puertos: %s", e)
+                continue
+            for device in self.devices.discover(ports):
+                self.watch(device)
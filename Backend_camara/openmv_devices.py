@@ -0,0 +1,619 @@
+"""
+Backend_camara/openmv_devices.py
+"""
+
+import asyncio
+import os
+import time
+import serial
+from threading import Lock
+from datetime import datetime
+from openmv_alerts import AlertEngine, load_rule_config, rules_for
+from openmv_compression import SampleFilter
+from openmv_discovery import PortDiscovery
+from openmv_fomo import FomoBatcher
+from openmv_frames import FrameAssembler
+from openmv_logging import RawLineLog, logger, raw_log_rate
+from openmv_protocol import BinaryFrameDecoder
+from openmv_replay import CaptureWriter, ReplayTransport, capture_path
+from openmv_serial import LineSplitter, SerialTransport
+from openmv_timeseries import HistoryBuffer
+
+
+def find_openmv_ports(verbose=True, discovery=None, exclude=()):
+    """Buscar todos los puertos OpenMV (VID/PID, caché y handshake; bloqueante)"""
+    return (discovery or PortDiscovery()).scan(exclude, verbose)
+
+
+def device_id_for_port(port):
+    """Identificador estable de la cámara: número de serie o nombre del puerto"""
+    serial_number = getattr(port, 'serial_number', None)
+    if serial_number:
+        return serial_number
+    device = getattr(port, 'device', port)
+    return os.path.basename(device)
+
+
+# Ayuda para los errores de conexión más comunes (se escribe en el log)
+NO_DEVICE_HELP = (
+    "SOLUCION:\n"
+    "  1. Verifica que la OpenMV este conectada\n"
+    "  2. Ejecuta: python diagnostico_puerto.py\n"
+    "  3. Identifica el puerto correcto"
+)
+
+PORT_BUSY_HELP = (
+    "CAUSA: VS Code o la extension OpenMV tiene el puerto abierto\n"
+    "SOLUCION:\n"
+    "  1. En VS Code, ve a la extension OpenMV\n"
+    "  2. Haz clic en 'Disconnect' o 'Desconectar'\n"
+    "  3. O cierra VS Code completamente\n"
+    "  4. Vuelve a ejecutar este script"
+)
+
+PORT_TIMEOUT_HELP = (
+    "CAUSA: Puerto existe pero no responde\n"
+    "SOLUCION:\n"
+    "  1. Desconecta y reconecta el cable USB\n"
+    "  2. Prueba otro puerto USB\n"
+    "  3. Verifica que el cable sea de datos (no solo carga)\n"
+    "  4. Ejecuta el script en VS Code primero"
+)
+
+
+def log_no_device_help():
+    logger.error("No se detecto OpenMV en ningun puerto\n%s", NO_DEVICE_HELP)
+
+
+class CameraDevice:
+    """Pipeline de ingestión independiente de una cámara OpenMV"""
+
+    # El ConnectionManager reabre el puerto si se desconecta
+    reconnectable = True
+
+    def __init__(self, device_id, port, baudrate=115200, loop=None, on_frame=None, protocol='auto'):
+        self.device_id = device_id
+        self.port = port
+        self.baudrate = baudrate
+        # 'text' (depuración), 'binary' o 'auto' (binario al ver un delimitador 0x00)
+        self.protocol = protocol
+        self.active_protocol = 'binary' if protocol == 'binary' else 'text'
+        self.binary_decoder = BinaryFrameDecoder(on_preview=self.handle_preview, on_tensor=self.handle_tensor)
+        self.loop = loop
+        self.on_frame = on_frame
+        # Callback de vista previa JPEG (solo protocolo binario): on_preview(device, preview)
+        self.on_preview = None
+        self.latest_preview = None
+        # Tensores FOMO a post-procesar en el host: on_tensor(device, tensor)
+        self.on_tensor = None
+        # Callback de cambios de conexión: on_state(device, state, info)
+        self.on_state = None
+        self.state = 'disconnected'
+        self.serial_connection = None
+        self.serial_transport = None
+        self.capture = None
+        # Contadores para métricas
+        self.bytes_read = 0
+        self.lines_read = 0
+        self.connects = 0
+        self.last_read_time = None
+        self.is_monitoring = False
+        self.line_splitter = LineSplitter()
+        self.frame_assembler = FrameAssembler()
+        self.raw_lines = RawLineLog(device_id, rate=raw_log_rate())
+        self.sample_filter = SampleFilter()
+        self.latest_data = {
+            'device_id': device_id,
+            'level': 0,
+            'percentage': 0,
+            'timestamp': None,
+            'label': 'Desconocido',
+            'fps': 0,
+            'detection': None,
+            'detections': []
+        }
+        self.data_lock = Lock()
+        self.frame_seq = 0
+        # Último estado como muestra del historial en columnas (para el buffer compartido)
+        self.latest_sample = None
+        self._sample_time = None
+        self.history = HistoryBuffer()
+        # Versión del historial en memoria (caché del mensaje get_history)
+        self.history_seq = 0
+        self.alert_engine = AlertEngine()
+
+    @property
+    def is_connected(self):
+        return self.serial_connection is not None and self.serial_connection.is_open
+
+    def open(self):
+        """Abrir el puerto de la cámara (bloqueante: ejecutar fuera del event loop)"""
+        port = self.port
+        try:
+            logger.info("[%s] Intentando conectar a %s...", self.device_id, port)
+
+            # Cerrar conexión previa
+            if self.serial_connection and self.serial_connection.is_open:
+                try:
+                    self.serial_connection.close()
+                    time.sleep(0.5)
+                except:
+                    pass
+
+            # Abrir puerto con timeout mayor
+            self.serial_connection = serial.Serial(
+                port,
+                self.baudrate,
+                timeout=3,
+                write_timeout=3
+            )
+
+            # Esperar estabilización
+            time.sleep(2)
+
+            # Limpiar buffers
+            self.serial_connection.reset_input_buffer()
+            self.serial_connection.reset_output_buffer()
+
+            # Verificar datos
+            time.sleep(1)
+            if self.serial_connection.in_waiting > 0:
+                logger.info("[%s] Conectado en %s - Recibiendo datos (%d bytes)",
+                            self.device_id, port, self.serial_connection.in_waiting)
+            else:
+                logger.info("[%s] Conectado en %s - Esperando datos del script OpenMV", self.device_id, port)
+            self.connects += 1
+            return True
+
+        except serial.SerialException as e:
+            error_str = str(e)
+
+            if "PermissionError" in error_str or "denegado" in error_str.lower():
+                logger.error("[%s] Puerto ocupado: %s\n%s", self.device_id, port, PORT_BUSY_HELP)
+            elif "timeout" in error_str.lower() or "semaforo" in error_str.lower():
+                logger.error("[%s] Timeout - dispositivo no responde en %s\n%s",
+                             self.device_id, port, PORT_TIMEOUT_HELP)
+            else:
+                logger.error("[%s] Error al conectar a %s: %s", self.device_id, port, error_str)
+            return False
+
+        except Exception:
+            logger.exception("[%s] Error inesperado al conectar a %s", self.device_id, port)
+            return False
+
+    def close(self):
+        """Cerrar el puerto de la cámara"""
+        self.stop_reading()
+
+        if self.serial_connection and self.serial_connection.is_open:
+            self.serial_connection.close()
+            logger.info("[%s] OpenMV desconectado", self.device_id)
+
+    def start_reading(self):
+        """Registrar el puerto serie en el event loop"""
+        if self.serial_transport and self.serial_transport.is_running:
+            return
+
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+
+        self.is_monitoring = True
+        self.alert_engine.reset()
+        self.line_splitter.reset()
+        self.frame_assembler = FrameAssembler()
+        self.binary_decoder = BinaryFrameDecoder(
+            self.binary_decoder.labels, self.handle_preview, self.handle_tensor
+        )
+        self.active_protocol = 'binary' if self.protocol == 'binary' else 'text'
+        self.serial_transport = self.make_transport()
+        self.serial_transport.start()
+        logger.info("[%s] Iniciando lectura de datos OpenMV (modo %s)", self.device_id, self.serial_transport.mode)
+
+    def make_transport(self):
+        """Fuente de bloques de la cámara (puerto serie real)"""
+        return SerialTransport(
+            self.loop,
+            self.serial_connection,
+            self.on_serial_chunk,
+            self.on_serial_error
+        )
+
+    def stop_reading(self):
+        """Dejar de leer el puerto serie"""
+        self.is_monitoring = False
+        if self.serial_transport:
+            self.serial_transport.stop()
+            self.serial_transport = None
+        self.stop_capture()
+
+        # Guardar el último punto retenido por la compresión
+        held = self.sample_filter.flush()
+        if held is not None:
+            self.add_history([held])
+            if self.on_frame:
+                self.on_frame(self, held, (), False, [held])
+
+    def start_capture(self, directory):
+        """Grabar el flujo crudo del puerto en ``directory``"""
+        if self.capture is None:
+            os.makedirs(directory, exist_ok=True)
+            self.capture = CaptureWriter(capture_path(directory, self.device_id))
+            logger.info("[%s] Grabando flujo serie en %s", self.device_id, self.capture.path)
+
+    def stop_capture(self):
+        if self.capture is not None:
+            self.capture.close()
+            logger.info("[%s] Captura cerrada (%d bloques)", self.device_id, self.capture.chunks)
+            self.capture = None
+
+    def on_serial_chunk(self, chunk, read_time=None):
+        """Procesar un bloque recibido del puerto serie (en el event loop)"""
+        if not self.is_monitoring:
+            return
+
+        self.bytes_read += len(chunk)
+        self.last_read_time = read_time
+
+        if self.capture is not None:
+            self.capture.write(chunk, read_time)
+
+        if self.active_protocol == 'text' and self.protocol == 'auto' and b'\x00' in chunk:
+            logger.info("[%s] Protocolo binario detectado", self.device_id)
+            self.active_protocol = 'binary'
+            self.line_splitter.reset()
+
+        if self.active_protocol == 'binary':
+            for frame in self.binary_decoder.feed(chunk):
+                self.handle_frame(frame)
+            return
+
+        lines = self.line_splitter.feed(chunk)
+        self.lines_read += len(lines)
+        for line in lines:
+            self.process_line(line)
+
+    def on_serial_error(self, error):
+        """Reportar errores de lectura; si el transporte se detuvo, el puerto murió"""
+        logger.warning("[%s] Error leyendo datos OpenMV: %s", self.device_id, error)
+        if self.serial_transport is not None and not self.serial_transport.is_running:
+            self.handle_disconnect(error)
+
+    def handle_disconnect(self, error=None):
+        """Liberar el puerto muerto (cable desconectado) y notificar"""
+        self.stop_reading()
+        try:
+            if self.serial_connection:
+                self.serial_connection.close()
+        except Exception:
+            pass
+        self.set_state('disconnected', error=str(error) if error else None)
+
+    def set_state(self, state, **info):
+        """Cambiar el estado de conexión y notificarlo"""
+        self.state = state
+        if self.on_state:
+            self.on_state(self, state, info)
+
+    def process_line(self, line):
+        """Parsear una línea y notificar los frames completos"""
+        # Buffer circular + log muestreado (nunca bloquea en la consola)
+        if line:
+            self.raw_lines.record(line)
+
+        # Parsear datos (un frame completo por captura)
+        frame = self.parse_openmv_data(line)
+
+        if frame:
+            self.handle_frame(frame)
+
+    def handle_frame(self, frame):
+        """Aplicar un frame completo (texto o binario) y notificarlo"""
+        self.apply_frame(frame)
+
+        # Verificar alertas
+        alerts = self.check_alerts(frame.timestamp)
+
+        # Banda muerta / swinging door: qué se difunde y qué se guarda
+        publish, archive = self.sample_filter.update(frame, force=bool(alerts))
+        self.add_history(archive)
+
+        if self.on_frame:
+            self.on_frame(self, frame, alerts, publish, archive)
+
+    def handle_preview(self, preview):
+        """JPEG anotado completo recibido de la cámara"""
+        self.latest_preview = preview
+        if self.on_preview:
+            self.on_preview(self, preview)
+
+    def handle_tensor(self, tensor):
+        """Salida FOMO sin post-procesar (FOMO_ON_HOST en la cámara)"""
+        if self.on_tensor:
+            self.on_tensor(self, tensor)
+
+    def add_history(self, frames):
+        """Agregar al historial en memoria los frames guardados"""
+        # Sin frames nuevos la versión no cambia (caché codificada y ETag de /api/history)
+        if not frames:
+            return
+        self.history_seq += 1
+        self.history.extend(frames)
+
+    def parse_openmv_data(self, line):
+        """Parsear una línea del script OpenMV; devuelve el Frame completo o None"""
+        return self.frame_assembler.feed(line)
+
+    def apply_frame(self, frame):
+        """Actualizar el estado con un frame completo de la cámara"""
+        best = frame.best_detection
+        timestamp = datetime.fromtimestamp(frame.timestamp).isoformat()
+
+        with self.data_lock:
+            self.frame_seq += 1
+            if frame.label is not None:
+                self.latest_data['label'] = frame.label
+            if frame.fps is not None:
+                self.latest_data['fps'] = frame.fps
+
+            self.latest_data['detection'] = {
+                'x': best.x,
+                'y': best.y,
+                'score': best.score
+            } if best else None
+            self.latest_data['detections'] = [d.to_dict() for d in frame.detections]
+
+            if frame.percentage is not None:
+                self.latest_data['percentage'] = frame.percentage
+                self.latest_data['timestamp'] = timestamp
+                self._sample_time = frame.timestamp
+
+            if self.latest_data['timestamp'] is not None:
+                self.latest_sample = (
+                    self._sample_time, self.latest_data['percentage'], self.latest_data['fps'],
+                    best.x if best else None, best.y if best else None, best.score if best else None,
+                    len(frame.detections)
+                )
+
+    def snapshot(self):
+        """Copia del último estado para serializar fuera del lock"""
+        with self.data_lock:
+            return dict(self.latest_data)
+
+    def make_alert(self, level, message, percentage, rule=None):
+        return {
+            'device_id': self.device_id,
+            'rule': rule,
+            'level': level,
+            'message': message,
+            'percentage': percentage,
+            'timestamp': datetime.now().isoformat()
+        }
+
+    def check_alerts(self, timestamp=None):
+        """Evaluar las reglas de alerta con el último estado (incremental)"""
+        percentage = self.latest_data.get('percentage', 0)
+        fired = self.alert_engine.evaluate(
+            percentage,
+            self.latest_data.get('detection') is not None,
+            timestamp if timestamp is not None else time.time()
+        )
+        if not fired:
+            return ()
+
+        return [
+            self.make_alert(rule.level, rule.format(percentage, value), percentage, rule.id)
+            for rule, value in fired
+        ]
+
+    def describe(self):
+        return {
+            'device_id': self.device_id,
+            'port': self.port,
+            'connected': self.is_connected,
+            'state': self.state,
+            'reconnects': max(0, self.connects - 1),
+            'is_monitoring': self.is_monitoring,
+            'protocol': self.active_protocol,
+            'parse_errors': self.frame_assembler.parse_errors,
+            'compression': self.sample_filter.stats(),
+            'binary': self.binary_decoder.stats()
+        }
+
+
+class DeviceManager:
+    """Descubrir las cámaras conectadas y mantener un pipeline por cada una"""
+
+    def __init__(self, baudrate=115200, on_frame=None, protocol='auto', compression=None, on_preview=None):
+        self.baudrate = baudrate
+        # Parámetros de SampleFilter (deadband, deviation, heartbeat)
+        self.compression = compression or {}
+        self.on_frame = on_frame
+        self.on_preview = on_preview
+        self.protocol = protocol
+        self.loop = None
+        self.devices = {}
+        self.discovery = PortDiscovery(baudrate)
+        # Sin puertos reales cuando solo se reproducen capturas
+        self.discover_ports = True
+        self.capture_dir = None
+        self.alert_config = load_rule_config()
+        # Post-procesamiento FOMO por lotes de las cámaras que envían tensores
+        self.fomo = FomoBatcher()
+
+    def __len__(self):
+        return len(self.devices)
+
+    def __iter__(self):
+        return iter(list(self.devices.values()))
+
+    def get(self, device_id=None):
+        """Cámara por id; sin id devuelve la primera registrada"""
+        if device_id is None:
+            return next(iter(self.devices.values()), None)
+        return self.devices.get(device_id)
+
+    def add(self, device_id, port):
+        """Registrar una cámara en un puerto"""
+        device = self.devices.get(device_id)
+        if device is None:
+            device = CameraDevice(
+                device_id, port, self.baudrate, self.loop, self.on_frame, self.protocol
+            )
+            device.alert_engine = AlertEngine(rules_for(self.alert_config, device_id))
+            device.sample_filter = SampleFilter(**self.compression)
+            device.on_preview = self.on_preview
+            device.on_tensor = self.submit_tensor
+            self.devices[device_id] = device
+        else:
+            device.port = port
+        return device
+
+    def add_replay(self, device_id, path, speed=1.0, repeat=False):
+        """Registrar una captura grabada como si fuera una cámara"""
+        device = ReplayDevice(
+            device_id, path, speed, repeat, self.loop, self.on_frame, self.protocol
+        )
+        device.alert_engine = AlertEngine(rules_for(self.alert_config, device_id))
+        device.sample_filter = SampleFilter(**self.compression)
+        device.on_preview = self.on_preview
+        device.on_tensor = self.submit_tensor
+        self.devices[device_id] = device
+        self.discover_ports = False
+        return device
+
+    def submit_tensor(self, device, tensor):
+        self.fomo.submit(device, tensor)
+
+    def reload_alert_rules(self):
+        """Releer el archivo de reglas y reiniciar el estado de alertas"""
+        self.alert_config = load_rule_config()
+        for device in self:
+            device.alert_engine = AlertEngine(rules_for(self.alert_config, device.device_id))
+        return self.alert_config
+
+    def discover(self, ports=None):
+        """Registrar todas las cámaras detectadas; devuelve las nuevas"""
+        added = []
+        if ports is None:
+            ports = self.scan_ports(self.claimed_ports(), verbose=True)
+        for port in ports:
+            device_id = device_id_for_port(port)
+            if device_id not in self.devices:
+                logger.info("OpenMV detectado en: %s (id %s)", port.device, device_id)
+                added.append(self.add(device_id, port.device))
+        return added
+
+    async def connect_all(self):
+        """Abrir en paralelo todas las cámaras no conectadas"""
+        if self.discover_ports:
+            # La enumeración prueba puertos con handshake (bloqueante): fuera del event loop
+            try:
+                ports = await self.loop.run_in_executor(None, self.scan_ports, self.claimed_ports(), True)
+            except Exception:
+                # El supervisor de ConnectionManager vuelve a enumerar más tarde
+                logger.exception("Error enumerando puertos")
+                ports = []
+            self.discover(ports)
+
+        pending = [device for device in self if not device.is_connected]
+        if pending:
+            results = await asyncio.gather(*[
+                self.loop.run_in_executor(None, device.open) for device in pending
+            ])
+            for device, ok in zip(pending, results):
+                if not ok:
+                    logger.warning("[%s] No se pudo abrir %s", device.device_id, device.port)
+
+        return [device for device in self if device.is_connected]
+
+    def claimed_ports(self):
+        """Puertos abiertos por este proceso (no se prueban)"""
+        return {device.port for device in self if device.is_connected}
+
+    def scan_ports(self, exclude=(), verbose=False):
+        """Enumerar puertos OpenMV (bloqueante: ejecutar fuera del event loop)"""
+        return find_openmv_ports(verbose, self.discovery, exclude)
+
+    def locate(self, device, ports):
+        """Puerto actual de una cámara (sigue a la cámara si cambió de puerto)"""
+        for port in ports:
+            if device_id_for_port(port) == device.device_id:
+                return port.device
+
+        names = [port.device for port in ports]
+        if device.port in names:
+            return device.port
+
+        # Último puerto donde se abrió esta cámara
+        cached = self.discovery.cache.get(device.device_id)
+        if cached in names:
+            return cached
+
+        # Sin número de serie: adoptar el único puerto OpenMV libre
+        claimed = {other.port for other in self if other is not device}
+        free = [
+            port.device for port in ports
+            if port.device not in claimed and device_id_for_port(port) not in self.devices
+        ]
+        return free[0] if len(free) == 1 else device.port
+
+    def start_device(self, device):
+        """Comenzar a leer una cámara conectada (y grabarla si corresponde)"""
+        device.start_reading()
+        if not isinstance(device, ReplayDevice):
+            self.discovery.cache.remember(device.device_id, device.port)
+            if self.capture_dir:
+                device.start_capture(self.capture_dir)
+        device.set_state('connected', port=device.port)
+
+    def start_all(self):
+        for device in self:
+            if device.is_connected:
+                self.start_device(device)
+
+    def stop_all(self):
+        for device in self:
+            device.stop_reading()
+
+    def close_all(self):
+        for device in self:
+            device.close()
+
+
+class ReplayDevice(CameraDevice):
+    """Cámara simulada que reproduce una captura de openmv_replay.py"""
+
+    reconnectable = False
+
+    def __init__(self, device_id, path, speed=1.0, repeat=False, loop=None, on_frame=None, protocol='auto'):
+        super().__init__(device_id, path, loop=loop, on_frame=on_frame, protocol=protocol)
+        self.speed = speed
+        self.repeat = repeat
+        self.opened = False
+
+    @property
+    def is_connected(self):
+        return self.opened
+
+    def open(self):
+        self.opened = os.path.isfile(self.port)
+        if self.opened:
+            self.connects += 1
+            logger.info("[%s] Reproduciendo %s (velocidad %s)", self.device_id, self.port, self.speed or 'maxima')
+        else:
+            logger.error("[%s] No existe la captura %s", self.device_id, self.port)
+        return self.opened
+
+    def close(self):
+        self.stop_reading()
+        self.opened = False
+
+    def make_transport(self):
+        return ReplayTransport(
+            self.loop,
+            self.port,
+            self.on_serial_chunk,
+            self.on_serial_error,
+            speed=self.speed,
+            repeat=self.repeat
+        )
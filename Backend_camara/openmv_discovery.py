@@ -0,0 +1,221 @@
+"""
+Backend_camara/openmv_discovery.py
+
+Descubrimiento de cámaras OpenMV compartido por openmv_server.py y
+diagnostico_puerto.py.
+
+1. Se listan los puertos serie y se clasifican por VID/PID USB (coincidencia
+   fuerte) o por descripción (coincidencia débil: adaptadores genéricos).
+2. Los candidatos débiles se prueban en paralelo con un handshake corto que
+   reconoce la salida de ei_object_detection.py (texto o protocolo binario).
+3. El último puerto conocido de cada cámara se guarda en openmv_ports.json
+   para reconectar sin volver a probar.
+
+``OPENMV_USB_IDS`` agrega identificadores, por ejemplo ``1209:abd1,37c5:*``.
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+import serial
+import serial.tools.list_ports
+
+from openmv_logging import logger
+from openmv_protocol import BinaryFrameDecoder
+
+
+# (VID, PID) de las placas OpenMV; None acepta cualquier PID del fabricante
+OPENMV_USB_IDS = [
+    (0x1209, 0xABD1),   # OpenMV Cam (pid.codes)
+    (0x37C5, None),     # OpenMV LLC (firmware 4.x, RT1062)
+    (0x0483, 0x5740),   # STM32 VCP (placas OpenMV antiguas)
+]
+
+# Solo candidatos: requieren handshake para confirmarse
+OPENMV_KEYWORDS = ('OPENMV', 'USB SERIAL', 'CH340')
+
+# Marcas de la salida de texto de ei_object_detection.py
+HANDSHAKE_MARKERS = (b'**********', b'FPS:', b'[Sin detecciones]', b'\tscore ')
+
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'openmv_ports.json')
+
+PROBE_TIMEOUT = 1.5
+PROBE_BYTES = 2048
+
+# Segundos antes de volver a probar un puerto que no respondió
+REJECT_TTL = 60.0
+
+
+def parse_usb_ids(value):
+    """Lista 'VID:PID' (hex, PID '*' = cualquiera) desde texto"""
+    ids = []
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        vid, _, pid = item.partition(':')
+        try:
+            ids.append((int(vid, 16), None if pid in ('', '*') else int(pid, 16)))
+        except ValueError:
+            logger.warning("Identificador USB invalido: %s", item)
+    return ids
+
+
+def usb_ids():
+    return OPENMV_USB_IDS + parse_usb_ids(os.environ.get('OPENMV_USB_IDS'))
+
+
+def match_port(port, ids=None):
+    """Clasificar un puerto: 'usb_id', 'description' o None"""
+    for vid, pid in ids or usb_ids():
+        if port.vid == vid and (pid is None or port.pid == pid):
+            return 'usb_id'
+
+    text = f"{port.description} {port.hwid}".upper()
+    if any(keyword in text for keyword in OPENMV_KEYWORDS):
+        return 'description'
+    return None
+
+
+def port_key(port):
+    """Identificador estable del hardware (para recordar rechazos)"""
+    return f"{port.device}|{port.vid}|{port.pid}|{port.serial_number}"
+
+
+def recognize(data):
+    """Protocolo reconocido en bytes leídos del puerto: 'text', 'binary' o None"""
+    if any(marker in data for marker in HANDSHAKE_MARKERS):
+        return 'text'
+    if b'\x00' in data:
+        decoder = BinaryFrameDecoder()
+        decoder.feed(data)
+        if decoder.records:
+            return 'binary'
+    return None
+
+
+def probe_port(device, baudrate=115200, timeout=PROBE_TIMEOUT):
+    """Abrir un puerto y escuchar hasta reconocer la salida OpenMV o agotar el tiempo"""
+    result = {'port': device, 'protocol': None, 'bytes': 0, 'sample': b'', 'error': None}
+    try:
+        connection = serial.Serial(device, baudrate, timeout=0.1)
+    except (serial.SerialException, OSError) as e:
+        result['error'] = str(e)
+        return result
+
+    data = b''
+    deadline = time.monotonic() + timeout
+    try:
+        while time.monotonic() < deadline and len(data) < PROBE_BYTES:
+            data += connection.read(max(1, connection.in_waiting))
+            protocol = recognize(data)
+            if protocol:
+                result['protocol'] = protocol
+                break
+    except (serial.SerialException, OSError) as e:
+        result['error'] = str(e)
+    finally:
+        connection.close()
+
+    result['bytes'] = len(data)
+    result['sample'] = data[:80]
+    return result
+
+
+def probe_ports(devices, baudrate=115200, timeout=PROBE_TIMEOUT):
+    """Probar varios puertos en paralelo; devuelve {puerto: resultado}"""
+    devices = list(devices)
+    if not devices:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(8, len(devices))) as pool:
+        results = pool.map(lambda device: probe_port(device, baudrate, timeout), devices)
+        return {result['port']: result for result in results}
+
+
+class PortCache:
+    """Último puerto conocido de cada cámara (openmv_ports.json)"""
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self.entries = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def get(self, device_id):
+        entry = self.entries.get(device_id)
+        return entry['port'] if entry else None
+
+    def remember(self, device_id, port):
+        """Guardar el puerto donde se abrió la cámara"""
+        if self.get(device_id) == port or not self.path:
+            return
+        self.entries[device_id] = {'port': port, 'last_seen': time.time()}
+        try:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, indent=2)
+        except OSError as e:
+            logger.warning("No se pudo guardar %s: %s", self.path, e)
+
+
+class PortDiscovery:
+    """Encontrar los puertos OpenMV: VID/PID primero, handshake para el resto
+
+    Los puertos débiles que no responden al handshake no se vuelven a probar
+    durante ``REJECT_TTL`` segundos (el script de la cámara puede arrancar
+    más tarde).
+    """
+
+    def __init__(self, baudrate=115200, cache=None, probe_timeout=PROBE_TIMEOUT):
+        self.baudrate = baudrate
+        self.cache = cache if cache is not None else PortCache()
+        self.probe_timeout = probe_timeout
+        self.rejected = {}
+        self.protocols = {}
+        # Un escaneo a la vez: dos handshakes no deben abrir el mismo puerto
+        self._lock = Lock()
+
+    def scan(self, exclude=(), verbose=True):
+        """Puertos OpenMV presentes (bloqueante: ejecutar fuera del event loop)"""
+        with self._lock:
+            return self._scan(exclude, verbose)
+
+    def _scan(self, exclude, verbose):
+        ports = serial.tools.list_ports.comports()
+        ids = usb_ids()
+        cached = set(entry['port'] for entry in self.cache.entries.values())
+        now = time.monotonic()
+
+        found = []
+        to_probe = []
+        for port in ports:
+            if port.device in exclude:
+                found.append(port)
+                continue
+            match = match_port(port, ids)
+            if match == 'usb_id' or (match and port.device in cached):
+                found.append(port)
+            elif match and now - self.rejected.get(port_key(port), -REJECT_TTL) >= REJECT_TTL:
+                to_probe.append(port)
+
+        if to_probe:
+            results = probe_ports([port.device for port in to_probe], self.baudrate, self.probe_timeout)
+            for port in to_probe:
+                result = results[port.device]
+                if result['protocol']:
+                    self.protocols[port.device] = result['protocol']
+                    found.append(port)
+                elif not result['error']:
+                    # Ocupado (error) se reintenta; sin salida OpenMV se descarta
+                    self.rejected[port_key(port)] = now
+
+        if not found and verbose:
+            logger.warning(
+                "OpenMV no detectado automaticamente. Puertos disponibles:%s",
+                ''.join(f"\n   - {port.device}: {port.description} [{port.hwid}]" for port in ports) or " ninguno"
+            )
+
+        return found
@@ -0,0 +1,169 @@
+"""
+Backend_camara/openmv_encoding.py
+
+Codificaciones de mensajes websocket negociables por cliente.
+
+El cliente elige al conectar con parámetros en la URL, por ejemplo
+``ws://host:8765/?encoding=msgpack&delta=1``, o después con el comando
+``{"command": "set_encoding", "encoding": "msgpack", "delta": true}``.
+
+- ``json`` (por defecto): texto, compatible con el dashboard actual.
+- ``msgpack``: binario (requiere el paquete ``msgpack``).
+- ``delta``: ``tank_data`` completos solo como keyframe; entre keyframes se
+  envían ``tank_delta`` con los campos que cambiaron. Cada delta lleva ``seq``
+  y ``base``; si ``base`` no es el último ``seq`` aplicado, el cliente debe
+  esperar el siguiente keyframe (el servidor lo envía tras descartar datos).
+
+Cada actualización difundida lleva ``stream_seq`` (creciente en todo el
+servidor). Al reconectar, el cliente pide lo que se perdió con
+``ws://host:8765/?resume=<último stream_seq>&stream=<stream>`` (o con el
+comando ``resume``); ver ``Broadcaster.missed``.
+
+La vista previa JPEG (suscripción explícita al tipo ``preview``) siempre se
+envía como mensaje binario, con cualquier codificación:
+
+    <4sIdB>  b'OMPV', seq del frame, timestamp, longitud del device_id
+    device_id (UTF-8) y a continuación el JPEG tal cual
+"""
+
+import json
+import struct
+from urllib.parse import parse_qs, urlsplit
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+DEFAULT_ENCODING = 'json'
+
+# Frames de la cámara (como máximo) entre dos keyframes completos a los clientes delta
+KEYFRAME_INTERVAL = 30
+
+PREVIEW_MAGIC = b'OMPV'
+PREVIEW_HEADER = struct.Struct('<4sIdB')
+
+
+def available_encodings():
+    encodings = ['json']
+    if msgpack is not None:
+        encodings.append('msgpack')
+    return encodings
+
+
+def encode(payload, encoding=DEFAULT_ENCODING):
+    """Codificar un mensaje (str para JSON, bytes para MessagePack)"""
+    if encoding == 'msgpack':
+        return msgpack.packb(payload, use_bin_type=True)
+    return json.dumps(payload)
+
+
+class EncodedCache:
+    """Mensajes codificados una vez por (clave, codificación) y versión del estado
+
+    Los snapshots de conexión y el historial se codifican la primera vez que
+    alguien los pide y se reutilizan hasta que cambia la versión (por ejemplo
+    ``frame_seq`` de la cámara): una ola de reconexiones no vuelve a serializar
+    el mismo estado.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version, encoding, build):
+        """Mensaje codificado de ``build()``; se reconstruye solo si cambió ``version``"""
+        entry = self.entries.get((key, encoding))
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        message = encode(build(), encoding)
+        self.entries[(key, encoding)] = (version, message)
+        return message
+
+    def stats(self):
+        return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+
+def encode_preview(device_id, seq, timestamp, jpeg):
+    """Mensaje binario de vista previa (se arma una vez para todos los clientes)"""
+    name = device_id.encode('utf-8')[:255]
+    return PREVIEW_HEADER.pack(PREVIEW_MAGIC, seq, timestamp, len(name)) + name + jpeg
+
+
+def decode_preview(message):
+    """(device_id, seq, timestamp, jpeg) de un mensaje de vista previa"""
+    magic, seq, timestamp, length = PREVIEW_HEADER.unpack_from(message)
+    if magic != PREVIEW_MAGIC:
+        raise ValueError("No es un mensaje de vista previa")
+    start = PREVIEW_HEADER.size + length
+    return message[PREVIEW_HEADER.size:start].decode('utf-8'), seq, timestamp, message[start:]
+
+
+def decode(message):
+    """Decodificar un comando del cliente (texto JSON o binario MessagePack)"""
+    if isinstance(message, (bytes, bytearray)):
+        if msgpack is None:
+            raise ValueError("MessagePack no disponible")
+        return msgpack.unpackb(message, raw=False)
+    return json.loads(message)
+
+
+def normalize_encoding(encoding):
+    """Codificación soportada o None"""
+    encoding = (encoding or DEFAULT_ENCODING).lower()
+    return encoding if encoding in available_encodings() else None
+
+
+def compute_delta(previous, current):
+    """Campos de ``current`` que cambiaron respecto a ``previous``"""
+    if previous is None:
+        return dict(current)
+    return {key: value for key, value in current.items() if previous.get(key) != value}
+
+
+def _truthy(value):
+    return str(value).lower() in ('1', 'true', 'yes', 'si')
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def client_options(websocket):
+    """Leer encoding/delta y la posición de reanudación de la URL de conexión"""
+    request = getattr(websocket, 'request', None)
+    path = getattr(request, 'path', None) or getattr(websocket, 'path', '') or ''
+    query = parse_qs(urlsplit(path).query)
+
+    return {
+        'encoding': query.get('encoding', [DEFAULT_ENCODING])[0],
+        'delta': _truthy(query.get('delta', ['0'])[0]),
+        'resume': _int_or_none(query.get('resume', [None])[0]),
+        'stream': query.get('stream', [None])[0]
+    }
+
+
+def deflate_extensions(enabled=True):
+    """permessage-deflate ajustado para mensajes pequeños y muchas conexiones
+
+    Ventanas de 2^11 bytes y memLevel 4 reducen la memoria por conexión; el
+    contexto se mantiene entre mensajes para que los JSON repetitivos se
+    compriman bien.
+    """
+    if not enabled:
+        return []
+
+    from websockets.extensions.permessage_deflate import ServerPerMessageDeflateFactory
+
+    return [ServerPerMessageDeflateFactory(
+        server_max_window_bits=11,
+        client_max_window_bits=11,
+        compress_settings={'memLevel': 4}
+    )]
@@ -0,0 +1,285 @@
+"""
+Backend_camara/openmv_export.py
+
+Exportación masiva de ``readings`` y ``alerts`` a CSV o Parquet por rango de
+tiempo y cámaras, para análisis fuera de línea.
+
+Se ejecuta en su propio proceso y abre la base en solo lectura, así que el
+servidor sigue atendiendo mientras exporta. La lectura avanza por páginas
+(``timestamp``, ``id``) de ``--chunk`` filas sobre los índices de timestamp:
+cada página es una transacción de lectura corta, de modo que el escritor y
+los checkpoints del WAL nunca esperan a una exportación larga. Cada página
+se escribe y se descarta antes de leer la siguiente (memoria constante sin
+importar el rango).
+
+Sin ``--device`` las filas salen en orden cronológico; con ``--device`` salen
+agrupadas por cámara y en orden cronológico dentro de cada una. En CSV el
+timestamp queda como texto UTC de SQLite; en Parquet como timestamp UTC.
+Una base anterior a multi-cámara (sin ``device_id`` ni ``detection_count``)
+se exporta igual, con esas columnas vacías.
+Parquet requiere pyarrow (opcional) y escribe un row group por página.
+
+Uso:
+    python openmv_export.py [--start 2024-05-01] [--end 2024-05-02T12:00]
+                            [--device cam1 --device cam2] [--tables readings,alerts]
+                            [--format csv|csv.gz|parquet] [--output exportacion]
+    python openmv_export.py --tables readings --output - > readings.csv
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import os
+import sys
+import time
+
+from openmv_storage import DB_PATH, connect, from_db_time, parse_time, to_db_time
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+CHUNK_SIZE = 10000
+
+# Columnas exportadas por tabla: (nombre, tipo de pyarrow)
+TABLES = {
+    'readings': (
+        ('id', 'int64'),
+        ('device_id', 'string'),
+        ('timestamp', 'timestamp'),
+        ('percentage', 'int16'),
+        ('label', 'string'),
+        ('fps', 'float32'),
+        ('detection_x', 'int32'),
+        ('detection_y', 'int32'),
+        ('detection_score', 'float32'),
+        ('detection_count', 'int32'),
+    ),
+    'alerts': (
+        ('id', 'int64'),
+        ('device_id', 'string'),
+        ('timestamp', 'timestamp'),
+        ('level', 'string'),
+        ('message', 'string'),
+        ('percentage', 'int16'),
+    ),
+}
+
+FORMATS = ('csv', 'csv.gz', 'parquet')
+
+
+def column_expressions(conn, table):
+    """Expresión SELECT de cada columna exportada; NULL si la base no la tiene
+
+    La base se abre en solo lectura, así que una base sin migrar no recibe
+    las columnas de MIGRATIONS (openmv_storage.py) hasta que el servidor la abra.
+    """
+    existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+    return {
+        name: name if name in existing else f'NULL AS {name}'
+        for name, _ in TABLES[table]
+    }
+
+
+def iter_chunks(conn, table, device_id, start, end, chunk_size=CHUNK_SIZE, all_devices=True):
+    """Páginas de filas de ``table`` en orden (timestamp, id), una consulta por página
+
+    Cada consulta termina antes de devolver la página: no queda ningún cursor
+    ni transacción de lectura abierta mientras se escribe.
+    """
+    expressions = column_expressions(conn, table)
+    columns = ', '.join(expressions.values())
+    clauses = ['timestamp >= ?', 'timestamp < ?', '(timestamp > ? OR id > ?)']
+    if not all_devices:
+        # IS también encuentra las filas anteriores a multi-cámara (device_id NULL);
+        # sin la columna todas las filas son de esa época
+        device_column = 'device_id' if expressions['device_id'] == 'device_id' else 'NULL'
+        clauses.insert(0, f'{device_column} IS ?')
+    query = f'SELECT {columns} FROM {table} WHERE {" AND ".join(clauses)} ORDER BY timestamp, id LIMIT ?'
+
+    # Posición de timestamp e id dentro de cada fila
+    timestamp_index = 2
+    last_timestamp, last_id = to_db_time(start), -1
+    end_text = to_db_time(end)
+    while True:
+        params = [last_timestamp, end_text, last_timestamp, last_id, chunk_size]
+        if not all_devices:
+            params.insert(0, device_id)
+        rows = conn.execute(query, params).fetchall()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        last_timestamp, last_id = rows[-1][timestamp_index], rows[-1][0]
+
+
+def iter_table(conn, table, devices, start, end, chunk_size=CHUNK_SIZE, pause=0):
+    """Páginas de una tabla para todas las cámaras (None) o para cada una de ``devices``"""
+    targets = [None] if devices is None else devices
+    for device_id in targets:
+        for rows in iter_chunks(conn, table, device_id, start, end, chunk_size, devices is None):
+            yield rows
+            if pause:
+                # Ceder disco y CPU al servidor entre páginas
+                time.sleep(pause)
+
+
+class CsvSink:
+    """Escribir páginas de filas en CSV (o CSV comprimido con gzip)"""
+
+    def __init__(self, stream, columns):
+        self.stream = stream
+        self.writer = csv.writer(stream)
+        self.writer.writerow([name for name, _ in columns])
+
+    @classmethod
+    def open(cls, path, columns, compress=False):
+        if compress:
+            stream = io.TextIOWrapper(gzip.open(path, 'wb'), encoding='utf-8', newline='')
+        else:
+            stream = open(path, 'w', encoding='utf-8', newline='')
+        return cls(stream, columns)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+        self.stream.flush()
+
+    def close(self):
+        self.stream.close()
+
+
+class ParquetSink:
+    """Escribir páginas de filas en Parquet (un row group por página)"""
+
+    def __init__(self, path, columns):
+        if pa is None:
+            raise RuntimeError("Exportar a Parquet requiere pyarrow (pip install pyarrow)")
+        self.names = [name for name, _ in columns]
+        self.schema = pa.schema([(name, _arrow_type(type_name)) for name, type_name in columns])
+        self.timestamp_index = self.names.index('timestamp')
+        self.writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+
+    def write(self, rows):
+        arrays = []
+        for index, field in enumerate(self.schema):
+            values = [row[index] for row in rows]
+            if index == self.timestamp_index:
+                values = [round(from_db_time(value) * 1e6) if value else None for value in values]
+            arrays.append(pa.array(values, type=field.type))
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def _arrow_type(type_name):
+    if type_name == 'timestamp':
+        return pa.timestamp('us', tz='UTC')
+    return getattr(pa, type_name)()
+
+
+def open_sink(path, table, fmt):
+    columns = TABLES[table]
+    if path == '-':
+        return CsvSink(sys.stdout, columns)
+    if fmt == 'parquet':
+        return ParquetSink(path, columns)
+    return CsvSink.open(path, columns, compress=fmt == 'csv.gz')
+
+
+def export_table(db_path, table, path, fmt='csv', devices=None, start=0, end=None,
+                 chunk_size=CHUNK_SIZE, pause=0):
+    """Exportar una tabla a ``path`` ('-' = stdout en CSV); devuelve la cantidad de filas
+
+    El archivo se escribe con extensión .tmp y se renombra al terminar: una
+    exportación interrumpida no deja un archivo que parezca completo.
+    """
+    if end is None:
+        end = time.time()
+    target = path if path == '-' else path + '.tmp'
+
+    conn = connect(db_path, readonly=True)
+    sink = open_sink(target, table, fmt)
+    count = 0
+    try:
+        for rows in iter_table(conn, table, devices, start, end, chunk_size, pause):
+            sink.write(rows)
+            count += len(rows)
+    except BaseException:
+        if path != '-':
+            sink.close()
+            os.remove(target)
+        raise
+    finally:
+        conn.close()
+
+    if path != '-':
+        sink.close()
+        os.replace(target, path)
+    return count
+
+
+def _parse_time_arg(value):
+    """Epoch o fecha ISO (hora local si no trae zona) de la línea de comandos"""
+    try:
+        return float(value)
+    except ValueError:
+        return parse_time(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exportar readings y alerts a CSV o Parquet")
+    parser.add_argument('--db', default=DB_PATH, help="base SQLite del servidor")
+    parser.add_argument('--start', type=_parse_time_arg, default=0.0, help="inicio (epoch o ISO), por defecto todo")
+    parser.add_argument('--end', type=_parse_time_arg, default=None, help="fin exclusivo (epoch o ISO), por defecto ahora")
+    parser.add_argument('--device', action='append', default=None,
+                        help="cámara a exportar (repetible o separadas por comas), por defecto todas")
+    parser.add_argument('--tables', default='readings,alerts', help="tablas separadas por comas")
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--output', default='.', help="directorio de salida, o - para CSV por stdout")
+    parser.add_argument('--chunk', type=int, default=CHUNK_SIZE, help="filas por página")
+    parser.add_argument('--pause', type=float, default=0.0, help="segundos de pausa entre páginas")
+    args = parser.parse_args(argv)
+
+    tables = [table.strip() for table in args.tables.split(',') if table.strip()]
+    unknown = [table for table in tables if table not in TABLES]
+    if unknown or not tables:
+        parser.error(f"Tablas no validas: {', '.join(unknown) or args.tables}")
+    if args.output == '-' and (len(tables) != 1 or args.format != 'csv'):
+        parser.error("La salida por stdout admite una sola tabla en CSV")
+    if args.format == 'parquet' and pa is None:
+        parser.error("Exportar a Parquet requiere pyarrow (pip install pyarrow)")
+    if args.chunk <= 0:
+        parser.error("--chunk debe ser mayor que 0")
+    if not os.path.exists(args.db):
+        parser.error(f"No existe la base {args.db}")
+
+    devices = None
+    if args.device:
+        devices = [device.strip() for value in args.device for device in value.split(',') if device.strip()]
+    # Fin fijo para todas las tablas: las filas que llegan durante la exportación quedan afuera
+    end = args.end if args.end is not None else time.time()
+
+    if args.output != '-':
+        os.makedirs(args.output, exist_ok=True)
+    for table in tables:
+        path = args.output if args.output == '-' else os.path.join(args.output, f"{table}.{args.format}")
+        started = time.perf_counter()
+        try:
+            count = export_table(args.db, table, path, args.format, devices, args.start, end, args.chunk, args.pause)
+        except BrokenPipeError:
+            # Salida por stdout cortada (por ejemplo con | head): terminar sin traza
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            sys.exit(1)
+        elapsed = time.perf_counter() - started
+        print(f"{table}: {count} filas -> {path} ({elapsed:.1f} s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+"""
+Backend_camara/openmv_fomo.py
+
+Post-procesamiento FOMO en el host (versión NumPy de ``fomo_post_process``
+de ei_object_detection.py).
+
+Con ``FOMO_ON_HOST = True`` la cámara solo ejecuta el modelo y envía el
+tensor de salida cuantizado a 0-255 (registro tipo 4 de openmv_protocol.py).
+El servidor reproduce lo que hace la cámara con ``find_blobs``:
+
+- umbral: píxeles con valor >= ceil(min_confidence * 255)
+- blobs: componentes 4-conexas; solo cuentan las que contienen un píxel de
+  la grilla de búsqueda (x % x_stride == 0, y % y_stride == 0), con al
+  menos ``pixels_threshold`` píxeles y área del rectángulo >= ``area_threshold``
+- score: media entera de los píxeles sobre el umbral dentro del rectángulo
+  (``get_statistics(thresholds, roi=rect).l_mean()``) / 255
+- rectángulo escalado con roi/scale/offset y centro como en el bucle principal
+
+Los tensores de varias cámaras con la misma forma se procesan juntos en una
+sola llamada. Con menos de ``SCALAR_BATCH`` tensores de una forma (una sola
+cámara, lo habitual) el costo fijo de NumPy supera al del port escalar línea
+a línea del código de la cámara (``process_scalar``), que se usa en su lugar
+y también cuando NumPy no está instalado. bench_fomo.py mide ambos y
+tests/test_fomo.py verifica los dos contra tensores fijos.
+"""
+
+import asyncio
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Lote mínimo (tensores de la misma forma) para usar la versión NumPy
+SCALAR_BATCH = 16
+
+
+def available():
+    return np is not None
+
+
+class FomoPostProcessor:
+    """Umbral, etiquetado, score y mapeo de coordenadas vectorizados por lote"""
+
+    def __init__(self, min_confidence=0.7, x_stride=3, y_stride=3, area_threshold=3, pixels_threshold=3,
+                 scalar_batch=SCALAR_BATCH):
+        self.min_confidence = min_confidence
+        self.scalar_batch = scalar_batch
+        self.x_stride = x_stride
+        self.y_stride = y_stride
+        self.area_threshold = area_threshold
+        self.pixels_threshold = pixels_threshold
+
+    @property
+    def threshold(self):
+        return math.ceil(self.min_confidence * 255)
+
+    def process(self, tensors):
+        """Detecciones [(clase, x, y, w, h, score)] de cada tensor, en orden
+
+        Se ignora la clase 0 (fondo), igual que en la cámara.
+        """
+        results = [None] * len(tensors)
+        groups = {}
+        for index, tensor in enumerate(tensors):
+            groups.setdefault(tensor.shape, []).append(index)
+
+        for shape, indexes in groups.items():
+            if np is None or len(indexes) < self.scalar_batch:
+                for i in indexes:
+                    results[i] = self.process_scalar(tensors[i])
+                continue
+            batch = np.stack([
+                np.frombuffer(tensors[i].data, dtype=np.uint8).reshape(shape) for i in indexes
+            ])
+            rois = np.array([tensors[i].roi for i in indexes], dtype=np.float64)
+            for i, detections in zip(indexes, self.process_batch(batch, rois)):
+                results[i] = detections
+        return results
+
+    def process_scalar(self, tensor):
+        """Port escalar de fomo_post_process + cálculo de centros del bucle principal"""
+        oh, ow, oc = tensor.shape
+        roi = tensor.roi
+        threshold = self.threshold
+
+        x_scale = roi[2] / ow
+        y_scale = roi[3] / oh
+
+        scale = min(x_scale, y_scale)
+
+        x_offset = ((roi[2] - (ow * scale)) / 2) + roi[0]
+        y_offset = ((roi[3] - (ow * scale)) / 2) + roi[1]
+
+        detections = []
+        # La clase 0 es el fondo
+        for i in range(1, oc):
+            plane = tensor.data[i::oc]
+            blobs = find_blobs(
+                plane, oh, ow, threshold, self.x_stride, self.y_stride,
+                self.area_threshold, self.pixels_threshold
+            )
+            for rect in blobs:
+                x, y, w, h = rect
+                score = l_mean(plane, ow, threshold, rect) / 255.0
+                x = int((x * scale) + x_offset)
+                y = int((y * scale) + y_offset)
+                w = int(w * scale)
+                h = int(h * scale)
+                center_x = math.floor(x + (w / 2))
+                center_y = math.floor(y + (h / 2))
+                detections.append((i, center_x, center_y, w, h, score))
+        return detections
+
+    def process_batch(self, heat, rois):
+        """``heat`` (N, H, W, C) uint8 y ``rois`` (N, 4); devuelve N listas"""
+        count, height, width, classes = heat.shape
+        results = [[] for _ in range(count)]
+        if classes < 2:
+            return results
+
+        # Una imagen por (tensor, clase sin fondo): (N * (C - 1), H, W)
+        planes = np.ascontiguousarray(heat[..., 1:].transpose(0, 3, 1, 2)).reshape(-1, height, width)
+        mask = planes >= self.threshold
+        if not mask.any():
+            return results
+
+        blobs = self._blobs(planes, mask)
+        if blobs is None:
+            return results
+        plane, min_x, min_y, max_x, max_y, score = blobs
+
+        tensor = plane // (classes - 1)
+        class_index = plane % (classes - 1) + 1
+        bx, by = min_x, min_y
+        bw, bh = max_x - min_x + 1, max_y - min_y + 1
+
+        # Mapeo de la cámara (y_offset usa ow, igual que fomo_post_process)
+        roi = rois[tensor]
+        x_scale = roi[:, 2] / width
+        y_scale = roi[:, 3] / height
+        scale = np.minimum(x_scale, y_scale)
+        x_offset = ((roi[:, 2] - (width * scale)) / 2) + roi[:, 0]
+        y_offset = ((roi[:, 3] - (width * scale)) / 2) + roi[:, 1]
+
+        x = np.trunc(bx * scale + x_offset).astype(np.int64)
+        y = np.trunc(by * scale + y_offset).astype(np.int64)
+        w = np.trunc(bw * scale).astype(np.int64)
+        h = np.trunc(bh * scale).astype(np.int64)
+        center_x = np.floor(x + w / 2).astype(np.int64)
+        center_y = np.floor(y + h / 2).astype(np.int64)
+
+        for row in zip(tensor.tolist(), class_index.tolist(), center_x.tolist(), center_y.tolist(),
+                       w.tolist(), h.tolist(), score.tolist()):
+            results[row[0]].append(row[1:])
+        return results
+
+    def _blobs(self, planes, mask):
+        """Blobs válidos ordenados como los devuelve find_blobs
+
+        Se trabaja solo con los píxeles sobre el umbral (pocos en un mapa de
+        calor FOMO). Devuelve arrays (plano, min_x, min_y, max_x, max_y,
+        score) o None.
+        """
+        count, height, width = planes.shape
+        pixels = np.flatnonzero(mask)
+        labels = label_pixels(pixels, height, width)
+
+        components, component = np.unique(labels, return_inverse=True)
+        order = np.argsort(component, kind='stable')
+        pixels = pixels[order]
+        sizes = np.bincount(component)
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+
+        plane = pixels[starts] // (height * width)
+        xs = pixels % width
+        ys = (pixels // width) % height
+        min_x = np.minimum.reduceat(xs, starts)
+        max_x = np.maximum.reduceat(xs, starts)
+        min_y = np.minimum.reduceat(ys, starts)
+        max_y = np.maximum.reduceat(ys, starts)
+
+        # find_blobs solo arranca un blob en los píxeles de la grilla de
+        # búsqueda; el orden de salida es el del primer píxel de la grilla
+        seeds = (xs % self.x_stride == 0) & (ys % self.y_stride == 0)
+        first_seed = np.minimum.reduceat(np.where(seeds, pixels, mask.size), starts)
+
+        keep = (
+            (first_seed < mask.size) &
+            (sizes >= self.pixels_threshold) &
+            ((max_x - min_x + 1) * (max_y - min_y + 1) >= self.area_threshold)
+        )
+        if not keep.any():
+            return None
+
+        by_seed = np.argsort(first_seed[keep], kind='stable')
+        plane, min_x, min_y, max_x, max_y = (
+            values[keep][by_seed] for values in (plane, min_x, min_y, max_x, max_y)
+        )
+
+        # Suma y cantidad de píxeles sobre el umbral en cada rectángulo
+        # (tablas de áreas sumadas, solo de los planos con blobs)
+        used, slot = np.unique(plane, return_inverse=True)
+        used_mask = mask[used]
+        masked = np.where(used_mask, planes[used], 0).astype(np.int64)
+        total = _rect_sums(_summed_area(masked), slot, min_x, min_y, max_x, max_y)
+        inside = _rect_sums(_summed_area(used_mask.astype(np.int64)), slot, min_x, min_y, max_x, max_y)
+        score = (total // inside) / 255.0
+
+        return plane, min_x, min_y, max_x, max_y, score
+
+
+def find_blobs(plane, height, width, threshold, x_stride, y_stride, area_threshold, pixels_threshold):
+    """find_blobs de OpenMV sobre una imagen en escala de grises (secuencia plana)"""
+    visited = [False] * (height * width)
+    blobs = []
+    for y in range(0, height, y_stride):
+        for x in range(0, width, x_stride):
+            start = y * width + x
+            if visited[start] or plane[start] < threshold:
+                continue
+
+            # Relleno 4-conexo desde la semilla
+            visited[start] = True
+            stack = [start]
+            pixels = 0
+            min_x, min_y, max_x, max_y = x, y, x, y
+            while stack:
+                index = stack.pop()
+                py, px = divmod(index, width)
+                pixels += 1
+                min_x, max_x = min(min_x, px), max(max_x, px)
+                min_y, max_y = min(min_y, py), max(max_y, py)
+                for ny, nx in ((py - 1, px), (py + 1, px), (py, px - 1), (py, px + 1)):
+                    if 0 <= ny < height and 0 <= nx < width:
+                        neighbor = ny * width + nx
+                        if not visited[neighbor] and plane[neighbor] >= threshold:
+                            visited[neighbor] = True
+                            stack.append(neighbor)
+
+            w, h = max_x - min_x + 1, max_y - min_y + 1
+            if pixels >= pixels_threshold and w * h >= area_threshold:
+                blobs.append((min_x, min_y, w, h))
+    return blobs
+
+
+def l_mean(plane, width, threshold, rect):
+    """get_statistics(thresholds, roi=rect).l_mean(): media entera sobre el umbral"""
+    x, y, w, h = rect
+    total = count = 0
+    for py in range(y, y + h):
+        for px in range(x, x + w):
+            value = plane[py * width + px]
+            if value >= threshold:
+                total += value
+                count += 1
+    return total // count if count else 0
+
+
+def label_pixels(pixels, height, width):
+    """Componentes 4-conexas de los píxeles activos de un lote de planos (H, W)
+
+    ``pixels`` son los índices planos ordenados de los píxeles activos. Cada
+    píxel termina con la posición (en ``pixels``) del menor de su
+    componente: propagación del mínimo por las aristas derecha/abajo con
+    salto de punteros (la etiqueta de la etiqueta) para converger en pocas
+    pasadas.
+    """
+    count = len(pixels)
+    labels = np.arange(count)
+    if count < 2:
+        return labels
+
+    first, second = [], []
+    for step, inside in (
+        (1, pixels % width != width - 1),
+        (width, (pixels // width) % height != height - 1),
+    ):
+        target = pixels + step
+        position = np.minimum(np.searchsorted(pixels, target), count - 1)
+        linked = inside & (pixels[position] == target)
+        first.append(np.flatnonzero(linked))
+        second.append(position[linked])
+    first = np.concatenate(first)
+    second = np.concatenate(second)
+    if not len(first):
+        return labels
+
+    while True:
+        lowest = np.minimum(labels[first], labels[second])
+        merged = labels.copy()
+        np.minimum.at(merged, first, lowest)
+        np.minimum.at(merged, second, lowest)
+        merged = merged[merged]
+
+        if np.array_equal(merged, labels):
+            return labels
+        labels = merged
+
+
+def _summed_area(values):
+    table = np.zeros((values.shape[0], values.shape[1] + 1, values.shape[2] + 1), dtype=np.int64)
+    table[:, 1:, 1:] = values.cumsum(axis=1).cumsum(axis=2)
+    return table
+
+
+def _rect_sums(table, plane, min_x, min_y, max_x, max_y):
+    return (
+        table[plane, max_y + 1, max_x + 1] - table[plane, min_y, max_x + 1]
+        - table[plane, max_y + 1, min_x] + table[plane, min_y, min_x]
+    )
+
+
+class FomoBatcher:
+    """Post-procesar juntos los tensores recibidos en la misma vuelta del event loop
+
+    Los lectores de todas las cámaras corren en el mismo loop: los tensores
+    que llegan en una vuelta se acumulan y se procesan con una sola llamada.
+    """
+
+    def __init__(self, processor=None):
+        self.processor = processor or FomoPostProcessor()
+        self.batches = 0
+        self.tensors = 0
+        self._pending = []
+        self._scheduled = False
+
+    def submit(self, device, tensor):
+        self._pending.append((device, tensor))
+        if not self._scheduled:
+            self._scheduled = True
+            asyncio.get_running_loop().call_soon(self.flush)
+
+    def flush(self):
+        pending, self._pending = self._pending, []
+        self._scheduled = False
+        if not pending:
+            return
+
+        results = self.processor.process([tensor for _, tensor in pending])
+        self.batches += 1
+        self.tensors += len(pending)
+
+        for (device, tensor), detections in zip(pending, results):
+            if device.is_monitoring:
+                device.handle_frame(device.binary_decoder.make_frame(tensor.fps, detections))
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'tensors': self.tensors,
+            'min_confidence': self.processor.min_confidence
+        }
@@ -0,0 +1,144 @@
+"""
+Backend_camara/openmv_frames.py
+"""
+
+import time
+from collections import namedtuple
+
+
+class Detection(namedtuple('Detection', 'label x y score w h', defaults=(None, None))):
+    """Detección individual dentro de un frame (centro x/y; w/h solo en modo binario)"""
+
+    __slots__ = ()
+
+    def to_dict(self):
+        data = {
+            'label': self.label,
+            'x': self.x,
+            'y': self.y,
+            'score': self.score
+        }
+        if self.w is not None:
+            data['w'] = self.w
+            data['h'] = self.h
+        return data
+
+
+class Frame(namedtuple('Frame', 'label percentage detections fps timestamp')):
+    """Frame completo de la cámara (inmutable)"""
+
+    __slots__ = ()
+
+    @property
+    def best_detection(self):
+        """Detección con mayor score o None"""
+        if not self.detections:
+            return None
+        return max(self.detections, key=lambda d: d.score)
+
+    def to_dict(self):
+        return {
+            'label': self.label,
+            'percentage': self.percentage,
+            'detections': [d.to_dict() for d in self.detections],
+            'fps': self.fps,
+            'timestamp': self.timestamp
+        }
+
+
+def parse_percentage(label):
+    """Extraer el porcentaje de una etiqueta 'nivel_XX'"""
+    if label and "nivel_" in label:
+        try:
+            return int(label.split("_")[1])
+        except (IndexError, ValueError):
+            pass
+    return None
+
+
+class FrameAssembler:
+    """Agrupar las líneas de ei_object_detection.py en un frame por captura
+
+    El script de la cámara imprime por cada captura una cabecera
+    ``********** label **********`` por clase, una línea ``x .. y .. score ..``
+    por detección, ``FPS: ..``, opcionalmente ``[Sin detecciones]`` y una línea
+    en blanco. El frame se emite al recibir la línea en blanco, o al llegar la
+    cabecera de una captura nueva si la línea en blanco se perdió.
+    """
+
+    MAX_DETECTIONS = 256
+
+    def __init__(self):
+        self.parse_errors = 0
+        self._reset()
+
+    def _reset(self):
+        self._label = None
+        self._detections = []
+        self._fps = None
+        self._active = False
+
+    def feed(self, line):
+        """Procesar una línea; devuelve un Frame cuando se completa"""
+        line = line.strip()
+
+        if not line:
+            return self.flush()
+
+        # Detectar etiqueta de clase
+        if "**********" in line:
+            frame = self.flush() if self._fps is not None else None
+            self._label = line.replace("*", "").strip()
+            self._active = True
+            return frame
+
+        # Detectar coordenadas y score
+        if line.startswith("x "):
+            parts = line.split("\t")
+            if len(parts) >= 3 and len(self._detections) < self.MAX_DETECTIONS:
+                try:
+                    self._detections.append(Detection(
+                        self._label,
+                        int(parts[0].split()[1]),
+                        int(parts[1].split()[1]),
+                        float(parts[2].split()[1])
+                    ))
+                    self._active = True
+                except (IndexError, ValueError):
+                    self.parse_errors += 1
+            else:
+                self.parse_errors += 1
+            return None
+
+        # Detectar FPS
+        if line.startswith("FPS:"):
+            try:
+                self._fps = float(line.split(":")[1].strip())
+                self._active = True
+            except (IndexError, ValueError):
+                self.parse_errors += 1
+            return None
+
+        if line.startswith("[Sin detecciones]"):
+            self._active = True
+
+        return None
+
+    def flush(self):
+        """Cerrar el frame en curso si contiene datos"""
+        if not self._active:
+            return None
+
+        detections = tuple(self._detections)
+        best = max(detections, key=lambda d: d.score) if detections else None
+        label = best.label if best else self._label
+
+        frame = Frame(
+            label,
+            parse_percentage(label),
+            detections,
+            self._fps,
+            time.time()
+        )
+        self._reset()
+        return frame
@@ -0,0 +1,217 @@
+"""
+Backend_camara/openmv_frontend.py
+
+Modo multiproceso: un proceso de ingestión (puertos serie, parseo, alertas,
+SQLite) y varios procesos websocket que atienden a los clientes.
+
+El proceso de ingestión publica cada mensaje (tank_data, alert, status,
+device_state y el resumen de cámaras) una sola vez, ya codificado en JSON,
+en el buffer compartido de openmv_ring.py. Cada proceso websocket lo sigue
+y reenvía el mismo texto a sus clientes JSON: sin volver a parsear la
+salida de la cámara ni recodificar. Así la cantidad de conexiones escala
+con los núcleos.
+
+Cada tank_data trae en el buffer la muestra de historial ya extraída
+(timestamp, nivel, fps, detección): el historial en columnas de cada
+proceso se alimenta sin parsear el JSON. Las alertas se guardan como texto
+y se parsean solo al armar /api/alerts (una vez por versión).
+
+    OPENMV_WORKERS=4 python openmv_server.py
+
+Con SO_REUSEPORT (Linux/BSD) todos los procesos escuchan en el mismo puerto
+y el kernel reparte las conexiones; sin él (Windows) cada proceso usa el
+puerto siguiente (8765, 8766, ...).
+
+Los comandos que actúan sobre las cámaras (start, stop, reglas de alerta,
+líneas crudas) solo los atiende el proceso de ingestión, que arranca el
+monitoreo solo. La vista previa JPEG no pasa por el buffer compartido.
+
+Cada entrada del buffer lleva el ``stream_seq`` asignado por la ingestión:
+todos los procesos numeran igual y un cliente puede reanudar (``resume``)
+en un proceso distinto del que usaba antes de desconectarse.
+"""
+
+import asyncio
+import json
+import multiprocessing
+import socket
+from openmv_logging import logger, setup_logging, stop_logging
+from openmv_ring import RingReader, RingWriter
+from openmv_server import EMPTY_DATA, OpenMVServer
+from openmv_storage import DB_PATH
+from openmv_timeseries import RECENT_POINTS, HistoryBuffer
+
+
+# Segundos entre lecturas del buffer cuando no hay mensajes nuevos
+RING_POLL = 0.005
+
+
+class FrontendServer(OpenMVServer):
+    """Servidor websocket que difunde lo publicado por el proceso de ingestión"""
+
+    unsupported_commands = ('start', 'stop', 'reload_alert_rules', 'get_alert_rules', 'get_raw_lines')
+
+    def __init__(self, ring_name, stream_id=None, db_path=DB_PATH, ws_deflate=True, poll_interval=RING_POLL):
+        # Sin escritor de SQLite propio: la base solo se lee (historial por rango)
+        super().__init__(db_path=None, ws_deflate=ws_deflate)
+        self.db_path = db_path
+        self.ring_reader = RingReader(ring_name)
+        self.poll_interval = poll_interval
+        # Mismo stream que la ingestión: un cliente puede reanudar en cualquier proceso
+        if stream_id:
+            self.broadcaster.stream_id = stream_id
+        # Último tank_data (stream_seq, texto JSON) e historial en columnas de cada cámara
+        self.latest = {}
+        self.histories = {}
+        self.history_seqs = {}
+        self.device_info = []
+
+    async def follow_ring(self):
+        """Leer el buffer compartido y difundir cada mensaje nuevo"""
+        while self.is_running:
+            entries = self.ring_reader.poll()
+            if not entries:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            for _, stream_seq, kind, device_id, origin, message, sample in entries:
+                self.apply_entry(kind, device_id, origin, message.decode('utf-8'), stream_seq, sample)
+            await asyncio.sleep(0)
+
+    def apply_entry(self, kind, device_id, origin, text, stream_seq=None, sample=None):
+        if kind == 'devices':
+            summary = json.loads(text)
+            self.device_info = summary['data']
+            self.is_monitoring = summary['is_monitoring']
+            return
+
+        if kind == 'tank_data':
+            self.latest[device_id] = (stream_seq, text)
+            if sample is not None:
+                self.add_sample(device_id, sample, stream_seq)
+        elif kind == 'status':
+            status = json.loads(text)
+            self.is_monitoring = status.get('is_monitoring', self.is_monitoring)
+            self.device_info = status.get('devices', self.device_info)
+        elif kind == 'alert':
+            self.alert_log.append((stream_seq, text))
+
+        self.broadcaster.publish_encoded(kind, text, device_id, origin, stream_seq)
+        self.http_api.notify()
+
+    def describe_devices(self):
+        return self.device_info
+
+    def is_serial_open(self, device_id=None):
+        for info in self.device_info:
+            if device_id is None or info.get('device_id') == device_id:
+                return bool(info.get('connected'))
+        return False
+
+    def snapshot_messages(self, encoding):
+        # Los clientes JSON reciben el texto tal como llegó del buffer
+        if encoding == 'json':
+            return [(device_id, text) for device_id, (_, text) in self.latest.items()]
+        return [
+            (device_id, self.encoded_cache.get(
+                ('tank_data', device_id), stream_seq, encoding, lambda text=text: json.loads(text)
+            ))
+            for device_id, (stream_seq, text) in self.latest.items()
+        ]
+
+    def device_status(self, device_id=None):
+        if device_id is None:
+            device_id = next(iter(self.latest), None)
+        entry = self.latest.get(device_id)
+        if entry is None:
+            return None, dict(EMPTY_DATA)
+        return device_id, json.loads(entry[1])['data']
+
+    def add_sample(self, device_id, sample, stream_seq):
+        """Agregar la muestra de un tank_data (ver openmv_ring.py) al historial de la cámara"""
+        history = self.histories.get(device_id)
+        if history is None:
+            history = self.histories[device_id] = HistoryBuffer()
+        history.append_values(*sample)
+        self.history_seqs[device_id] = stream_seq
+
+    def recent_alerts(self):
+        return [json.loads(text)['data'] for _, text in self.alert_log]
+
+    def recent_history(self, device_id=None, limit=RECENT_POINTS):
+        if device_id is None:
+            device_id = next(iter(self.histories), None)
+        history = self.histories.get(device_id)
+        if history is None:
+            return None, []
+        return device_id, history.recent(limit)
+
+    def window_stats(self, device_id=None, windows=(60,)):
+        if device_id is None:
+            device_id = next(iter(self.histories), None)
+        history = self.histories.get(device_id)
+        if history is None:
+            return None, []
+        return device_id, [history.window_stats(seconds) for seconds in windows]
+
+    def history_version(self, device_id=None):
+        if device_id is None:
+            device_id = next(iter(self.histories), None)
+        return (device_id, self.history_seqs[device_id]) if device_id in self.histories else None
+
+    async def start_server(self, host='localhost', port=8765, reuse_port=False):
+        self.is_running = True
+        asyncio.get_running_loop().create_task(self.follow_ring())
+        await super().start_server(host, port, reuse_port)
+
+    def shutdown(self):
+        self.is_running = False
+        self.ring_reader.close()
+        stop_logging()
+
+
+def run_frontend(ring_name, stream_id, db_path, host, port, reuse_port, ws_deflate=True):
+    """Punto de entrada de cada proceso websocket"""
+    server = FrontendServer(ring_name, stream_id, db_path, ws_deflate)
+    try:
+        asyncio.run(server.start_server(host, port, reuse_port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+
+def serve_multiprocess(server, workers, host='0.0.0.0', port=8765):
+    """Ejecutar la ingestión en este proceso y ``workers`` procesos websocket"""
+    ring = RingWriter()
+    server.broadcaster.ring = ring
+    reuse_port = hasattr(socket, 'SO_REUSEPORT')
+
+    processes = []
+    for index in range(workers):
+        process = multiprocessing.Process(
+            target=run_frontend,
+            args=(ring.name, server.broadcaster.stream_id, server.db_path, host,
+                  port if reuse_port else port + index,
+                  reuse_port, server.ws_deflate),
+            name=f"openmv-ws-{index}",
+            daemon=True
+        )
+        process.start()
+        processes.append(process)
+
+    # Después de crear los procesos: el hilo del log no sobrevive al fork
+    setup_logging()
+    if reuse_port:
+        logger.info("%d procesos websocket compartiendo ws://%s:%d (SO_REUSEPORT)", workers, host, port)
+    else:
+        logger.info("SO_REUSEPORT no disponible: procesos websocket en los puertos %d-%d",
+                    port, port + workers - 1)
+
+    try:
+        asyncio.run(server.run_ingestion())
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join(timeout=5)
+        ring.close()
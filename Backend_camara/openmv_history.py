@@ -0,0 +1,214 @@
+"""
+Backend_camara/openmv_history.py
+"""
+
+from itertools import islice
+from openmv_storage import ROLLUPS, connect, from_db_time, to_db_time
+
+
+MAX_POINTS = 5000
+CHUNK_SIZE = 500
+FETCH_SIZE = 1000
+
+# Epoch en segundos a partir del texto de fecha de SQLite
+EPOCH_SQL = "(julianday(timestamp) - 2440587.5) * 86400.0"
+
+
+def _range_filter(device_id, start, end):
+    """WHERE por rango de tiempo (usa los índices de timestamp)"""
+    clauses = ['timestamp >= ?', 'timestamp < ?']
+    params = [to_db_time(start), to_db_time(end)]
+    if device_id is not None:
+        clauses.insert(0, 'device_id = ?')
+        params.insert(0, device_id)
+    return ' AND '.join(clauses), params
+
+
+def count_readings(conn, device_id, start, end):
+    where, params = _range_filter(device_id, start, end)
+    return conn.execute(f'SELECT COUNT(*) FROM readings WHERE {where}', params).fetchone()[0]
+
+
+def iter_readings(conn, device_id, start, end, fetch_size=FETCH_SIZE):
+    """Recorrer (epoch, percentage) en orden sin cargar todo en memoria"""
+    where, params = _range_filter(device_id, start, end)
+    cursor = conn.execute(
+        f'SELECT timestamp, percentage FROM readings WHERE {where} ORDER BY timestamp',
+        params
+    )
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            break
+        for timestamp, percentage in rows:
+            yield from_db_time(timestamp), percentage
+
+
+def iter_buckets(conn, device_id, start, end, points):
+    """Buckets min/max/avg calculados por SQLite (una fila por bucket)"""
+    width = max((end - start) / points, 1e-6)
+    where, params = _range_filter(device_id, start, end)
+    cursor = conn.execute(
+        f'''SELECT CAST(({EPOCH_SQL} - ?) / ? AS INTEGER) AS bucket,
+                   MIN(percentage), MAX(percentage), AVG(percentage), COUNT(*)
+            FROM readings WHERE {where}
+            GROUP BY bucket ORDER BY bucket''',
+        [start, width] + params
+    )
+    for bucket, minimum, maximum, average, count in cursor:
+        yield {
+            'timestamp': start + bucket * width,
+            'min': minimum,
+            'max': maximum,
+            'avg': round(average, 2),
+            'count': count
+        }
+
+
+def pick_rollup(width):
+    """Agregado más grueso cuyo bucket cabe en el ancho pedido (o None)"""
+    chosen = None
+    for table, table_width in ROLLUPS:
+        if table_width <= width:
+            chosen = (table, table_width)
+    return chosen
+
+
+def _rollup_filter(device_id, start, end, table_width):
+    clauses = ['bucket >= ?', 'bucket < ?']
+    params = [int(start // table_width) * table_width, end]
+    if device_id is not None:
+        clauses.insert(0, 'device_id = ?')
+        params.insert(0, device_id)
+    return ' AND '.join(clauses), params
+
+
+def count_rollup(conn, table, table_width, device_id, start, end):
+    where, params = _rollup_filter(device_id, start, end, table_width)
+    return conn.execute(
+        f'SELECT COALESCE(SUM(count), 0) FROM {table} WHERE {where}', params
+    ).fetchone()[0]
+
+
+def iter_rollup_buckets(conn, table, table_width, device_id, start, end, points):
+    """Buckets min/max/avg a partir de los agregados por minuto u hora
+
+    El coste depende del número de filas agregadas en el rango, no de las
+    lecturas crudas, así que rangos de meses siguen siendo baratos.
+    """
+    width = (end - start) / points
+    where, params = _rollup_filter(device_id, start, end, table_width)
+    cursor = conn.execute(
+        f'''SELECT MAX(CAST((bucket - ?) / ? AS INTEGER), 0) AS slot,
+                   MIN(percentage_min), MAX(percentage_max),
+                   SUM(percentage_sum) / SUM(count), SUM(count),
+                   SUM(fps_sum) / NULLIF(SUM(fps_count), 0), SUM(detections)
+            FROM {table} WHERE {where}
+            GROUP BY slot ORDER BY slot''',
+        [start, width] + params
+    )
+    for slot, minimum, maximum, average, count, fps, detections in cursor:
+        yield {
+            'timestamp': start + slot * width,
+            'min': minimum,
+            'max': maximum,
+            'avg': round(average, 2),
+            'count': count,
+            'fps': round(fps, 2) if fps is not None else None,
+            'detections': detections
+        }
+
+
+def lttb(points, count, threshold):
+    """Largest-Triangle-Three-Buckets en streaming sobre puntos (t, v) ordenados
+
+    Solo mantiene en memoria el bucket actual y el siguiente.
+    """
+    it = iter(points)
+    if threshold >= count or threshold < 3:
+        yield from it
+        return
+
+    every = (count - 2) / (threshold - 2)
+    bounds = [int(i * every) + 1 for i in range(threshold - 1)]
+
+    a = next(it, None)
+    if a is None:
+        return
+    yield a
+
+    current = list(islice(it, bounds[1] - bounds[0]))
+    last = None
+
+    for i in range(threshold - 2):
+        if i + 2 < len(bounds):
+            following = list(islice(it, bounds[i + 2] - bounds[i + 1]))
+        else:
+            following = list(it)
+            last = following[-1] if following else None
+
+        if following:
+            avg_t = sum(p[0] for p in following) / len(following)
+            avg_v = sum(p[1] for p in following) / len(following)
+        else:
+            avg_t, avg_v = a
+
+        best = None
+        best_area = -1.0
+        for point in current:
+            area = abs(
+                (a[0] - avg_t) * (point[1] - a[1]) -
+                (a[0] - point[0]) * (avg_v - a[1])
+            )
+            if area > best_area:
+                best_area = area
+                best = point
+
+        if best is not None:
+            yield best
+            a = best
+        current = following
+
+    if last is not None and last is not a:
+        yield last
+
+
+def history_chunks(db_path, device_id, start, end, points=500, mode='minmax', chunk_size=CHUNK_SIZE):
+    """Generador de bloques de la serie histórica (ejecutar fuera del event loop)
+
+    Primero produce un dict con el total de filas; después listas de hasta
+    ``chunk_size`` puntos.
+    """
+    points = max(3, min(int(points), MAX_POINTS))
+    rollup = pick_rollup((end - start) / points) if mode != 'lttb' else None
+    conn = connect(db_path, readonly=True)
+    try:
+        if rollup:
+            table, table_width = rollup
+            total = count_rollup(conn, table, table_width, device_id, start, end)
+            yield {'total': total, 'points': min(points, total), 'source': table}
+            series = iter_rollup_buckets(conn, table, table_width, device_id, start, end, points)
+        else:
+            total = count_readings(conn, device_id, start, end)
+            yield {'total': total, 'points': min(points, total), 'source': 'readings'}
+
+            if mode == 'lttb':
+                series = (
+                    {'timestamp': t, 'percentage': v}
+                    for t, v in lttb(iter_readings(conn, device_id, start, end), total, points)
+                )
+            elif total <= points:
+                series = (
+                    {'timestamp': t, 'percentage': v}
+                    for t, v in iter_readings(conn, device_id, start, end)
+                )
+            else:
+                series = iter_buckets(conn, device_id, start, end, points)
+
+        while True:
+            chunk = list(islice(series, chunk_size))
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        conn.close()
@@ -0,0 +1,186 @@
+"""
+Backend_camara/openmv_http.py
+
+API HTTP de solo lectura en el mismo puerto del websocket, para
+integraciones que consultan periódicamente (SCADA, reportes):
+
+    GET /api/status[?device_id=cam1]                estado actual (igual que get_status)
+    GET /api/history[?device_id=cam1&limit=100]     historial en memoria (igual que get_history)
+    GET /api/stats[?device_id=cam1&windows=60,300]  nivel medio/mín/máx/pendiente por ventana
+    GET /api/alerts[?limit=20]                      últimas alertas
+
+Cada recurso tiene una versión entera (cabecera ``X-OpenMV-Version`` y campo
+``version``) y un ETag. El cuerpo se codifica una vez por versión:
+
+- ``If-None-Match`` con el ETag actual responde 304 sin cuerpo ni
+  serialización.
+- ``?version=N&wait=25`` (long-poll) espera hasta que la versión supere N o
+  venza el plazo (máximo LONG_POLL_MAX s); al vencer responde 304.
+"""
+
+import asyncio
+import http
+import json
+from urllib.parse import parse_qs, urlsplit
+from websockets.datastructures import Headers
+from websockets.http11 import Response
+from openmv_timeseries import DEFAULT_WINDOWS, RECENT_POINTS, parse_windows
+
+
+# Espera máxima de un long-poll (el servidor websocket amplía open_timeout)
+LONG_POLL_MAX = 25.0
+
+
+class ChangeNotifier:
+    """Despertar juntos a todos los long-poll cuando cambia el estado"""
+
+    def __init__(self):
+        self._event = None
+
+    def notify(self):
+        if self._event is not None:
+            self._event.set()
+            self._event = None
+
+    async def wait(self, timeout):
+        """True si hubo un cambio antes de ``timeout`` segundos"""
+        if self._event is None:
+            self._event = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class HttpApi:
+    """Responder /api/* a partir del estado del servidor (OpenMVServer o FrontendServer)"""
+
+    def __init__(self, server):
+        self.server = server
+        self.changes = ChangeNotifier()
+        # (ruta, device_id, limit, windows) -> (versión, cuerpo JSON en bytes)
+        self.bodies = {}
+        self.requests = 0
+        self.not_modified = 0
+        self.long_polls = 0
+
+    def notify(self):
+        self.changes.notify()
+
+    def handles(self, path):
+        return path.startswith('/api/')
+
+    async def handle(self, connection, request):
+        self.requests += 1
+        parts = urlsplit(request.path)
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+
+        resource = self.resources().get(parts.path.rstrip('/'))
+        if resource is None:
+            return self._response(http.HTTPStatus.NOT_FOUND, json.dumps({'error': 'Recurso no encontrado'}).encode())
+        version_of, build = resource
+
+        try:
+            known = int(query['version']) if 'version' in query else None
+            wait = min(float(query.get('wait', 0)), LONG_POLL_MAX)
+            # limit y windows se usan al armar la respuesta
+            int(query.get('limit', 0))
+            parse_windows(query.get('windows', DEFAULT_WINDOWS))
+        except ValueError:
+            return self._response(http.HTTPStatus.BAD_REQUEST, json.dumps({'error': 'Parametro no valido'}).encode())
+
+        version = version_of(query)
+        # Long-poll: esperar una versión posterior a la que ya tiene el cliente
+        unchanged = known is not None and wait > 0 and version <= known
+        if unchanged:
+            self.long_polls += 1
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + wait
+            while unchanged:
+                remaining = deadline - loop.time()
+                if remaining <= 0 or not await self.changes.wait(remaining):
+                    break
+                version = version_of(query)
+                unchanged = version <= known
+
+        etag = f'"{self.server.broadcaster.stream_id}-{version}"'
+        headers = {'ETag': etag, 'X-OpenMV-Version': str(version)}
+        if unchanged or request.headers.get('If-None-Match') == etag:
+            self.not_modified += 1
+            return self._response(http.HTTPStatus.NOT_MODIFIED, b'', headers)
+
+        key = (parts.path, query.get('device_id'), query.get('limit'), query.get('windows'))
+        cached = self.bodies.get(key)
+        if cached is None or cached[0] != version:
+            payload = build(query)
+            payload['version'] = version
+            cached = self.bodies[key] = (version, json.dumps(payload).encode('utf-8'))
+        return self._response(http.HTTPStatus.OK, cached[1], headers)
+
+    def resources(self):
+        return {
+            '/api/status': (self.status_version, self.build_status),
+            '/api/history': (self.history_version, self.build_history),
+            '/api/stats': (self.history_version, self.build_stats),
+            '/api/alerts': (self.alerts_version, self.build_alerts),
+        }
+
+    def status_version(self, query):
+        return self.server.broadcaster.replay_log.seq
+
+    def build_status(self, query):
+        server = self.server
+        device_id, snapshot = server.device_status(query.get('device_id'))
+        return {
+            'type': 'status',
+            'is_monitoring': server.is_monitoring,
+            'connected': server.is_serial_open(query.get('device_id')),
+            'device_id': device_id,
+            'data': snapshot,
+            'devices': server.describe_devices()
+        }
+
+    def history_version(self, query):
+        version = self.server.history_version(query.get('device_id'))
+        return version[1] if version else 0
+
+    def build_history(self, query):
+        limit = int(query.get('limit') or RECENT_POINTS)
+        device_id, history = self.server.recent_history(query.get('device_id'), limit)
+        return {'type': 'history', 'device_id': device_id, 'data': history}
+
+    def build_stats(self, query):
+        windows = parse_windows(query.get('windows', DEFAULT_WINDOWS))
+        device_id, stats = self.server.window_stats(query.get('device_id'), windows)
+        return {'type': 'window_stats', 'device_id': device_id, 'data': stats}
+
+    def alerts_version(self, query):
+        alert_log = self.server.alert_log
+        return alert_log[-1][0] if alert_log else 0
+
+    def build_alerts(self, query):
+        alerts = self.server.recent_alerts()
+        limit = int(query.get('limit') or len(alerts))
+        return {'type': 'alerts', 'data': alerts[-limit:][::-1] if limit > 0 else []}
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'not_modified': self.not_modified,
+            'long_polls': self.long_polls
+        }
+
+    @staticmethod
+    def _response(status, body, headers=None):
+        response_headers = Headers()
+        response_headers['Content-Type'] = 'application/json'
+        response_headers['Cache-Control'] = 'no-cache'
+        response_headers['Access-Control-Allow-Origin'] = '*'
+        response_headers['Access-Control-Expose-Headers'] = 'ETag, X-OpenMV-Version'
+        response_headers['Connection'] = 'close'
+        for name, value in (headers or {}).items():
+            response_headers[name] = value
+        if status != http.HTTPStatus.NOT_MODIFIED:
+            response_headers['Content-Length'] = str(len(body))
+        return Response(status.value, status.phrase, response_headers, body)
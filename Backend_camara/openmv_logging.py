@@ -0,0 +1,139 @@
+"""
+Backend_camara/openmv_logging.py
+
+Logging no bloqueante para la ruta de ingestión.
+
+Los mensajes del logger ``openmv`` se encolan (QueueHandler) y un hilo
+(QueueListener) los escribe en la consola; si la terminal o journald van
+lentos, la cola se llena y los mensajes se descartan en lugar de frenar el
+event loop. Las líneas crudas de la cámara se guardan en un buffer circular
+(comando ``get_raw_lines``) y solo unas pocas por segundo se escriben al log.
+
+Variables de entorno:
+    OPENMV_LOG_LEVEL      nivel del log (INFO por defecto)
+    OPENMV_RAW_LOG_RATE   líneas crudas por segundo y cámara al log
+                          (1 por defecto, 0 = ninguna, all = todas)
+"""
+
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from collections import deque
+
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s %(message)s'
+LOG_QUEUE_SIZE = 10000
+RAW_LINES = 500
+
+logger = logging.getLogger('openmv')
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que descarta (y cuenta) en vez de bloquear con la cola llena"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_handler = None
+_listener = None
+
+
+def setup_logging(level=None):
+    """Configurar el logger ``openmv`` con cola y escritura en segundo plano"""
+    global _handler, _listener
+    if _listener is not None:
+        return _handler
+
+    level = level or os.environ.get('OPENMV_LOG_LEVEL', 'INFO')
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    _handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    _listener = logging.handlers.QueueListener(_handler.queue, console)
+    _listener.start()
+
+    logger.addHandler(_handler)
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    logger.propagate = False
+    return _handler
+
+
+def stop_logging():
+    """Vaciar la cola y detener el hilo de escritura"""
+    global _handler, _listener
+    if _listener is not None:
+        _listener.stop()
+        logger.removeHandler(_handler)
+        _listener = None
+
+
+def dropped_messages():
+    return _handler.dropped if _handler is not None else 0
+
+
+def raw_log_rate():
+    """Líneas crudas por segundo según OPENMV_RAW_LOG_RATE (None = todas)"""
+    value = os.environ.get('OPENMV_RAW_LOG_RATE', '1').strip().lower()
+    if value == 'all':
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return 1.0
+
+
+class RawLineLog:
+    """Buffer circular de líneas crudas con muestreo hacia el log
+
+    Guardar una línea es un ``append`` a un deque; al log solo pasan
+    ``rate`` líneas por segundo (cubeta de tokens) y el resto se cuenta.
+    """
+
+    def __init__(self, device_id, maxlen=RAW_LINES, rate=1.0):
+        self.device_id = device_id
+        self.lines = deque(maxlen=maxlen)
+        self.rate = rate
+        self.suppressed = 0
+        self._tokens = rate or 0.0
+        self._last = time.monotonic()
+
+    def record(self, line):
+        now = time.time()
+        self.lines.append((now, line))
+
+        if self.rate is None:
+            logger.info("[%s] %s", self.device_id, line)
+            return
+        if not self.rate:
+            return
+
+        monotonic = time.monotonic()
+        self._tokens = min(max(1.0, self.rate), self._tokens + (monotonic - self._last) * self.rate)
+        self._last = monotonic
+
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            if self.suppressed:
+                logger.info("[%s] %s (%d lineas omitidas)", self.device_id, line, self.suppressed)
+                self.suppressed = 0
+            else:
+                logger.info("[%s] %s", self.device_id, line)
+        else:
+            self.suppressed += 1
+
+    def recent(self, limit=100):
+        """Últimas ``limit`` líneas como dicts (más antigua primero)"""
+        limit = max(0, min(int(limit), len(self.lines)))
+        items = list(self.lines)[len(self.lines) - limit:]
+        return [{'timestamp': timestamp, 'line': line} for timestamp, line in items]
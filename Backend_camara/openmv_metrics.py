@@ -0,0 +1,235 @@
+"""
+Backend_camara/openmv_metrics.py
+
+Métricas operativas del servidor OpenMV.
+
+Se exponen en formato de texto de Prometheus en ``http://host:8765/metrics``
+(el mismo puerto del websocket) y como dict con el comando ``get_metrics``.
+
+En la ruta caliente solo se incrementan contadores y se registra la latencia
+en un histograma de buckets fijos (una búsqueda binaria); el resto de valores
+(colas, clientes, errores de parseo) se leen del estado actual al consultar.
+"""
+
+import time
+from bisect import bisect_left
+from openmv_logging import dropped_messages
+
+
+# Segundos: latencia de lectura serie -> envío websocket
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Segundos: duración de una difusión (codificar + encolar a todos los clientes)
+BROADCAST_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1)
+
+
+class Histogram:
+    """Histograma de buckets fijos con suma y cuenta"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Pares (límite superior, cuenta acumulada) como en Prometheus"""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, q):
+        """Cota superior del cuantil ``q`` según los buckets (None si vacío)"""
+        if not self.count:
+            return None
+        target = q * self.count
+        for bound, total in self.cumulative():
+            if total >= target:
+                return bound
+        return float('inf')
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'avg_ms': round(self.sum / self.count * 1000, 3) if self.count else None,
+            'p50_ms': _ms(self.quantile(0.5)),
+            'p99_ms': _ms(self.quantile(0.99))
+        }
+
+
+def _ms(value):
+    if value is None:
+        return None
+    return round(value * 1000, 3) if value != float('inf') else 'inf'
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class ServerMetrics:
+    """Instrumentación del servidor y lectura de métricas bajo demanda"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.e2e_latency = Histogram(LATENCY_BUCKETS)
+        self.broadcast_duration = Histogram(BROADCAST_BUCKETS)
+        self._rate_marks = {}
+
+    def rate(self, key, total):
+        """Valor por segundo de un contador desde la consulta anterior"""
+        now = time.monotonic()
+        last_time, last_total = self._rate_marks.get(key, (self.started, 0))
+        self._rate_marks[key] = (now, total)
+        elapsed = now - last_time
+        return round((total - last_total) / elapsed, 2) if elapsed > 0 else 0.0
+
+    def collect(self, server):
+        """Familias de métricas: (nombre, tipo, ayuda, [(labels, valor)])"""
+        devices = list(server.devices)
+        channels = list(server.broadcaster.channels.items())
+        families = [
+            ('openmv_uptime_seconds', 'gauge', 'Segundos desde el arranque',
+             [({}, round(time.monotonic() - self.started, 3))]),
+            ('openmv_serial_bytes_total', 'counter', 'Bytes leidos del puerto serie',
+             [({'device': d.device_id}, d.bytes_read) for d in devices]),
+            ('openmv_serial_lines_total', 'counter', 'Lineas de texto recibidas',
+             [({'device': d.device_id}, d.lines_read) for d in devices]),
+            ('openmv_frames_total', 'counter', 'Frames completos procesados',
+             [({'device': d.device_id}, d.frame_seq) for d in devices]),
+            ('openmv_parse_errors_total', 'counter', 'Lineas o registros que no se pudieron parsear',
+             [({'device': d.device_id}, d.frame_assembler.parse_errors + d.binary_decoder.crc_errors
+               + d.binary_decoder.decode_errors) for d in devices]),
+            ('openmv_device_connected', 'gauge', 'Camara con puerto abierto',
+             [({'device': d.device_id}, int(d.is_connected)) for d in devices]),
+            ('openmv_device_reconnects_total', 'counter', 'Reaperturas del puerto de la camara',
+             [({'device': d.device_id}, max(0, d.connects - 1)) for d in devices]),
+            ('openmv_clients', 'gauge', 'Clientes websocket conectados',
+             [({}, len(channels))]),
+            ('openmv_client_disconnects_total', 'counter', 'Clientes websocket desconectados',
+             [({}, server.broadcaster.disconnects)]),
+            ('openmv_client_resumes_total', 'counter', 'Reconexiones reanudadas (replay) o con snapshot',
+             [({'mode': mode}, count) for mode, count in server.broadcaster.resumes.items()]),
+            ('openmv_stream_seq', 'gauge', 'Ultimo numero de secuencia difundido',
+             [({}, server.broadcaster.replay_log.seq)]),
+            ('openmv_encoded_cache_hits_total', 'counter', 'Snapshots e historial servidos ya codificados',
+             [({}, server.encoded_cache.hits)]),
+            ('openmv_http_requests_total', 'counter', 'Consultas a la API HTTP',
+             [({'result': 'ok'}, server.http_api.requests - server.http_api.not_modified),
+              ({'result': 'not_modified'}, server.http_api.not_modified)]),
+            ('openmv_http_long_polls_total', 'counter', 'Consultas HTTP que esperaron un cambio (long-poll)',
+             [({}, server.http_api.long_polls)]),
+            ('openmv_client_queue_depth', 'gauge', 'Mensajes en la cola de salida del cliente',
+             [({'client': server.broadcaster.client_id(ws)}, len(ch.queue)) for ws, ch in channels]),
+            ('openmv_client_dropped_total', 'counter', 'Mensajes descartados por cliente lento',
+             [({'client': server.broadcaster.client_id(ws), 'kind': kind}, count)
+              for ws, ch in channels for kind, count in ch.dropped.items()]),
+            ('openmv_client_conflated_total', 'counter', 'tank_data reemplazados por limite de frecuencia',
+             [({'client': server.broadcaster.client_id(ws)}, ch.conflated) for ws, ch in channels]),
+            ('openmv_previews_total', 'counter', 'Vistas previas JPEG recibidas de la camara',
+             [({'device': d.device_id}, d.binary_decoder.previews.completed) for d in devices]),
+            ('openmv_client_previews_skipped_total', 'counter', 'Vistas previas reemplazadas por una mas reciente',
+             [({'client': server.broadcaster.client_id(ws)}, ch.previews_skipped) for ws, ch in channels]),
+        ]
+
+        fomo = server.devices.fomo
+        families.append(('openmv_fomo_batches_total', 'counter', 'Llamadas de post-procesamiento FOMO en el host',
+                         [({}, fomo.batches)]))
+        families.append(('openmv_fomo_tensors_total', 'counter', 'Tensores FOMO post-procesados en el host',
+                         [({}, fomo.tensors)]))
+
+        reader = getattr(server, 'ring_reader', None)
+        if reader is not None:
+            families.append(('openmv_ring_lag', 'gauge', 'Mensajes del buffer compartido pendientes de leer',
+                             [({}, reader.lag)]))
+            families.append(('openmv_ring_lost_total', 'counter', 'Mensajes sobrescritos antes de leerlos',
+                             [({}, reader.lost)]))
+
+        # El escritor publica sus contadores en la cabecera del buffer: cualquier proceso los ve
+        ring = reader if reader is not None else server.broadcaster.ring
+        if ring is not None:
+            families.append(('openmv_ring_oversized_total', 'counter',
+                             'Mensajes descartados por no entrar en el buffer compartido',
+                             [({}, ring.oversized)]))
+            families.append(('openmv_ring_fragmented_total', 'counter',
+                             'Mensajes repartidos en varios slots del buffer compartido',
+                             [({}, ring.fragmented)]))
+
+        families.append(('openmv_log_dropped_total', 'counter', 'Mensajes de log descartados con la cola llena',
+                         [({}, dropped_messages())]))
+
+        if server.storage:
+            storage = server.storage.stats()
+            families.append(('openmv_storage_backlog', 'gauge', 'Filas pendientes de escribir en SQLite',
+                             [({}, storage.get('backlog', 0))]))
+
+        return families
+
+    def render(self, server):
+        """Texto en formato de exposición de Prometheus"""
+        lines = []
+        for name, kind, help_text, samples in self.collect(server):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+
+        for name, help_text, histogram in (
+            ('openmv_e2e_latency_seconds', 'Latencia de lectura serie a envio websocket', self.e2e_latency),
+            ('openmv_broadcast_duration_seconds', 'Duracion de la difusion de un frame', self.broadcast_duration),
+        ):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for bound, total in histogram.cumulative():
+                lines.append(f'{name}_bucket{{le="{_number(bound)}"}} {total}')
+            lines.append(f"{name}_sum {_number(histogram.sum)}")
+            lines.append(f"{name}_count {histogram.count}")
+
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self, server):
+        """Resumen para el comando get_metrics (incluye tasas por segundo)"""
+        devices = {}
+        for device in server.devices:
+            devices[device.device_id] = {
+                'bytes_per_s': self.rate(('bytes', device.device_id), device.bytes_read),
+                'lines_per_s': self.rate(('lines', device.device_id), device.lines_read),
+                'frames_per_s': self.rate(('frames', device.device_id), device.frame_seq),
+                'frames': device.frame_seq,
+                'parse_errors': device.frame_assembler.parse_errors,
+                'binary': device.binary_decoder.stats(),
+                'reconnects': max(0, device.connects - 1)
+            }
+
+        ring = getattr(server, 'ring_reader', None) or server.broadcaster.ring
+        return {
+            'uptime_s': round(time.monotonic() - self.started, 1),
+            'devices': devices,
+            'e2e_latency': self.e2e_latency.to_dict(),
+            'broadcast_duration': self.broadcast_duration.to_dict(),
+            'clients': server.broadcaster.stats(),
+            'storage': server.storage.stats() if server.storage else None,
+            'ring': ring.stats() if ring is not None else None
+        }
@@ -0,0 +1,378 @@
+"""
+Backend_camara/openmv_protocol.py
+
+Protocolo binario compacto entre ei_object_detection.py y openmv_server.py.
+
+Cada registro se codifica con COBS y termina en un byte 0x00:
+
+    cabecera  <2sBBH>   magic b'OM', versión, tipo, secuencia
+    tipo 1 (frame)      <HB> fps*100, número de detecciones
+                        por detección <BHHHHB> clase, x, y, w, h (centro y
+                        tamaño en píxeles), score cuantizado 0-255
+    tipo 2 (etiquetas)  UTF-8 con las etiquetas separadas por '\\n'
+    tipo 3 (preview)    <II> posición, tamaño total + fragmento del JPEG
+                        anotado; la secuencia es la del frame de la imagen.
+                        Los fragmentos (``PREVIEW_CHUNK`` bytes) van después
+                        del registro de frame para no retrasar la telemetría
+    tipo 4 (tensor)     <HBBBHHHH> fps*100, alto, ancho, clases de la salida
+                        FOMO, roi x, y, w, h + valores uint8 (0-255) en
+                        orden alto x ancho x clase. Reemplaza al frame cuando
+                        el post-procesamiento se hace en el host (openmv_fomo.py)
+    CRC                 <H> CRC-16/CCITT-FALSE de todo lo anterior
+
+Uso (decodificar una captura de bytes en el host; con un directorio se
+guardan ahí los JPEG de vista previa):
+    python openmv_protocol.py captura.bin [directorio_jpeg]
+"""
+
+import binascii
+import struct
+import time
+from collections import namedtuple
+from openmv_frames import Detection, Frame, parse_percentage
+
+
+MAGIC = b'OM'
+VERSION = 1
+
+RECORD_FRAME = 1
+RECORD_LABELS = 2
+RECORD_PREVIEW = 3
+RECORD_TENSOR = 4
+
+HEADER = struct.Struct('<2sBBH')
+FRAME_INFO = struct.Struct('<HB')
+DETECTION = struct.Struct('<BHHHHB')
+PREVIEW_INFO = struct.Struct('<II')
+TENSOR_INFO = struct.Struct('<HBBBHHHH')
+CRC = struct.Struct('<H')
+
+# Un tensor FOMO de 60x60x4 ocupa ~14 KiB
+MAX_RECORD = 16384
+PREVIEW_CHUNK = 1024
+MAX_PREVIEW = 256 * 1024
+
+# JPEG completo de la cámara: seq del frame, bytes, instante de recepción
+Preview = namedtuple('Preview', ['seq', 'jpeg', 'timestamp'])
+
+# Salida FOMO sin post-procesar: shape (alto, ancho, clases), roi (x, y, w, h)
+FomoTensor = namedtuple('FomoTensor', ['seq', 'fps', 'shape', 'roi', 'data'])
+
+
+def crc16(data):
+    """CRC-16/CCITT-FALSE (el mismo que calcula la cámara)"""
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def cobs_encode(data):
+    """Codificar con COBS (el resultado no contiene bytes 0x00)"""
+    out = bytearray([0])
+    code_index = 0
+    code = 1
+
+    for byte in data:
+        if byte == 0:
+            out[code_index] = code
+            code_index = len(out)
+            out.append(0)
+            code = 1
+        else:
+            out.append(byte)
+            code += 1
+            if code == 0xFF:
+                out[code_index] = code
+                code_index = len(out)
+                out.append(0)
+                code = 1
+
+    out[code_index] = code
+    return bytes(out)
+
+
+def cobs_decode(data):
+    """Decodificar COBS; lanza ValueError si el bloque es inválido"""
+    out = bytearray()
+    index = 0
+    length = len(data)
+
+    while index < length:
+        code = data[index]
+        end = index + code
+        if code == 0 or end > length:
+            raise ValueError("COBS invalido")
+        out += data[index + 1:end]
+        index = end
+        if code < 0xFF and index < length:
+            out.append(0)
+
+    return bytes(out)
+
+
+def encode_record(record_type, seq, payload):
+    """Construir un registro completo listo para enviar (con delimitador)"""
+    body = HEADER.pack(MAGIC, VERSION, record_type, seq & 0xFFFF) + payload
+    return cobs_encode(body + CRC.pack(crc16(body))) + b'\x00'
+
+
+def encode_frame(seq, fps, detections):
+    """Registro de frame; detections = [(clase, x, y, w, h, score), ...]"""
+    detections = detections[:255]
+    payload = FRAME_INFO.pack(int(round((fps or 0) * 100)) & 0xFFFF, len(detections))
+    for class_index, x, y, w, h, score in detections:
+        payload += DETECTION.pack(
+            class_index & 0xFF, int(x) & 0xFFFF, int(y) & 0xFFFF, int(w) & 0xFFFF, int(h) & 0xFFFF,
+            max(0, min(255, int(round(score * 255))))
+        )
+    return encode_record(RECORD_FRAME, seq, payload)
+
+
+def encode_labels(seq, labels):
+    return encode_record(RECORD_LABELS, seq, '\n'.join(labels).encode('utf-8'))
+
+
+def encode_preview(seq, jpeg, chunk_size=PREVIEW_CHUNK):
+    """Registros de vista previa (uno por fragmento) de un JPEG"""
+    return [
+        encode_record(RECORD_PREVIEW, seq, PREVIEW_INFO.pack(offset, len(jpeg)) + jpeg[offset:offset + chunk_size])
+        for offset in range(0, len(jpeg), chunk_size)
+    ]
+
+
+def encode_tensor(seq, fps, shape, roi, data):
+    """Registro de tensor FOMO; ``data`` son alto*ancho*clases bytes uint8"""
+    height, width, classes = shape
+    payload = TENSOR_INFO.pack(int(round((fps or 0) * 100)) & 0xFFFF, height, width, classes, *roi)
+    return encode_record(RECORD_TENSOR, seq, payload + bytes(data))
+
+
+class PreviewAssembler:
+    """Reensamblar los fragmentos de un JPEG de vista previa
+
+    Solo se arma una imagen a la vez: un fragmento de otra imagen o un hueco
+    (fragmento perdido por CRC) descarta la imagen en curso.
+    """
+
+    def __init__(self):
+        self.completed = 0
+        self.discarded = 0
+        self._seq = None
+        self._total = 0
+        self._buffer = bytearray()
+
+    def feed(self, seq, offset, total, data):
+        """Agregar un fragmento; devuelve el JPEG completo o None"""
+        if seq != self._seq or offset != len(self._buffer):
+            if self._seq is not None:
+                self.discarded += 1
+            self._seq = None
+            self._buffer = bytearray()
+            if offset != 0:
+                return None
+            self._seq = seq
+            self._total = total
+
+        if total != self._total or total > MAX_PREVIEW or offset + len(data) > total:
+            self.discarded += 1
+            self._seq = None
+            self._buffer = bytearray()
+            return None
+
+        self._buffer += data
+        if len(self._buffer) < total:
+            return None
+
+        jpeg = bytes(self._buffer)
+        self.completed += 1
+        self._seq = None
+        self._buffer = bytearray()
+        return jpeg
+
+
+class BinaryFrameDecoder:
+    """Decodificar el flujo binario de la cámara en objetos Frame"""
+
+    def __init__(self, labels=None, on_preview=None, on_tensor=None):
+        self.labels = list(labels or [])
+        # Callback con cada vista previa completa: on_preview(Preview)
+        self.on_preview = on_preview
+        # Callback con cada tensor FOMO: on_tensor(FomoTensor)
+        self.on_tensor = on_tensor
+        self.previews = PreviewAssembler()
+        self._buffer = bytearray()
+        self.records = 0
+        self.crc_errors = 0
+        self.decode_errors = 0
+        self.lost_frames = 0
+        self._last_seq = None
+
+    def feed(self, chunk):
+        """Agregar bytes y devolver los frames completos"""
+        self._buffer += chunk
+        if b'\x00' not in chunk:
+            if len(self._buffer) > MAX_RECORD:
+                self._buffer.clear()
+                self.decode_errors += 1
+            return []
+
+        parts = self._buffer.split(b'\x00')
+        self._buffer = bytearray(parts.pop())
+
+        frames = []
+        for encoded in parts:
+            if not encoded:
+                continue
+            frame = self.decode_record(bytes(encoded))
+            if frame is not None:
+                frames.append(frame)
+        return frames
+
+    def decode_record(self, encoded):
+        """Decodificar un registro COBS; None si es de etiquetas o inválido"""
+        try:
+            raw = cobs_decode(encoded)
+        except ValueError:
+            self.decode_errors += 1
+            return None
+
+        if len(raw) < HEADER.size + CRC.size:
+            self.decode_errors += 1
+            return None
+
+        body, (crc,) = raw[:-CRC.size], CRC.unpack(raw[-CRC.size:])
+        if crc16(body) != crc:
+            self.crc_errors += 1
+            return None
+
+        magic, version, record_type, seq = HEADER.unpack_from(body)
+        if magic != MAGIC or version != VERSION:
+            self.decode_errors += 1
+            return None
+
+        self.records += 1
+        payload = body[HEADER.size:]
+
+        if record_type == RECORD_LABELS:
+            self.labels = payload.decode('utf-8', errors='ignore').split('\n')
+            return None
+
+        if record_type == RECORD_PREVIEW:
+            self._decode_preview(seq, payload)
+            return None
+
+        if record_type not in (RECORD_FRAME, RECORD_TENSOR):
+            return None
+
+        if self._last_seq is not None:
+            self.lost_frames += (seq - self._last_seq - 1) & 0xFFFF
+        self._last_seq = seq
+
+        if record_type == RECORD_TENSOR:
+            tensor = self._decode_tensor(seq, payload)
+            if tensor is not None and self.on_tensor:
+                self.on_tensor(tensor)
+            return None
+
+        try:
+            return self._decode_frame(payload)
+        except struct.error:
+            self.decode_errors += 1
+            return None
+
+    def label_for(self, class_index):
+        if class_index < len(self.labels):
+            return self.labels[class_index]
+        return f"clase_{class_index}"
+
+    def _decode_preview(self, seq, payload):
+        if len(payload) < PREVIEW_INFO.size:
+            self.decode_errors += 1
+            return
+        offset, total = PREVIEW_INFO.unpack_from(payload)
+        jpeg = self.previews.feed(seq, offset, total, payload[PREVIEW_INFO.size:])
+        if jpeg is not None and self.on_preview:
+            self.on_preview(Preview(seq, jpeg, time.time()))
+
+    def _decode_tensor(self, seq, payload):
+        if len(payload) < TENSOR_INFO.size:
+            self.decode_errors += 1
+            return None
+        fps_centi, height, width, classes, *roi = TENSOR_INFO.unpack_from(payload)
+        data = payload[TENSOR_INFO.size:]
+        if len(data) != height * width * classes:
+            self.decode_errors += 1
+            return None
+        return FomoTensor(seq, fps_centi / 100.0, (height, width, classes), tuple(roi), data)
+
+    def _decode_frame(self, payload):
+        fps_centi, count = FRAME_INFO.unpack_from(payload)
+        detections = []
+        offset = FRAME_INFO.size
+
+        for _ in range(count):
+            class_index, x, y, w, h, score = DETECTION.unpack_from(payload, offset)
+            offset += DETECTION.size
+            detections.append(Detection(
+                self.label_for(class_index), x, y, round(score / 255.0, 3), w, h
+            ))
+
+        return self._frame(detections, fps_centi / 100.0)
+
+    def make_frame(self, fps, detections):
+        """Frame desde detecciones [(clase, x, y, w, h, score 0-1)] (post-procesadas en el host)"""
+        return self._frame([
+            Detection(self.label_for(class_index), x, y, round(score, 3), w, h)
+            for class_index, x, y, w, h, score in detections
+        ], fps)
+
+    def _frame(self, detections, fps):
+        best = max(detections, key=lambda d: d.score) if detections else None
+        label = best.label if best else None
+
+        return Frame(
+            label,
+            parse_percentage(label),
+            tuple(detections),
+            fps,
+            time.time()
+        )
+
+    def stats(self):
+        return {
+            'records': self.records,
+            'crc_errors': self.crc_errors,
+            'decode_errors': self.decode_errors,
+            'lost_frames': self.lost_frames,
+            'previews': self.previews.completed,
+            'previews_discarded': self.previews.discarded
+        }
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    preview_dir = sys.argv[2] if len(sys.argv) > 2 else None
+
+    def save_preview(preview):
+        path = os.path.join(preview_dir, f"preview_{preview.seq:05d}.jpg")
+        with open(path, 'wb') as f:
+            f.write(preview.jpeg)
+        print(f"Vista previa {path} ({len(preview.jpeg)} bytes)")
+
+    if preview_dir:
+        os.makedirs(preview_dir, exist_ok=True)
+
+    decoder = BinaryFrameDecoder(on_preview=save_preview if preview_dir else None)
+    with open(sys.argv[1], 'rb') as capture:
+        while True:
+            chunk = capture.read(4096)
+            if not chunk:
+                break
+            for frame in decoder.feed(chunk):
+                print(frame.to_dict())
+
+    print(decoder.stats())
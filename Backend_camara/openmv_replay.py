@@ -0,0 +1,237 @@
+"""
+Backend_camara/openmv_replay.py
+
+Grabación y reproducción del flujo serie crudo de una cámara.
+
+Formato de captura (``.omcap``): cabecera ``b'OMCAP'`` + versión, y después un
+registro por bloque leído del puerto:
+
+    <IH>  microsegundos desde el bloque anterior (reloj monotónico), longitud
+    bytes del bloque tal como llegaron (texto o binario)
+
+Uso:
+    python openmv_replay.py record COM3 captura.omcap
+    python openmv_replay.py info captura.omcap
+    python openmv_replay.py pty captura.omcap [velocidad]
+
+El servidor reproduce capturas en lugar de cámaras reales con
+``OPENMV_REPLAY=captura.omcap[,otra.omcap]`` y ``OPENMV_REPLAY_SPEED``
+(1 = tiempo real, 10 = diez veces más rápido, 0 = lo más rápido posible), y
+graba todas las cámaras conectadas con ``OPENMV_CAPTURE_DIR=carpeta``.
+"""
+
+import asyncio
+import os
+import struct
+import time
+from openmv_logging import logger
+
+
+MAGIC = b'OMCAP'
+VERSION = 1
+
+RECORD = struct.Struct('<IH')
+MAX_DELAY_US = 0xFFFFFFFF
+MAX_CHUNK = 0xFFFF
+
+# En modo "lo más rápido posible" ceder el event loop cada tantos bloques
+FAST_BATCH = 64
+
+
+class CaptureWriter:
+    """Guardar bloques crudos del puerto serie con su instante de llegada"""
+
+    def __init__(self, path):
+        self.path = path
+        self.chunks = 0
+        self.bytes = 0
+        self._last = None
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC + bytes([VERSION]))
+
+    def write(self, chunk, timestamp=None):
+        """Agregar un bloque; ``timestamp`` en segundos de un reloj monotónico"""
+        if self._file is None:
+            return
+
+        if timestamp is None:
+            timestamp = time.perf_counter()
+
+        delay = 0 if self._last is None else int((timestamp - self._last) * 1e6)
+        self._last = timestamp
+        delay = max(0, min(delay, MAX_DELAY_US))
+
+        for start in range(0, len(chunk), MAX_CHUNK):
+            part = chunk[start:start + MAX_CHUNK]
+            self._file.write(RECORD.pack(delay, len(part)))
+            self._file.write(part)
+            delay = 0
+
+        self.chunks += 1
+        self.bytes += len(chunk)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def iter_capture(path):
+    """Recorrer (retardo en segundos, bloque) de un archivo de captura"""
+    with open(path, 'rb') as capture:
+        header = capture.read(len(MAGIC) + 1)
+        if header[:len(MAGIC)] != MAGIC or header[len(MAGIC):] != bytes([VERSION]):
+            raise ValueError(f"{path} no es una captura OpenMV")
+
+        while True:
+            raw = capture.read(RECORD.size)
+            if len(raw) < RECORD.size:
+                break
+            delay_us, length = RECORD.unpack(raw)
+            chunk = capture.read(length)
+            if len(chunk) < length:
+                break
+            yield delay_us / 1e6, chunk
+
+
+def capture_path(directory, device_id):
+    """Nombre de archivo para grabar una cámara"""
+    safe_id = ''.join(c if c.isalnum() or c in '-_' else '_' for c in device_id)
+    return os.path.join(directory, f"{safe_id}-{time.strftime('%Y%m%d-%H%M%S')}.omcap")
+
+
+class ReplayTransport:
+    """Fuente de datos que reproduce una captura con la interfaz de SerialTransport
+
+    ``speed`` multiplica la velocidad original; con 0 los bloques se entregan
+    sin esperas, cediendo el event loop cada ``FAST_BATCH`` bloques.
+    """
+
+    def __init__(self, loop, path, on_chunk, on_error=None, speed=1.0, repeat=False):
+        self.loop = loop
+        self.path = path
+        self.on_chunk = on_chunk
+        self.on_error = on_error
+        self.speed = speed
+        self.repeat = repeat
+        self.mode = 'replay'
+        self.chunks = 0
+        self.finished = False
+        self._task = None
+
+    @property
+    def is_running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.is_running:
+            return
+        self.finished = False
+        self._task = self.loop.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        try:
+            while True:
+                await self._play_once()
+                if not self.repeat:
+                    break
+        except asyncio.CancelledError:
+            raise
+        except (OSError, ValueError) as e:
+            if self.on_error:
+                self.on_error(e)
+            else:
+                logger.error("Error reproduciendo %s: %s", self.path, e)
+        self.finished = True
+
+    async def _play_once(self):
+        start = time.perf_counter()
+        elapsed = 0.0
+
+        for delay, chunk in iter_capture(self.path):
+            if self.speed > 0:
+                elapsed += delay / self.speed
+                wait = start + elapsed - time.perf_counter()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            elif self.chunks % FAST_BATCH == 0:
+                await asyncio.sleep(0)
+
+            self.chunks += 1
+            self.on_chunk(chunk, time.perf_counter())
+
+
+def record(port, path, baudrate=115200):
+    """Grabar un puerto real hasta Ctrl+C"""
+    import serial
+
+    connection = serial.Serial(port, baudrate, timeout=0.5)
+    writer = CaptureWriter(path)
+    print(f"Grabando {port} en {path} (Ctrl+C para terminar)")
+    try:
+        while True:
+            chunk = connection.read(max(1, connection.in_waiting))
+            if chunk:
+                writer.write(chunk, time.perf_counter())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writer.close()
+        connection.close()
+    print(f"{writer.chunks} bloques, {writer.bytes} bytes")
+
+
+def replay_to_pty(path, speed=1.0):
+    """Reproducir una captura en un pseudo-terminal (solo POSIX)"""
+    import pty
+
+    master, slave = pty.openpty()
+    print(f"Puerto virtual: {os.ttyname(slave)} (Ctrl+C para terminar)")
+
+    async def run():
+        done = asyncio.Event()
+        transport = ReplayTransport(
+            asyncio.get_running_loop(), path,
+            lambda chunk, read_time: os.write(master, chunk),
+            speed=speed, repeat=True
+        )
+        transport.start()
+        await done.wait()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        os.close(master)
+        os.close(slave)
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+
+    command, target = sys.argv[1], sys.argv[2]
+
+    if command == 'record' and len(sys.argv) >= 4:
+        record(target, sys.argv[3])
+    elif command == 'info':
+        chunks = total = duration = 0
+        for delay, chunk in iter_capture(target):
+            chunks += 1
+            total += len(chunk)
+            duration += delay
+        print(f"{chunks} bloques, {total} bytes, {duration:.1f} s")
+    elif command == 'pty':
+        replay_to_pty(target, float(sys.argv[3]) if len(sys.argv) >= 4 else 1.0)
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -0,0 +1,302 @@
+"""
+Backend_camara/openmv_ring.py
+
+Buffer circular en memoria compartida entre el proceso de ingestión y los
+procesos websocket (openmv_frontend.py).
+
+Un solo escritor publica mensajes ya codificados (JSON) con número de
+secuencia; cada lector sigue la secuencia a su ritmo sin coordinarse con
+los demás. El escritor nunca espera: si un lector se atrasa más que el
+tamaño del buffer, pierde los mensajes sobrescritos (se cuentan) y continúa
+desde el más antiguo disponible.
+
+Un mensaje más grande que un slot (un tank_data con muchas detecciones) se
+reparte en slots consecutivos y el lector lo vuelve a unir. Solo se descarta
+si ocupa más de la mitad del buffer; esos descartes se cuentan en la
+cabecera para que los procesos websocket los expongan en /metrics.
+
+    cabecera  <8sIIQQQ>  magic, número de slots, tamaño de slot, última
+                         secuencia, mensajes descartados por tamaño,
+                         mensajes repartidos en varios slots
+    slot      <QQdIBBB>  secuencia, stream_seq del Broadcaster, origen
+                         (perf_counter), longitud, longitudes de tipo y
+                         device_id, flags (FRAGMENT_MORE/FRAGMENT_NEXT/
+                         HAS_SAMPLE); después la muestra (opcional), tipo,
+                         device_id y el mensaje o su fragmento
+    muestra   <dhdiidH>  timestamp, nivel, fps, x, y, score, detecciones
+
+La muestra de un tank_data lleva los campos del historial en columnas
+(openmv_timeseries.py) ya extraídos: los procesos websocket la agregan a su
+historial sin parsear el JSON.
+
+Cada slot funciona como un seqlock: el escritor pone la secuencia en 0,
+copia el mensaje y escribe la secuencia; el lector copia el mensaje y
+vuelve a leer la secuencia para descartar lecturas a medio escribir.
+"""
+
+import math
+import struct
+from multiprocessing import shared_memory
+
+MAGIC = b'OMRING3\x00'
+HEADER = struct.Struct('<8sIIQQQ')
+SLOT = struct.Struct('<QQdIBBB')
+# Contadores de 64 bits dentro de la cabecera: última secuencia publicada,
+# mensajes descartados por tamaño y mensajes fragmentados
+COUNTER = struct.Struct('<Q')
+WRITE_SEQ_OFFSET = 16
+OVERSIZED_OFFSET = 24
+FRAGMENTED_OFFSET = 32
+
+# Fragmento: sigue otro slot del mismo mensaje / continúa el slot anterior
+FRAGMENT_MORE = 1
+FRAGMENT_NEXT = 2
+# Los slots del mensaje llevan una muestra de historial
+HAS_SAMPLE = 4
+
+# (timestamp, percentage, fps, x, y, score, count); -1/NaN = sin dato
+SAMPLE = struct.Struct('<dhdiidH')
+
+DEFAULT_SLOTS = 2048
+DEFAULT_SLOT_SIZE = 8192
+
+
+class RingWriter:
+    """Crear el segmento compartido y publicar mensajes (un solo escritor)"""
+
+    def __init__(self, name=None, slots=DEFAULT_SLOTS, slot_size=DEFAULT_SLOT_SIZE):
+        self.slots = slots
+        self.slot_size = slot_size
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=HEADER.size + slots * slot_size)
+        self.name = self.shm.name
+        self.buffer = self.shm.buf
+        self.seq = 0
+        self.oversized = 0
+        self.fragmented = 0
+        HEADER.pack_into(self.buffer, 0, MAGIC, slots, slot_size, 0, 0, 0)
+
+    def publish(self, kind, message, device_id=None, origin=None, stream_seq=0, sample=None):
+        """Copiar un mensaje codificado a los siguientes slots; devuelve la secuencia del último
+
+        ``sample`` es una muestra de historial (timestamp, percentage, fps,
+        x, y, score, count) con None donde no hay dato.
+        """
+        if isinstance(message, str):
+            message = message.encode('utf-8')
+        kind = kind.encode('utf-8')
+        device = (device_id or '').encode('utf-8')
+        sample = pack_sample(sample) if sample is not None else b''
+
+        start = SLOT.size + len(sample) + len(kind) + len(device)
+        capacity = self.slot_size - start
+        fragments = max(1, -(-len(message) // capacity)) if capacity > 0 else 0
+        if not fragments or fragments > self.slots // 2 or len(kind) > 255 or len(device) > 255:
+            self.oversized += 1
+            COUNTER.pack_into(self.buffer, OVERSIZED_OFFSET, self.oversized)
+            return None
+
+        buffer = self.buffer
+        seq = self.seq
+        for index in range(fragments):
+            seq += 1
+            offset = HEADER.size + (seq % self.slots) * self.slot_size
+            chunk = message[index * capacity:(index + 1) * capacity]
+            flags = (FRAGMENT_MORE if index < fragments - 1 else 0) | (FRAGMENT_NEXT if index else 0)
+            if sample:
+                flags |= HAS_SAMPLE
+
+            SLOT.pack_into(buffer, offset, 0, 0, 0.0, 0, 0, 0, 0)
+            end = offset + start + len(chunk)
+            buffer[offset + SLOT.size:offset + start] = sample + kind + device
+            buffer[offset + start:end] = chunk
+            SLOT.pack_into(buffer, offset, seq, stream_seq, origin or 0.0, len(chunk), len(kind), len(device), flags)
+
+        if fragments > 1:
+            self.fragmented += 1
+            COUNTER.pack_into(buffer, FRAGMENTED_OFFSET, self.fragmented)
+        # Los lectores ven el mensaje completo de una vez
+        COUNTER.pack_into(buffer, WRITE_SEQ_OFFSET, seq)
+
+        self.seq = seq
+        return seq
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'slots': self.slots,
+            'slot_size': self.slot_size,
+            'seq': self.seq,
+            'oversized': self.oversized,
+            'fragmented': self.fragmented
+        }
+
+    def close(self, unlink=True):
+        self.buffer = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class RingReader:
+    """Seguir los mensajes de un RingWriter desde otro proceso"""
+
+    def __init__(self, name, start='oldest'):
+        # El segmento pertenece al escritor: que este proceso no lo borre al salir
+        self.shm = _open_untracked(name)
+        self.buffer = self.shm.buf
+        magic, self.slots, self.slot_size, write_seq, _, _ = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Segmento {name} no es un buffer OpenMV")
+        self.next_seq = max(1, write_seq - self.slots + 2) if start == 'oldest' else write_seq + 1
+        self.lost = 0
+        self.read = 0
+        # Mensaje fragmentado en curso: [seq esperada, entrada, partes, muestra]
+        self._partial = None
+
+    @property
+    def write_seq(self):
+        return COUNTER.unpack_from(self.buffer, WRITE_SEQ_OFFSET)[0]
+
+    @property
+    def oversized(self):
+        """Mensajes que el escritor descartó por tamaño"""
+        return COUNTER.unpack_from(self.buffer, OVERSIZED_OFFSET)[0]
+
+    @property
+    def fragmented(self):
+        """Mensajes que el escritor repartió en varios slots"""
+        return COUNTER.unpack_from(self.buffer, FRAGMENTED_OFFSET)[0]
+
+    @property
+    def lag(self):
+        return max(0, self.write_seq - self.next_seq + 1)
+
+    def poll(self, limit=1024):
+        """Mensajes nuevos: [(seq, stream_seq, kind, device_id, origin, bytes, muestra o None)]"""
+        write_seq = self.write_seq
+        if write_seq < self.next_seq:
+            return []
+
+        # Atrasado más que el buffer: saltar al más antiguo que sigue vivo
+        oldest = write_seq - self.slots + 2
+        if self.next_seq < oldest:
+            self.lost += oldest - self.next_seq
+            self.next_seq = oldest
+            self._partial = None
+
+        entries = []
+        buffer = self.buffer
+        while self.next_seq <= write_seq and len(entries) < limit:
+            seq = self.next_seq
+            self.next_seq += 1
+            offset = HEADER.size + (seq % self.slots) * self.slot_size
+
+            slot_seq, stream_seq, origin, length, kind_length, device_length, flags = SLOT.unpack_from(buffer, offset)
+            if slot_seq != seq:
+                self.lost += 1
+                self._partial = None
+                continue
+            start = offset + SLOT.size
+            sample = None
+            if flags & HAS_SAMPLE:
+                sample = unpack_sample(buffer, start)
+                start += SAMPLE.size
+            header = bytes(buffer[start:start + kind_length + device_length])
+            message = bytes(buffer[start + kind_length + device_length:start + kind_length + device_length + length])
+            if SLOT.unpack_from(buffer, offset)[0] != seq:
+                # Sobrescrito mientras se copiaba
+                self.lost += 1
+                self._partial = None
+                continue
+
+            if flags & FRAGMENT_NEXT:
+                partial = self._partial
+                if partial is None or partial[0] != seq:
+                    # Continuación de un mensaje cuyo comienzo no se leyó
+                    self._partial = None
+                    if not flags & FRAGMENT_MORE:
+                        self.lost += 1
+                    continue
+                partial[2].append(message)
+                if flags & FRAGMENT_MORE:
+                    partial[0] = seq + 1
+                    continue
+                self._partial = None
+                entries.append(partial[1] + (b''.join(partial[2]), partial[3]))
+                continue
+
+            entry = (
+                seq,
+                stream_seq,
+                header[:kind_length].decode('utf-8'),
+                header[kind_length:].decode('utf-8') or None,
+                origin or None
+            )
+            if flags & FRAGMENT_MORE:
+                self._partial = [seq + 1, entry, [message], sample]
+                continue
+            self._partial = None
+            entries.append(entry + (message, sample))
+
+        self.read += len(entries)
+        return entries
+
+    def stats(self):
+        return {
+            'slots': self.slots,
+            'next_seq': self.next_seq,
+            'lag': self.lag,
+            'read': self.read,
+            'lost': self.lost,
+            'oversized': self.oversized,
+            'fragmented': self.fragmented
+        }
+
+    def close(self):
+        self.buffer = None
+        self.shm.close()
+
+
+def pack_sample(sample):
+    timestamp, percentage, fps, x, y, score, count = sample
+    return SAMPLE.pack(
+        timestamp,
+        percentage if percentage is not None and -32768 <= percentage <= 32767 else -1,
+        math.nan if fps is None else fps,
+        -1 if x is None else max(-2 ** 31, min(2 ** 31 - 1, int(x))),
+        -1 if y is None else max(-2 ** 31, min(2 ** 31 - 1, int(y))),
+        math.nan if x is None or score is None else score,
+        min(count or 0, 65535)
+    )
+
+
+def unpack_sample(buffer, offset):
+    timestamp, percentage, fps, x, y, score, count = SAMPLE.unpack_from(buffer, offset)
+    if math.isnan(score):
+        x = y = score = None
+    return (
+        timestamp,
+        None if percentage < 0 else percentage,
+        None if math.isnan(fps) else fps,
+        x, y, score, count
+    )
+
+
+def _open_untracked(name):
+    """Abrir un segmento existente sin registrarlo en el resource_tracker
+
+    Python < 3.13 registra también los segmentos abiertos (no creados) y los
+    borra al salir. Quitar el registro después de abrir no sirve: con fork el
+    tracker es compartido y se borraría también el registro del escritor.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    from multiprocessing import resource_tracker
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args, **kwargs: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
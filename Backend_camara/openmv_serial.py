@@ -0,0 +1,150 @@
+"""
+Backend_camara/openmv_serial.py
+"""
+
+import time
+import serial
+from threading import Thread
+from openmv_logging import logger
+
+
+class LineSplitter:
+    """Dividir bloques de bytes del puerto serie en líneas completas"""
+
+    def __init__(self, max_line_length=4096):
+        self.max_line_length = max_line_length
+        self._buffer = bytearray()
+
+    def feed(self, chunk):
+        """Agregar un bloque y devolver las líneas completas que contiene"""
+        self._buffer += chunk
+
+        if b'\n' not in chunk:
+            # Descartar basura sin saltos de línea para no crecer sin límite
+            if len(self._buffer) > self.max_line_length:
+                self._buffer.clear()
+            return []
+
+        parts = self._buffer.split(b'\n')
+        self._buffer = bytearray(parts.pop())
+
+        # Las líneas vacías se conservan: separan los frames de la cámara
+        return [raw.decode('utf-8', errors='ignore').strip() for raw in parts]
+
+    def reset(self):
+        """Vaciar la línea parcial pendiente"""
+        self._buffer.clear()
+
+
+class SerialTransport:
+    """Entregar bloques del puerto serie al event loop sin sondeo
+
+    En POSIX el descriptor del puerto se registra con ``loop.add_reader`` y la
+    lectura ocurre en el propio event loop. Donde no es posible (Windows /
+    ProactorEventLoop) un único hilo hace lecturas bloqueantes en bloque y
+    entrega cada buffer completo con ``call_soon_threadsafe``.
+    """
+
+    CHUNK_SIZE = 4096
+
+    def __init__(self, loop, serial_connection, on_chunk, on_error=None):
+        self.loop = loop
+        self.serial_connection = serial_connection
+        self.on_chunk = on_chunk
+        self.on_error = on_error
+        self.mode = None
+        self._running = False
+        self._thread = None
+        self._fd = None
+
+    @property
+    def is_running(self):
+        return self._running
+
+    def start(self):
+        """Comenzar a recibir datos del puerto"""
+        if self._running:
+            return
+
+        self._running = True
+        fd = self._get_fileno()
+
+        if fd is not None:
+            try:
+                self.serial_connection.timeout = 0
+                self.loop.add_reader(fd, self._read_ready)
+                self._fd = fd
+                self.mode = 'event_loop'
+                return
+            except (NotImplementedError, AttributeError, ValueError):
+                self.serial_connection.timeout = 1
+
+        self.mode = 'thread'
+        self._thread = Thread(target=self._read_blocking, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Dejar de recibir datos"""
+        self._running = False
+
+        if self._fd is not None:
+            try:
+                self.loop.remove_reader(self._fd)
+            except Exception:
+                pass
+            self._fd = None
+
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=2)
+        self._thread = None
+
+    def _get_fileno(self):
+        try:
+            return self.serial_connection.fileno()
+        except Exception:
+            return None
+
+    def _read_ready(self):
+        """Callback del event loop cuando el descriptor tiene datos"""
+        try:
+            chunk = self.serial_connection.read(self.CHUNK_SIZE)
+        except (serial.SerialException, OSError) as e:
+            self.stop()
+            self._report_error(e)
+            return
+
+        if chunk:
+            self.on_chunk(chunk, time.perf_counter())
+
+    def _read_blocking(self):
+        """Hilo lector: bloquea hasta tener datos y los entrega en bloque"""
+        while self._running:
+            try:
+                chunk = self.serial_connection.read(1)
+                if not chunk:
+                    continue
+
+                waiting = self.serial_connection.in_waiting
+                if waiting:
+                    chunk += self.serial_connection.read(min(waiting, self.CHUNK_SIZE))
+
+                self.loop.call_soon_threadsafe(self.on_chunk, chunk, time.perf_counter())
+
+            except (serial.SerialException, OSError) as e:
+                # Puerto desconectado: no reintentar sobre un descriptor muerto
+                if self._running:
+                    self._running = False
+                    self.loop.call_soon_threadsafe(self._report_error, e)
+                break
+
+            except Exception as e:
+                if not self._running:
+                    break
+                self.loop.call_soon_threadsafe(self._report_error, e)
+                time.sleep(0.5)
+
+    def _report_error(self, error):
+        if self.on_error:
+            self.on_error(error)
+        else:
+            logger.error("Error leyendo datos OpenMV: %s", error)
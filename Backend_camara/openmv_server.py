@@ -5,494 +5,731 @@ Backend_camara/openmv_server.py
 import asyncio
 import time
 import websockets
-import json
-import serial
-import serial.tools.list_ports
-from threading import Thread, Lock
-from datetime import datetime
 from collections import deque
+from openmv_broadcast import Broadcaster
+from openmv_connection import ConnectionManager
+from openmv_devices import DeviceManager, log_no_device_help
+from openmv_encoding import (
+    KEYFRAME_INTERVAL, EncodedCache, available_encodings, client_options, compute_delta,
+    decode, deflate_extensions, encode, encode_preview, normalize_encoding
+)
+from openmv_fomo import FomoBatcher, FomoPostProcessor
+from openmv_history import history_chunks
+from openmv_http import LONG_POLL_MAX, HttpApi
+from openmv_logging import logger, setup_logging, stop_logging
+from openmv_metrics import ServerMetrics
+from openmv_storage import DB_PATH, PersistenceWriter, parse_time
+from openmv_timeseries import DEFAULT_WINDOWS, RECENT_POINTS, parse_windows
+
+
+EMPTY_DATA = {
+    'level': 0,
+    'percentage': 0,
+    'timestamp': None,
+    'label': 'Desconocido',
+    'fps': 0,
+    'detection': None,
+    'detections': []
+}
+
 
 class OpenMVServer:
-    def __init__(self, baudrate=115200):
+    # Comandos que este proceso no atiende (ver FrontendServer)
+    unsupported_commands = ()
+    
+    def __init__(self, baudrate=115200, db_path=DB_PATH, retention_days=None, rollup_retention_days=None,
+                 protocol='auto', ws_deflate=True, compression=None):
         self.baudrate = baudrate
-        self.serial_connection = None
         self.is_running = False
         self.is_monitoring = False
-        self.clients = set()
-        self.latest_data = {
-            'level': 0,
-            'percentage': 0,
-            'timestamp': None,
-            'label': 'Desconocido',
-            'fps': 0,
-            'detection': None
-        }
-        self.data_lock = Lock()
+        self.metrics = ServerMetrics()
+        self.broadcaster = Broadcaster(queue_size=64, latency=self.metrics.e2e_latency)
+        self.devices = DeviceManager(
+            baudrate, on_frame=self.on_device_frame, protocol=protocol, compression=compression,
+            on_preview=self.on_device_preview
+        )
+        self.connections = ConnectionManager(self.devices, on_state=self.on_device_state)
+        self.storage = PersistenceWriter(
+            db_path,
+            retention_days=retention_days,
+            rollup_retention_days=rollup_retention_days
+        ) if db_path else None
+        self.db_path = db_path
+        self.ws_deflate = ws_deflate
+        self.published = {}
+        # Secuencia del último keyframe publicado por cámara
+        self.keyframes = {}
+        # Último mensaje de vista previa por cámara (compartido por todos los visores)
+        self.previews = {}
+        # Snapshots de conexión e historial ya codificados
+        self.encoded_cache = EncodedCache()
+        # Últimas alertas (stream_seq, alerta) para la API HTTP
+        self.alert_log = deque(maxlen=100)
+        self.http_api = HttpApi(self)
         self.loop = None
-        self.serial_thread = None
-        self.history = deque(maxlen=100)
-        self.alerts_sent = set()
+    
+    @property
+    def primary_device(self):
+        """Primera cámara registrada (compatibilidad con clientes de una cámara)"""
+        return self.devices.get()
+    
+    @property
+    def latest_data(self):
+        device = self.primary_device
+        return device.latest_data if device else EMPTY_DATA
+    
+    @property
+    def history(self):
+        device = self.primary_device
+        return device.history.recent() if device else []
+    
+    def on_device_frame(self, device, frame, alerts, publish=True, archive=None):
+        """Frame completo de una cámara: difundir estado, alertas y guardar
+
+        ``publish`` y ``archive`` vienen de la compresión de muestras de la
+        cámara: si el nivel no cambió no se difunde y solo se guardan los
+        frames que necesita la curva.
+        """
+        started = time.perf_counter()
         
-    def find_openmv_port(self):
-        """Buscar automáticamente el puerto de OpenMV"""
-        ports = serial.tools.list_ports.comports()
+        # Enviar datos actualizados
+        if publish:
+            self.broadcast_tank_data(device)
         
-        # Buscar puertos OpenMV comunes
-        for port in ports:
-            port_name = port.device.upper()
-            description = str(port.description).upper()
-            
-            # Detectar OpenMV por descripción o nombre
-            if 'OPENMV' in description or 'USB SERIAL' in description or 'CH340' in description:
-                print(f"OpenMV detectado en: {port.device}")
-                return port.device
+        # Enviar alertas si existen
+        for alert in alerts:
+            self.broadcast_alert(alert, origin=device.last_read_time)
         
-        # Si no encuentra, mostrar puertos disponibles
-        print("OpenMV no detectado automáticamente. Puertos disponibles:")
-        for port in ports:
-            print(f"   - {port.device}: {port.description}")
+        self.metrics.broadcast_duration.observe(time.perf_counter() - started)
+        self.http_api.notify()
         
-        return None
-   
-    def connect_openmv(self, port=None):
-        """Conectar con la cámara OpenMV"""
-        try:
-            if port is None:
-                port = self.find_openmv_port()
-            
-            if port is None:
-                print("\n" + "="*60)
-                print("ERROR: No se detecto OpenMV en ningun puerto")
-                print("="*60)
-                print("SOLUCION:")
-                print("  1. Verifica que la OpenMV este conectada")
-                print("  2. Ejecuta: python diagnostico_puerto.py")
-                print("  3. Identifica el puerto correcto")
-                print("="*60 + "\n")
-                return False
-            
-            print(f"\nIntentando conectar a {port}...")
-            
-            # Cerrar conexión previa
-            if self.serial_connection and self.serial_connection.is_open:
-                try:
-                    self.serial_connection.close()
-                    time.sleep(0.5)
-                except:
-                    pass
-            
-            # Abrir puerto con timeout mayor
-            self.serial_connection = serial.Serial(
-                port, 
-                self.baudrate, 
-                timeout=3,
-                write_timeout=3
-            )
-            
-            # Esperar estabilización
-            time.sleep(2)
-            
-            # Limpiar buffers
-            self.serial_connection.reset_input_buffer()
-            self.serial_connection.reset_output_buffer()
-            
-            # Verificar datos
-            time.sleep(1)
-            if self.serial_connection.in_waiting > 0:
-                print(f"Conectado - Recibiendo datos ({self.serial_connection.in_waiting} bytes)")
-            else:
-                print(f"Conectado - Esperando datos del script OpenMV")
-            
-            print(f"Conexion exitosa en {port}\n")
-            return True
-            
-        except serial.SerialException as e:
-            error_str = str(e)
-            print(f"\nERROR al conectar a {port}")
-            
-            if "PermissionError" in error_str or "denegado" in error_str.lower():
-                print("="*60)
-                print("PUERTO OCUPADO")
-                print("="*60)
-                print("CAUSA: VS Code o la extension OpenMV tiene el puerto abierto")
-                print("\nSOLUCION:")
-                print("  1. En VS Code, ve a la extension OpenMV")
-                print("  2. Haz clic en 'Disconnect' o 'Desconectar'")
-                print("  3. O cierra VS Code completamente")
-                print("  4. Vuelve a ejecutar este script")
-                print("="*60)
-            
-            elif "timeout" in error_str.lower() or "semaforo" in error_str.lower():
-                print("="*60)
-                print("TIMEOUT - DISPOSITIVO NO RESPONDE")
-                print("="*60)
-                print("CAUSA: Puerto existe pero no responde")
-                print("\nSOLUCION:")
-                print("  1. Desconecta y reconecta el cable USB")
-                print("  2. Prueba otro puerto USB")
-                print("  3. Verifica que el cable sea de datos (no solo carga)")
-                print("  4. Ejecuta el script en VS Code primero")
-                print("="*60)
-            else:
-                print(f"Detalles: {error_str}")
-            
-            print()
-            return False
-            
-        except Exception as e:
-            print(f"ERROR inesperado: {e}\n")
-            return False
+        # Encolar para el escritor de base de datos (nunca bloquea)
+        if self.storage:
+            # Los agregados ven todos los frames; readings solo los archivados
+            self.storage.put_frame(device.device_id, frame, archive)
+            for alert in alerts:
+                self.storage.put_alert(alert)
     
-    def disconnect_openmv(self):
-        """Desconectar la cámara OpenMV"""
-        self.is_monitoring = False
-        
-        if self.serial_connection and self.serial_connection.is_open:
-            self.serial_connection.close()
-            print("OpenMV desconectado")
+    def on_device_preview(self, device, preview):
+        """Vista previa JPEG de una cámara: armar el mensaje una vez y ofrecerlo"""
+        message = encode_preview(device.device_id, preview.seq, preview.timestamp, preview.jpeg)
+        self.previews[device.device_id] = message
+        self.broadcaster.publish_preview(device.device_id, message)
     
-    def parse_openmv_data(self, line):
-        """Parsear datos del script OpenMV"""
-        data_updated = False
-        
-        with self.data_lock:
-            # Detectar etiqueta de nivel
-            if "**********" in line:
-                label = line.replace("*", "").strip()
-                self.latest_data['label'] = label
-                
-                # Extraer porcentaje del label
-                if "nivel_" in label:
-                    try:
-                        percentage = int(label.split("_")[1])
-                        self.latest_data['percentage'] = percentage
-                        self.latest_data['timestamp'] = datetime.now().isoformat()
-                        data_updated = True
-                        
-                        # Agregar a historial
-                        self.history.append({
-                            'percentage': percentage,
-                            'timestamp': datetime.now().isoformat()
-                        })
-                        
-                    except (IndexError, ValueError):
-                        pass
-            
-            # Detectar coordenadas y score
-            elif line.startswith("x "):
-                parts = line.split("\t")
-                if len(parts) >= 3:
-                    try:
-                        x = int(parts[0].split()[1])
-                        y = int(parts[1].split()[1])
-                        score = float(parts[2].split()[1])
-                        
-                        self.latest_data['detection'] = {
-                            'x': x,
-                            'y': y,
-                            'score': score
-                        }
-                        data_updated = True
-                    except (IndexError, ValueError):
-                        pass
-            
-            # Detectar FPS
-            elif line.startswith("FPS:"):
-                try:
-                    fps = float(line.split(":")[1].strip())
-                    self.latest_data['fps'] = fps
-                    data_updated = True
-                except (IndexError, ValueError):
-                    pass
-        
-        return data_updated
+    def on_device_state(self, device, state, info):
+        """Cambio de conexión de una cámara: avisar a los clientes"""
+        logger.info("[%s] Estado: %s %s", device.device_id, state, info or '')
+        self.broadcaster.publish('device_state', {
+            'type': 'device_state',
+            'device_id': device.device_id,
+            'state': state,
+            'data': info
+        }, device_id=device.device_id)
+        self.http_api.notify()
     
-    def check_alerts(self):
-        """Verificar condiciones de alerta"""
-        alerts = []
-        percentage = self.latest_data.get('percentage', 0)
-        
-        # Alerta al 25%
-        if 24 <= percentage <= 26 and '25%' not in self.alerts_sent:
-            alerts.append({
-                'level': 'warning',
-                'message': f'Nivel de llenado al 25% - {percentage}%',
-                'percentage': percentage,
-                'timestamp': datetime.now().isoformat()
-            })
-            self.alerts_sent.add('25%')
-        
-        # Alerta al 100%
-        if percentage >= 100 and '100%' not in self.alerts_sent:
-            alerts.append({
-                'level': 'critical',
-                'message': f'TANQUE LLENO - Nivel al {percentage}%',
-                'percentage': percentage,
-                'timestamp': datetime.now().isoformat()
-            })
-            self.alerts_sent.add('100%')
+    @property
+    def clients(self):
+        """Clientes websocket conectados"""
+        return self.broadcaster.channels
+    
+    def is_serial_open(self, device_id=None):
+        device = self.devices.get(device_id)
+        return device is not None and device.is_connected
+    
+    def broadcast_tank_data(self, device):
+        """Enviar datos del tanque a los clientes suscritos a la cámara"""
+        data = device.snapshot()
+        seq = device.frame_seq
+        previous = self.published.get(device.device_id)
+        self.published[device.device_id] = (seq, data)
         
-        # Alerta de sin detección
-        if self.latest_data.get('detection') is None and self.is_monitoring:
-            if 'no_detection' not in self.alerts_sent:
-                alerts.append({
-                    'level': 'info',
-                    'message': 'Sin detección - Verifica la posición de la cámara',
-                    'percentage': 0,
-                    'timestamp': datetime.now().isoformat()
-                })
-                self.alerts_sent.add('no_detection')
+        # Se publica aunque no haya clientes (sin clientes no se codifica
+        # nada): el log de reanudación y la API HTTP siguen el stream.
+        # Los clientes delta reciben solo los campos cambiados entre keyframes.
+        # El intervalo se mide desde el último keyframe y no con seq % N: con
+        # compresión no se publican todos los frames y la secuencia salta
+        delta_payload = None
+        last_keyframe = self.keyframes.get(device.device_id)
+        if (previous and self.clients and last_keyframe is not None
+                and seq - last_keyframe < KEYFRAME_INTERVAL):
+            delta_payload = {
+                'type': 'tank_delta',
+                'device_id': device.device_id,
+                'seq': seq,
+                'base': previous[0],
+                'data': compute_delta(previous[1], data)
+            }
         else:
-            # Limpiar alerta de sin detección si hay detección
-            self.alerts_sent.discard('no_detection')
+            self.keyframes[device.device_id] = seq
         
-        # Resetear alertas cuando baje del umbral
-        if percentage < 25:
-            self.alerts_sent.discard('25%')
-        if percentage < 100:
-            self.alerts_sent.discard('100%')
-        
-        return alerts
+        self.broadcaster.publish('tank_data', {
+            'type': 'tank_data',
+            'device_id': device.device_id,
+            'seq': seq,
+            'data': data
+        }, device_id=device.device_id, delta_payload=delta_payload, origin=device.last_read_time,
+           sample=device.latest_sample)
     
-    def read_openmv_data(self):
-        """Leer datos continuamente de OpenMV"""
-        print("Iniciando lectura de datos OpenMV...")
-        
-        while self.is_running:
-            if not self.is_monitoring:
-                time.sleep(0.1)
+    def broadcast_alert(self, alert, origin=None):
+        """Enviar alerta a los clientes suscritos a la cámara"""
+        payload = {
+            'type': 'alert',
+            'device_id': alert.get('device_id'),
+            'data': alert
+        }
+        self.broadcaster.publish('alert', payload, device_id=alert.get('device_id'), origin=origin)
+        self.alert_log.append((payload['stream_seq'], alert))
+    
+    def broadcast_status(self, status_message):
+        """Enviar mensaje de estado"""
+        self.broadcaster.publish('status', {
+            'type': 'status',
+            'message': status_message,
+            'is_monitoring': self.is_monitoring,
+            'connected': self.is_serial_open(),
+            'devices': self.describe_devices()
+        })
+        self.http_api.notify()
+    
+    def describe_devices(self):
+        return [device.describe() for device in self.devices]
+    
+    def snapshot_messages(self, encoding):
+        """Último tank_data de cada cámara con datos, codificado una vez por frame"""
+        messages = []
+        for device in self.devices:
+            if not device.latest_data['timestamp']:
                 continue
-            
-            try:
-                if self.serial_connection and self.serial_connection.in_waiting:
-                    line = self.serial_connection.readline().decode('utf-8', errors='ignore').strip()
-                    
-                    if line:
-                        print(f"OpenMV: {line}")
-                        
-                        # Parsear datos
-                        data_updated = self.parse_openmv_data(line)
-                        
-                        if data_updated:
-                            # Verificar alertas
-                            alerts = self.check_alerts()
-                            
-                            # Enviar datos actualizados
-                            if self.loop:
-                                asyncio.run_coroutine_threadsafe(
-                                    self.broadcast_tank_data(),
-                                    self.loop
-                                )
-                            
-                            # Enviar alertas si existen
-                            for alert in alerts:
-                                if self.loop:
-                                    asyncio.run_coroutine_threadsafe(
-                                        self.broadcast_alert(alert),
-                                        self.loop
-                                    )
-            
-            except Exception as e:
-                print(f"Error leyendo datos OpenMV: {e}")
-                time.sleep(0.5)
-    
-    async def broadcast_tank_data(self):
-        """Enviar datos del tanque a todos los clientes"""
-        if self.clients:
-            with self.data_lock:
-                message = json.dumps({
+            messages.append((device.device_id, self.encoded_cache.get(
+                ('tank_data', device.device_id), device.frame_seq, encoding,
+                lambda device=device: {
                     'type': 'tank_data',
-                    'data': self.latest_data
-                })
-            
-            disconnected = set()
-            for client in self.clients:
-                try:
-                    await client.send(message)
-                except Exception as e:
-                    print(f"Error enviando a cliente: {e}")
-                    disconnected.add(client)
-            
-            # Remover clientes desconectados
-            self.clients -= disconnected
-    
-    async def broadcast_alert(self, alert):
-        """Enviar alerta a todos los clientes"""
-        if self.clients:
-            message = json.dumps({
-                'type': 'alert',
-                'data': alert
-            })
-            
-            disconnected = set()
-            for client in self.clients:
-                try:
-                    await client.send(message)
-                except Exception as e:
-                    print(f"Error enviando alerta: {e}")
-                    disconnected.add(client)
-            
-            self.clients -= disconnected
+                    'device_id': device.device_id,
+                    'seq': device.frame_seq,
+                    'data': device.snapshot()
+                }
+            )))
+        return messages
     
-    async def broadcast_status(self, status_message):
-        """Enviar mensaje de estado"""
-        if self.clients:
-            message = json.dumps({
-                'type': 'status',
-                'message': status_message,
-                'is_monitoring': self.is_monitoring,
-                'connected': self.serial_connection is not None
-            })
-            
-            disconnected = set()
-            for client in self.clients:
-                try:
-                    await client.send(message)
-                except Exception as e:
-                    print(f"Error enviando estado: {e}")
-                    disconnected.add(client)
-            
-            self.clients -= disconnected
+    def device_status(self, device_id=None):
+        """(device_id, último estado) de una cámara; sin id, la primera"""
+        device = self.devices.get(device_id)
+        if device is None:
+            return None, dict(EMPTY_DATA)
+        return device.device_id, device.snapshot()
+    
+    def recent_history(self, device_id=None, limit=RECENT_POINTS):
+        """(device_id, últimos ``limit`` puntos del historial en memoria) de una cámara"""
+        device = self.devices.get(device_id)
+        if device is None:
+            return None, []
+        return device.device_id, device.history.recent(limit)
+    
+    def window_stats(self, device_id=None, windows=(60,)):
+        """(device_id, estadísticas del nivel en cada ventana de segundos)"""
+        device = self.devices.get(device_id)
+        if device is None:
+            return None, []
+        return device.device_id, [device.history.window_stats(seconds) for seconds in windows]
+    
+    def recent_alerts(self):
+        """Últimas alertas difundidas, de la más antigua a la más reciente"""
+        return [alert for _, alert in self.alert_log]
+    
+    def history_version(self, device_id=None):
+        """Versión del historial en memoria (None = sin cámara)"""
+        device = self.devices.get(device_id)
+        return (device.device_id, device.history_seq) if device else None
+    
+    def history_message(self, device_id, encoding, limit=RECENT_POINTS):
+        """Respuesta a get_history, codificada una vez por versión del historial"""
+        def build():
+            device_id_, history = self.recent_history(device_id, limit)
+            return {'type': 'history', 'device_id': device_id_, 'data': history}
+        return self.encoded_cache.get(
+            ('history', device_id, limit), self.history_version(device_id), encoding, build
+        )
+    
+    def send_snapshot(self, channel):
+        """Encolar el estado actual de cada cámara (conexión o reanudación fallida)"""
+        for device_id, message in self.snapshot_messages(channel.encoding):
+            if channel.wants('tank_data', device_id):
+                channel.push('tank_data', message, device_id)
+                # El snapshot es del último frame y el próximo delta se arma
+                # sobre el último publicado (la compresión puede saltar
+                # frames): ese cliente recibe primero un keyframe
+                channel.keyframe_pending.add(device_id)
+    
+    def send_to_client(self, websocket, payload, kind='response'):
+        """Encolar un mensaje para un cliente sin esperar su envío"""
+        self.broadcaster.send_to(websocket, kind, payload)
     
     async def handle_client(self, websocket):
         """Manejar conexión de cliente WebSocket"""
         client_id = f"{websocket.remote_address[0]}:{websocket.remote_address[1]}"
-        print(f"Cliente conectado: {client_id} (Total: {len(self.clients) + 1})")
+        logger.info("Cliente conectado: %s (Total: %d)", client_id, len(self.clients) + 1)
         
-        self.clients.add(websocket)
+        channel = self.broadcaster.add(websocket)
+        options = client_options(websocket)
+        channel.encoding = normalize_encoding(options['encoding']) or 'json'
+        channel.delta = options['delta']
         
         try:
-            # Enviar estado actual al nuevo cliente
-            await websocket.send(json.dumps({
+            # Un cliente que reconecta con ?resume=<stream_seq> recibe solo lo
+            # que se perdió; si el log ya no lo tiene, el estado actual
+            missed = None
+            if options['resume'] is not None:
+                missed = self.broadcaster.missed(websocket, options['resume'], options['stream'])
+            
+            self.send_to_client(websocket, {
                 'type': 'connection',
                 'message': 'Conectado al servidor OpenMV',
                 'is_monitoring': self.is_monitoring,
-                'connected': self.serial_connection is not None and self.serial_connection.is_open
-            }))
+                'connected': self.is_serial_open(),
+                'encoding': channel.encoding,
+                'delta': channel.delta,
+                'encodings': available_encodings(),
+                'stream': self.broadcaster.stream_id,
+                'stream_seq': self.broadcaster.replay_log.seq,
+                'resumed': len(missed) if missed is not None else None
+            })
             
-            # Enviar datos actuales si existen
-            if self.latest_data['timestamp']:
-                await websocket.send(json.dumps({
-                    'type': 'tank_data',
-                    'data': self.latest_data
-                }))
+            if missed is not None:
+                channel.replay(missed)
+            else:
+                self.send_snapshot(channel)
             
             # Escuchar mensajes del cliente
             async for message in websocket:
                 try:
-                    data = json.loads(message)
+                    data = decode(message)
                     command = data.get('command')
                     
-                    print(f"Comando recibido de {client_id}: {command}")
+                    logger.info("Comando recibido de %s: %s", client_id, command)
+                    
+                    if command in self.unsupported_commands:
+                        self.send_to_client(websocket, {
+                            'type': 'response',
+                            'command': command,
+                            'success': False,
+                            'message': 'Comando no disponible en este proceso'
+                        })
                     
-                    if command == 'start':
+                    elif command == 'start':
                         success = await self.start_monitoring()
-                        await websocket.send(json.dumps({
+                        self.send_to_client(websocket, {
                             'type': 'response',
                             'command': 'start',
                             'success': success,
                             'message': 'Monitoreo iniciado' if success else 'Error al iniciar monitoreo'
-                        }))
+                        })
                     
                     elif command == 'stop':
                         await self.stop_monitoring()
-                        await websocket.send(json.dumps({
+                        self.send_to_client(websocket, {
                             'type': 'response',
                             'command': 'stop',
                             'success': True,
                             'message': 'Monitoreo detenido'
-                        }))
+                        })
                     
                     elif command == 'get_status':
-                        await websocket.send(json.dumps({
+                        device_id, snapshot = self.device_status(data.get('device_id'))
+                        self.send_to_client(websocket, {
                             'type': 'status',
                             'is_monitoring': self.is_monitoring,
-                            'connected': self.serial_connection is not None and self.serial_connection.is_open,
-                            'data': self.latest_data
-                        }))
+                            'connected': self.is_serial_open(data.get('device_id')),
+                            'device_id': device_id,
+                            'data': snapshot,
+                            'devices': self.describe_devices()
+                        })
+                    
+                    elif command == 'get_history' and ('start' in data or 'end' in data):
+                        self.loop.create_task(self.stream_history(websocket, data))
                     
                     elif command == 'get_history':
-                        await websocket.send(json.dumps({
-                            'type': 'history',
-                            'data': list(self.history)
-                        }))
+                        limit = int(data.get('limit', RECENT_POINTS))
+                        channel.push('history', self.history_message(data.get('device_id'), channel.encoding, limit))
+                    
+                    elif command == 'get_window_stats':
+                        device_id, stats = self.window_stats(
+                            data.get('device_id'), parse_windows(data.get('windows', DEFAULT_WINDOWS))
+                        )
+                        self.send_to_client(websocket, {
+                            'type': 'window_stats',
+                            'device_id': device_id,
+                            'data': stats
+                        })
+                    
+                    elif command == 'resume':
+                        # Respuesta primero: el cliente sabe si lo que sigue es
+                        # la repetición o un snapshot
+                        missed = self.broadcaster.missed(websocket, int(data.get('seq', -1)), data.get('stream'))
+                        self.send_to_client(websocket, {
+                            'type': 'response',
+                            'command': 'resume',
+                            'success': True,
+                            'mode': 'snapshot' if missed is None else 'replay',
+                            'replayed': len(missed) if missed is not None else 0,
+                            'stream': self.broadcaster.stream_id,
+                            'stream_seq': self.broadcaster.replay_log.seq
+                        })
+                        if missed is not None:
+                            channel.replay(missed)
+                        else:
+                            self.send_snapshot(channel)
+                    
+                    elif command == 'get_devices':
+                        self.send_to_client(websocket, {
+                            'type': 'devices',
+                            'data': self.describe_devices()
+                        })
+                    
+                    elif command in ('subscribe', 'subscribe_devices'):
+                        try:
+                            channel.subscribe(
+                                types=data.get('types'),
+                                devices=data.get('devices'),
+                                max_rate=data.get('max_rate')
+                            )
+                            success = True
+                        except (TypeError, ValueError, ZeroDivisionError):
+                            success = False
+                        # Los visores nuevos reciben la última imagen sin esperar la próxima
+                        for device_id, message in self.previews.items():
+                            if channel.wants_preview(device_id):
+                                channel.offer_preview(device_id, message)
+                        self.send_to_client(websocket, {
+                            'type': 'response',
+                            'command': command,
+                            'success': success,
+                            'subscription': channel.stats()
+                        })
+                    
+                    elif command == 'get_storage':
+                        self.send_to_client(websocket, {
+                            'type': 'storage',
+                            'data': self.storage.stats() if self.storage else None
+                        })
+                    
+                    elif command == 'set_encoding':
+                        encoding = normalize_encoding(data.get('encoding', channel.encoding))
+                        if encoding:
+                            channel.encoding = encoding
+                            delta = bool(data.get('delta', channel.delta))
+                            if delta and not channel.delta:
+                                # Empezar la cadena de deltas desde un keyframe
+                                channel.keyframe_pending.update(device.device_id for device in self.devices)
+                            channel.delta = delta
+                        self.send_to_client(websocket, {
+                            'type': 'response',
+                            'command': 'set_encoding',
+                            'success': encoding is not None,
+                            'encoding': channel.encoding,
+                            'delta': channel.delta,
+                            'encodings': available_encodings()
+                        })
+                    
+                    elif command == 'get_clients':
+                        self.send_to_client(websocket, {
+                            'type': 'clients',
+                            'data': self.broadcaster.stats()
+                        })
+                    
+                    elif command == 'get_alert_rules':
+                        self.send_to_client(websocket, {
+                            'type': 'alert_rules',
+                            'data': {
+                                device.device_id: device.alert_engine.describe()
+                                for device in self.devices
+                            }
+                        })
+                    
+                    elif command == 'reload_alert_rules':
+                        try:
+                            self.devices.reload_alert_rules()
+                            success, error = True, None
+                        except (OSError, ValueError, KeyError) as e:
+                            success, error = False, str(e)
+                        self.send_to_client(websocket, {
+                            'type': 'response',
+                            'command': 'reload_alert_rules',
+                            'success': success,
+                            'error': error
+                        })
+                    
+                    elif command == 'get_raw_lines':
+                        device = self.devices.get(data.get('device_id'))
+                        self.send_to_client(websocket, {
+                            'type': 'raw_lines',
+                            'device_id': device.device_id if device else None,
+                            'data': device.raw_lines.recent(data.get('limit', 100)) if device else []
+                        })
+                    
+                    elif command == 'get_metrics':
+                        self.send_to_client(websocket, {
+                            'type': 'metrics',
+                            'data': self.metrics.snapshot(self)
+                        })
                 
-                except json.JSONDecodeError:
-                    print(f"Error: mensaje no valido de {client_id}")
+                except ValueError:
+                    logger.warning("Mensaje no valido de %s", client_id)
                 except Exception as e:
-                    print(f"Error procesando comando de {client_id}: {e}")
+                    logger.error("Error procesando comando de %s: %s", client_id, e)
         
         except websockets.exceptions.ConnectionClosed:
-            print(f"Cliente desconectado: {client_id}")
+            logger.info("Cliente desconectado: %s", client_id)
         except Exception as e:
-            print(f"Error en cliente {client_id}: {e}")
+            logger.error("Error en cliente %s: %s", client_id, e)
         finally:
-            self.clients.discard(websocket)
-            print(f"Total clientes: {len(self.clients)}")
+            channel = self.broadcaster.remove(websocket)
+            if channel and (channel.shed_total or channel.close_reason):
+                logger.info("Cliente %s: %d enviados, %d descartados (%s)", client_id, channel.sent,
+                            channel.shed_total, channel.close_reason or 'cierre normal')
+            logger.info("Total clientes: %d", len(self.clients))
+    
+    async def stream_history(self, websocket, request):
+        """Enviar una serie histórica por rango desde la base de datos, en bloques"""
+        request_id = request.get('request_id')
+        channel = self.clients.get(websocket)
+        
+        if not self.db_path:
+            self.send_to_client(websocket, {
+                'type': 'history_end',
+                'request_id': request_id,
+                'success': False,
+                'message': 'Persistencia deshabilitada'
+            })
+            return
+        
+        try:
+            # Epoch 0 es un rango válido: solo se usa el valor por defecto sin dato
+            end = parse_time(request.get('end'))
+            if end is None:
+                end = time.time()
+            start = parse_time(request.get('start'))
+            if start is None:
+                start = end - 24 * 3600
+            device_id = request.get('device_id')
+            if device_id is None:
+                device_id = self.device_status()[0]
+            
+            chunks = history_chunks(
+                self.db_path,
+                device_id,
+                start,
+                end,
+                points=request.get('points', 500),
+                mode=request.get('mode', 'minmax')
+            )
+            
+            # Cada bloque se lee en el executor: la consulta nunca bloquea el event loop
+            summary = await self.loop.run_in_executor(None, next, chunks, None)
+            self.send_to_client(websocket, {
+                'type': 'history_start',
+                'request_id': request_id,
+                'device_id': device_id,
+                'start': start,
+                'end': end,
+                'mode': request.get('mode', 'minmax'),
+                **summary
+            }, kind='history')
+            
+            seq = 0
+            while channel and await channel.wait_for_space():
+                chunk = await self.loop.run_in_executor(None, next, chunks, None)
+                if chunk is None:
+                    break
+                self.send_to_client(websocket, {
+                    'type': 'history_chunk',
+                    'request_id': request_id,
+                    'seq': seq,
+                    'data': chunk
+                }, kind='history')
+                seq += 1
+            
+            chunks.close()
+            self.send_to_client(websocket, {
+                'type': 'history_end',
+                'request_id': request_id,
+                'success': True,
+                'chunks': seq
+            }, kind='history')
+        
+        except Exception as e:
+            logger.error("Error consultando historial: %s", e)
+            self.send_to_client(websocket, {
+                'type': 'history_end',
+                'request_id': request_id,
+                'success': False,
+                'message': str(e)
+            })
     
     async def start_monitoring(self):
-        """Iniciar monitoreo de OpenMV"""
+        """Iniciar monitoreo de todas las cámaras OpenMV"""
         if self.is_monitoring:
-            print("Ya se esta monitoreando")
+            logger.info("Ya se esta monitoreando")
             return True
         
-        # Conectar si no está conectado
-        if not self.serial_connection or not self.serial_connection.is_open:
-            if not self.connect_openmv(None):  # None para autodeteccion
-                await self.broadcast_status("Error: No se pudo conectar con OpenMV")
-                return False
+        # Conectar en paralelo las cámaras que no estén conectadas
+        connected = await self.devices.connect_all()
+        if not connected and not self.devices.discover_ports:
+            self.broadcast_status("Error: No se pudo conectar con OpenMV")
+            return False
         
         self.is_monitoring = True
-        self.alerts_sent.clear()
         
-        # Iniciar thread de lectura si no existe
-        if self.serial_thread is None or not self.serial_thread.is_alive():
-            self.serial_thread = Thread(target=self.read_openmv_data, daemon=True)
-            self.serial_thread.start()
+        # Reconexión automática y detección de cámaras conectadas en caliente
+        self.connections.start()
+        
+        # Registrar lectura de cada puerto en el event loop
+        self.devices.start_all()
+        
+        if not connected:
+            log_no_device_help()
+            self.broadcast_status("Error: No se pudo conectar con OpenMV (esperando camara)")
+            return False
         
-        await self.broadcast_status("Monitoreo iniciado")
-        print("Monitoreo iniciado")
+        self.broadcast_status(f"Monitoreo iniciado ({len(connected)} camara(s))")
+        logger.info("Monitoreo iniciado (%d camara(s))", len(connected))
         return True
     
     async def stop_monitoring(self):
         """Detener monitoreo de OpenMV"""
         self.is_monitoring = False
-        await self.broadcast_status("Monitoreo detenido")
-        print("Monitoreo detenido")
+        self.connections.stop()
+        self.devices.stop_all()
+        self.broadcast_status("Monitoreo detenido")
+        logger.info("Monitoreo detenido")
     
-    async def start_server(self, host='localhost', port=8765):
+    async def start_server(self, host='localhost', port=8765, reuse_port=False):
         """Iniciar servidor WebSocket"""
         self.loop = asyncio.get_running_loop()
+        self.devices.loop = self.loop
         self.is_running = True
+        setup_logging()
         
-        print("\n" + "="*50)
-        print("SERVIDOR OPENMV WEBSOCKET")
-        print("="*50)
-        print(f"Servidor iniciado en ws://{host}:{port}")
-        print(f"Puerto COM configurado: Autodeteccion")
-        print(f"Esperando conexiones...")
-        print("="*50 + "\n")
+        if self.storage:
+            self.storage.start()
         
-        async with websockets.serve(self.handle_client, host, port):
+        logger.info("Servidor websocket en ws://%s:%s", host, port)
+        
+        async with websockets.serve(
+            self.handle_client,
+            host,
+            port,
+            compression=None,
+            extensions=deflate_extensions(self.ws_deflate),
+            process_request=self.process_http_request,
+            reuse_port=reuse_port,
+            # El handshake incluye la espera de los long-poll HTTP
+            open_timeout=LONG_POLL_MAX + 5
+        ):
             await asyncio.Future()
     
+    async def run_ingestion(self, summary_interval=2.0):
+        """Solo ingestión (modo multiproceso, ver openmv_frontend.py)
+
+        Monitorea sin esperar el comando start y publica periódicamente el
+        resumen de cámaras para los procesos websocket.
+        """
+        self.loop = asyncio.get_running_loop()
+        self.devices.loop = self.loop
+        self.is_running = True
+        setup_logging()
+        
+        if self.storage:
+            self.storage.start()
+        
+        logger.info("Proceso de ingestion iniciado")
+        
+        await self.start_monitoring()
+        
+        # El resumen va directo al buffer: no es una actualización para clientes
+        # y no consume stream_seq
+        while self.is_running:
+            if self.broadcaster.ring is not None:
+                self.broadcaster.ring.publish('devices', encode({
+                    'type': 'devices',
+                    'is_monitoring': self.is_monitoring,
+                    'data': self.describe_devices()
+                }))
+            await asyncio.sleep(summary_interval)
+    
+    def process_http_request(self, connection, request):
+        """Responder GET /metrics (Prometheus) y /api/* en el mismo puerto del websocket"""
+        if self.http_api.handles(request.path):
+            return self.http_api.handle(connection, request)
+        if request.path.split('?')[0] == '/metrics':
+            response = connection.respond(200, self.metrics.render(self))
+            del response.headers['Content-Type']
+            response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+            return response
+        return None
+    
     def shutdown(self):
         """Apagar servidor limpiamente"""
-        print("\nApagando servidor...")
+        logger.info("Apagando servidor...")
         self.is_running = False
         self.is_monitoring = False
-        self.disconnect_openmv()
-        print("Servidor apagado\n")
+        self.connections.stop()
+        self.devices.close_all()
+        if self.storage:
+            self.storage.stop()
+        stop_logging()
 
 
 if __name__ == "__main__":
+    import os
     import sys
     
-    server = OpenMVServer()
+    # Retención de lecturas crudas / agregados por minuto (días, vacío = sin límite)
+    retention_days = os.environ.get('OPENMV_RETENTION_DAYS', '30')
+    rollup_retention_days = os.environ.get('OPENMV_ROLLUP_RETENTION_DAYS', '365')
+    
+    # Compresión de muestras: banda muerta de difusión, desvío del swinging door
+    # (puntos de nivel) y heartbeat (s); 0/0 desactiva la compresión
+    compression = {
+        'deadband': float(os.environ.get('OPENMV_DEADBAND', '1')),
+        'deviation': float(os.environ.get('OPENMV_SDT_DEVIATION', '1')),
+        'heartbeat': float(os.environ.get('OPENMV_HEARTBEAT', '30'))
+    }
+    
+    server = OpenMVServer(
+        compression=compression,
+        protocol=os.environ.get('OPENMV_PROTOCOL', 'auto'),
+        ws_deflate=os.environ.get('OPENMV_WS_DEFLATE', '1') != '0',
+        retention_days=float(retention_days) if retention_days else None,
+        rollup_retention_days=float(rollup_retention_days) if rollup_retention_days else None
+    )
+    
+    # Reproducir capturas en lugar de cámaras reales / grabar las cámaras conectadas
+    replay_speed = float(os.environ.get('OPENMV_REPLAY_SPEED', '1'))
+    for index, path in enumerate(filter(None, os.environ.get('OPENMV_REPLAY', '').split(','))):
+        server.devices.add_replay(f"replay{index}", path.strip(), speed=replay_speed)
+    server.devices.capture_dir = os.environ.get('OPENMV_CAPTURE_DIR') or None
+    
+    # Confianza mínima del post-procesamiento FOMO en el host (min_confidence de la cámara)
+    server.devices.fomo = FomoBatcher(FomoPostProcessor(float(os.environ.get('OPENMV_FOMO_CONFIDENCE', '0.7'))))
+    
+    # Procesos websocket separados de la ingestión (0 = un solo proceso)
+    workers = int(os.environ.get('OPENMV_WORKERS', '0'))
+    
+    print("\n" + "="*50)
+    print("SERVIDOR OPENMV WEBSOCKET" if workers <= 0 else f"SERVIDOR OPENMV ({workers} procesos websocket)")
+    print("="*50)
+    print("Servidor en ws://0.0.0.0:8765")
+    print("Puerto COM configurado: Autodeteccion")
+    print("Esperando conexiones...")
+    print("="*50 + "\n")
     
     try:
-        asyncio.run(server.start_server(host='0.0.0.0', port=8765))
+        if workers > 0:
+            from openmv_frontend import serve_multiprocess
+            serve_multiprocess(server, workers, host='0.0.0.0', port=8765)
+        else:
+            asyncio.run(server.start_server(host='0.0.0.0', port=8765))
     except KeyboardInterrupt:
         server.shutdown()
-        print("Servidor detenido por usuario")
+        print("Servidor apagado")
         sys.exit(0)
\ No newline at end of file
@@ -0,0 +1,408 @@
+"""
+Backend_camara/openmv_storage.py
+"""
+
+import os
+import queue
+import sqlite3
+import time
+from datetime import datetime, timezone
+from threading import Thread
+
+from openmv_logging import logger
+
+
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'openmv_data.db')
+
+# Formato nativo de SQLite (igual que CURRENT_TIMESTAMP), en UTC
+DB_TIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS readings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                percentage INTEGER NOT NULL,
+                label TEXT,
+                fps REAL,
+                detection_x INTEGER,
+                detection_y INTEGER,
+                detection_score REAL,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            )''',
+    '''CREATE TABLE IF NOT EXISTS alerts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                level TEXT NOT NULL,
+                message TEXT NOT NULL,
+                percentage INTEGER,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            )''',
+    'CREATE INDEX IF NOT EXISTS idx_readings_timestamp ON readings(timestamp)',
+    'CREATE INDEX IF NOT EXISTS idx_alerts_timestamp ON alerts(timestamp)',
+]
+
+# Columnas agregadas a las tablas originales (multi-cámara)
+MIGRATIONS = [
+    ('readings', 'device_id', 'TEXT'),
+    ('readings', 'detection_count', 'INTEGER'),
+    ('alerts', 'device_id', 'TEXT'),
+]
+
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_readings_device_timestamp ON readings(device_id, timestamp)',
+    'CREATE INDEX IF NOT EXISTS idx_alerts_device_timestamp ON alerts(device_id, timestamp)',
+]
+
+# Agregados incrementales: (tabla, ancho del bucket en segundos)
+ROLLUPS = [
+    ('readings_1m', 60),
+    ('readings_1h', 3600),
+]
+
+ROLLUP_SCHEMA = '''CREATE TABLE IF NOT EXISTS {table} (
+                device_id TEXT NOT NULL,
+                bucket INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                percentage_sum REAL NOT NULL,
+                percentage_min INTEGER,
+                percentage_max INTEGER,
+                fps_sum REAL NOT NULL DEFAULT 0,
+                fps_count INTEGER NOT NULL DEFAULT 0,
+                detections INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (device_id, bucket)
+            )'''
+
+ROLLUP_UPSERT = '''INSERT INTO {table}
+    (device_id, bucket, count, percentage_sum, percentage_min, percentage_max,
+     fps_sum, fps_count, detections)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(device_id, bucket) DO UPDATE SET
+        count = count + excluded.count,
+        percentage_sum = percentage_sum + excluded.percentage_sum,
+        percentage_min = MIN(percentage_min, excluded.percentage_min),
+        percentage_max = MAX(percentage_max, excluded.percentage_max),
+        fps_sum = fps_sum + excluded.fps_sum,
+        fps_count = fps_count + excluded.fps_count,
+        detections = detections + excluded.detections'''
+
+# Recalcular un agregado desde readings (solo al crear la tabla)
+ROLLUP_BACKFILL = '''INSERT INTO {table}
+    SELECT COALESCE(device_id, ''),
+           CAST(((julianday(timestamp) - 2440587.5) * 86400.0) / {width} AS INTEGER) * {width},
+           COUNT(*), SUM(percentage), MIN(percentage), MAX(percentage),
+           COALESCE(SUM(fps), 0), COUNT(fps), COALESCE(SUM(detection_count), 0)
+    FROM readings GROUP BY 1, 2'''
+
+INSERT_READING = '''INSERT INTO readings
+    (device_id, percentage, label, fps, detection_x, detection_y, detection_score,
+     detection_count, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+
+INSERT_ALERT = '''INSERT INTO alerts
+    (device_id, level, message, percentage, timestamp)
+    VALUES (?, ?, ?, ?, ?)'''
+
+
+def to_db_time(epoch):
+    """Epoch (segundos) -> texto de fecha de SQLite en UTC"""
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime(DB_TIME_FORMAT)
+
+
+def from_db_time(text):
+    """Texto de fecha de SQLite en UTC -> epoch (segundos)"""
+    fmt = DB_TIME_FORMAT if '.' in text else '%Y-%m-%d %H:%M:%S'
+    return datetime.strptime(text, fmt).replace(tzinfo=timezone.utc).timestamp()
+
+
+def parse_time(value):
+    """Aceptar epoch numérico o fecha ISO de un cliente y devolver epoch"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(str(value)).timestamp()
+
+
+def connect(db_path=DB_PATH, readonly=False):
+    """Abrir la base de datos con los pragmas del servidor"""
+    if readonly:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+    else:
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+def ensure_schema(conn):
+    """Crear las tablas si faltan y aplicar las columnas nuevas"""
+    for statement in SCHEMA:
+        conn.execute(statement)
+
+    for table, column, column_type in MIGRATIONS:
+        columns = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+        if column not in columns:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}')
+
+    for statement in INDEXES:
+        conn.execute(statement)
+
+    for table, width in ROLLUPS:
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)
+        ).fetchone()
+        conn.execute(ROLLUP_SCHEMA.format(table=table))
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_bucket ON {table}(bucket)')
+        if not exists:
+            conn.execute(ROLLUP_BACKFILL.format(table=table, width=width))
+    conn.commit()
+
+
+def aggregate_rollups(samples):
+    """Agrupar muestras (device_id, epoch, percentage, fps, detections) por bucket"""
+    result = {}
+    for table, width in ROLLUPS:
+        buckets = {}
+        for device_id, epoch, percentage, fps, detections in samples:
+            key = (device_id or '', int(epoch // width) * width)
+            acc = buckets.get(key)
+            if acc is None:
+                acc = buckets[key] = [0, 0.0, percentage, percentage, 0.0, 0, 0]
+            acc[0] += 1
+            acc[1] += percentage
+            if percentage < acc[2]:
+                acc[2] = percentage
+            if percentage > acc[3]:
+                acc[3] = percentage
+            if fps is not None:
+                acc[4] += fps
+                acc[5] += 1
+            acc[6] += detections
+        result[table] = [key + tuple(acc) for key, acc in buckets.items()]
+    return result
+
+
+def frame_to_row(device_id, frame):
+    """Fila de readings para un frame (None si el frame no trae nivel)"""
+    if frame.percentage is None:
+        return None
+
+    best = frame.best_detection
+    return (
+        device_id,
+        frame.percentage,
+        frame.label,
+        frame.fps,
+        best.x if best else None,
+        best.y if best else None,
+        best.score if best else None,
+        len(frame.detections),
+        to_db_time(frame.timestamp)
+    )
+
+
+def alert_to_row(alert):
+    timestamp = alert.get('timestamp')
+    epoch = parse_time(timestamp) if timestamp else time.time()
+    return (
+        alert.get('device_id'),
+        alert['level'],
+        alert['message'],
+        alert.get('percentage'),
+        to_db_time(epoch)
+    )
+
+
+class PersistenceWriter:
+    """Escritor dedicado que guarda frames y alertas en lotes
+
+    El event loop solo encola (``put_nowait``); un hilo propio agrupa las filas
+    y las escribe con ``executemany`` en una transacción cuando se junta
+    ``batch_size`` o pasa ``flush_interval`` segundos. En la misma transacción
+    actualiza los agregados por minuto y por hora, y cada ``retention_interval``
+    segundos borra las filas crudas con más de ``retention_days`` días.
+    """
+
+    _STOP = object()
+
+    def __init__(self, db_path=DB_PATH, batch_size=200, flush_interval=1.0, max_queue=10000,
+                 retention_days=None, rollup_retention_days=None, retention_interval=3600):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self.rollup_retention_days = rollup_retention_days
+        self.retention_interval = retention_interval
+        self.rows_expired = 0
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.readings_written = 0
+        self.alerts_written = 0
+        self.batches = 0
+        self.last_flush_ms = 0.0
+        self.errors = 0
+        self._thread = None
+
+    @property
+    def backlog(self):
+        return self.queue.qsize()
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Arrancar el hilo escritor"""
+        if self.is_running:
+            return
+        self._thread = Thread(target=self._run, name='openmv-storage', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """Vaciar lo pendiente y detener el hilo"""
+        if not self.is_running:
+            return
+        self.queue.put(self._STOP)
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def put_frame(self, device_id, frame, archive=None):
+        """Encolar un frame sin bloquear
+
+        Todos los frames alimentan los agregados por minuto y por hora; en
+        ``readings`` solo se guardan los de ``archive`` (los vértices de la
+        compresión, ver openmv_compression.py). Sin ``archive`` se guarda el
+        mismo frame.
+        """
+        if archive is None:
+            archive = (frame,)
+        rows = [row for row in (frame_to_row(device_id, archived) for archived in archive) if row is not None]
+        sample = None
+        if frame.percentage is not None:
+            sample = (device_id, frame.timestamp, frame.percentage, frame.fps, len(frame.detections))
+        if rows or sample:
+            self._put(('reading', rows, sample))
+
+    def put_alert(self, alert):
+        """Encolar una alerta sin bloquear"""
+        self._put(('alert', alert_to_row(alert), None))
+
+    def _put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        conn = connect(self.db_path)
+        ensure_schema(conn)
+
+        readings = []
+        samples = []
+        alerts = []
+        deadline = time.monotonic() + self.flush_interval
+        next_retention = time.monotonic()
+        running = True
+
+        while running:
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+                if item is self._STOP:
+                    running = False
+                else:
+                    kind, row, sample = item
+                    if kind == 'reading':
+                        readings.extend(row)
+                        if sample:
+                            samples.append(sample)
+                    else:
+                        alerts.append(row)
+            except queue.Empty:
+                pass
+
+            pending = max(len(readings), len(samples)) + len(alerts)
+            if pending and (not running or pending >= self.batch_size or time.monotonic() >= deadline):
+                self._flush(conn, readings, samples, alerts)
+                readings = []
+                samples = []
+                alerts = []
+
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval
+
+            if running and time.monotonic() >= next_retention:
+                self.apply_retention(conn)
+                next_retention = time.monotonic() + self.retention_interval
+
+        conn.close()
+
+    def apply_retention(self, conn, now=None):
+        """Borrar filas crudas y agregados por minuto más antiguos que la retención"""
+        now = now or time.time()
+        targets = []
+        if self.retention_days:
+            cutoff = to_db_time(now - self.retention_days * 86400)
+            targets.append((
+                'DELETE FROM readings WHERE id IN '
+                '(SELECT id FROM readings WHERE timestamp < ? LIMIT ?)',
+                cutoff
+            ))
+        if self.rollup_retention_days:
+            cutoff = int(now - self.rollup_retention_days * 86400)
+            targets.append((
+                'DELETE FROM readings_1m WHERE rowid IN '
+                '(SELECT rowid FROM readings_1m WHERE bucket < ? LIMIT ?)',
+                cutoff
+            ))
+
+        deleted = 0
+        try:
+            for statement, cutoff in targets:
+                # Lotes cortos para no retener el lock de escritura
+                while True:
+                    with conn:
+                        count = conn.execute(statement, (cutoff, 5000)).rowcount
+                    deleted += count
+                    if count < 5000:
+                        break
+            if deleted:
+                conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+                logger.info("Retencion: %d filas antiguas eliminadas", deleted)
+        except sqlite3.Error:
+            self.errors += 1
+            logger.exception("Error aplicando retencion")
+
+        self.rows_expired += deleted
+        return deleted
+
+    def _flush(self, conn, readings, samples, alerts):
+        start = time.perf_counter()
+        try:
+            with conn:
+                if readings:
+                    conn.executemany(INSERT_READING, readings)
+                if samples:
+                    for table, rows in aggregate_rollups(samples).items():
+                        conn.executemany(ROLLUP_UPSERT.format(table=table), rows)
+                if alerts:
+                    conn.executemany(INSERT_ALERT, alerts)
+            self.readings_written += len(readings)
+            self.alerts_written += len(alerts)
+            self.batches += 1
+        except sqlite3.Error:
+            self.errors += 1
+            logger.exception("Error guardando lote en base de datos")
+        self.last_flush_ms = (time.perf_counter() - start) * 1000
+
+    def stats(self):
+        return {
+            'backlog': self.backlog,
+            'max_queue': self.queue.maxsize,
+            'dropped': self.dropped,
+            'readings_written': self.readings_written,
+            'alerts_written': self.alerts_written,
+            'batches': self.batches,
+            'last_flush_ms': round(self.last_flush_ms, 2),
+            'retention_days': self.retention_days,
+            'rows_expired': self.rows_expired,
+            'errors': self.errors
+        }
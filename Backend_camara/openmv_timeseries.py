@@ -0,0 +1,276 @@
+"""
+Backend_camara/openmv_timeseries.py
+
+Historial en memoria de una cámara en columnas de tamaño fijo.
+
+Cada muestra ocupa 22 bytes repartidos en arrays preasignados (sin un dict
+ni un string ISO por muestra):
+
+    timestamp  float64  epoch (s)
+    percentage int8     -1 = sin nivel
+    fps        float32  NaN = sin dato
+    x, y       int16    centro de la mejor detección, -1 = sin detección
+    score      float32  score de la mejor detección
+    count      uint8    cantidad de detecciones
+
+Con la capacidad por defecto (OPENMV_HISTORY_SIZE, 36000 muestras) entran
+una hora a 10 fps por cámara en ~800 KB. Las estadísticas por ventana
+(media, mínimo, máximo y pendiente en %/s de los últimos N segundos) se
+calculan con NumPy sobre vistas de los mismos arrays, sin copiarlos; sin
+NumPy se recorren en Python. El JSON se arma solo al responder.
+"""
+
+import math
+import os
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+DEFAULT_CAPACITY = int(os.environ.get('OPENMV_HISTORY_SIZE', '36000'))
+
+# Puntos que devuelve get_history sin ``limit`` (lo que guardaba el deque anterior)
+RECENT_POINTS = 100
+
+# Ventanas (s) de get_window_stats sin parámetro: minuto, 5 minutos y hora
+DEFAULT_WINDOWS = (60, 300, 3600)
+MAX_WINDOWS = 16
+
+# columna, typecode de array, dtype de NumPy, valor inicial
+COLUMNS = (
+    ('timestamp', 'd', 'float64', 0.0),
+    ('percentage', 'b', 'int8', -1),
+    ('fps', 'f', 'float32', math.nan),
+    ('x', 'h', 'int16', -1),
+    ('y', 'h', 'int16', -1),
+    ('score', 'f', 'float32', 0.0),
+    ('count', 'B', 'uint8', 0),
+)
+
+
+class HistoryBuffer:
+    """Buffer circular en columnas con consultas por ventana de tiempo"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.size = 0
+        # Posición donde se escribe la próxima muestra
+        self.head = 0
+        self.columns = {
+            name: array(typecode, [initial]) * capacity
+            for name, typecode, _, initial in COLUMNS
+        }
+        self._columns = tuple(self.columns[name] for name, _, _, _ in COLUMNS)
+        # Vistas NumPy sobre la misma memoria (los arrays nunca cambian de tamaño)
+        self.views = {
+            name: np.frombuffer(self.columns[name], dtype=dtype)
+            for name, _, dtype, _ in COLUMNS
+        } if np is not None else None
+
+    def __len__(self):
+        return self.size
+
+    def append(self, frame):
+        """Guardar un Frame"""
+        best = frame.best_detection
+        if best is None:
+            self.append_values(frame.timestamp, frame.percentage, frame.fps)
+        else:
+            self.append_values(
+                frame.timestamp, frame.percentage, frame.fps, best.x, best.y, best.score, len(frame.detections)
+            )
+
+    def append_values(self, timestamp, percentage, fps=None, x=None, y=None, score=None, count=0):
+        """Guardar una muestra suelta (None = sin dato)"""
+        index = self.head
+        timestamps, percentages, fps_column, xs, ys, scores, counts = self._columns
+
+        timestamps[index] = timestamp
+        # Un nivel fuera de int8 (etiqueta mal formada) se guarda como sin nivel
+        percentages[index] = percentage if percentage is not None and 0 <= percentage <= 127 else -1
+        fps_column[index] = math.nan if fps is None else fps
+        if x is None:
+            xs[index] = ys[index] = -1
+            scores[index] = 0.0
+        else:
+            xs[index] = x if -32768 <= x <= 32767 else _clamp_int16(x)
+            ys[index] = y if -32768 <= y <= 32767 else _clamp_int16(y)
+            scores[index] = score
+        counts[index] = count if count < 256 else 255
+
+        index += 1
+        self.head = 0 if index == self.capacity else index
+        if self.size < self.capacity:
+            self.size += 1
+
+    def extend(self, frames):
+        for frame in frames:
+            self.append(frame)
+
+    def clear(self):
+        self.size = 0
+        self.head = 0
+
+    def _segments(self, skip=0):
+        """Rangos físicos [(inicio, fin)] en orden cronológico, salteando ``skip`` muestras"""
+        start = (self.head - self.size) % self.capacity
+        segments = []
+        if start + self.size <= self.capacity:
+            segments.append((start, start + self.size))
+        else:
+            segments.append((start, self.capacity))
+            segments.append((0, self.head))
+
+        result = []
+        for begin, end in segments:
+            if skip >= end - begin:
+                skip -= end - begin
+                continue
+            result.append((begin + skip, end))
+            skip = 0
+        return result
+
+    def _since(self, timestamp):
+        """Cantidad de muestras anteriores a ``timestamp`` (orden de llegada)"""
+        timestamps = self.columns['timestamp']
+        skipped = 0
+        for begin, end in self._segments():
+            if timestamps[end - 1] >= timestamp:
+                return skipped + bisect_left(timestamps, timestamp, begin, end) - begin
+            skipped += end - begin
+        return skipped
+
+    def recent(self, limit=RECENT_POINTS):
+        """Últimas ``limit`` muestras con nivel, como dicts para JSON"""
+        timestamps = self.columns['timestamp']
+        percentages = self.columns['percentage']
+        points = []
+        for begin, end in self._segments(max(0, self.size - limit)):
+            for index in range(begin, end):
+                if percentages[index] >= 0:
+                    points.append({
+                        'percentage': percentages[index],
+                        'timestamp': datetime.fromtimestamp(timestamps[index]).isoformat()
+                    })
+        return points
+
+    def window_stats(self, seconds, now=None):
+        """Media, mínimo, máximo y pendiente (%/s) del nivel en los últimos ``seconds``
+
+        ``now`` por defecto es la última muestra (no el reloj): una cámara
+        detenida sigue mostrando su última ventana.
+        """
+        if not self.size:
+            stats = _empty_stats()
+        else:
+            if now is None:
+                now = self.columns['timestamp'][(self.head - 1) % self.capacity]
+            segments = self._segments(self._since(now - seconds))
+            if self.views is not None:
+                stats = self._stats_numpy(segments, now)
+            else:
+                stats = self._stats_python(segments, now)
+        stats['seconds'] = seconds
+        return stats
+
+    def _stats_numpy(self, segments, now):
+        views = self.views
+        if len(segments) == 1:
+            begin, end = segments[0]
+            timestamps = views['timestamp'][begin:end]
+            percentages = views['percentage'][begin:end]
+        else:
+            timestamps = np.concatenate([views['timestamp'][b:e] for b, e in segments])
+            percentages = np.concatenate([views['percentage'][b:e] for b, e in segments])
+
+        valid = (percentages >= 0) & (timestamps <= now)
+        if not valid.all():
+            timestamps = timestamps[valid]
+            percentages = percentages[valid]
+        if not len(percentages):
+            return _empty_stats()
+
+        values = percentages.astype(np.float64)
+        # Tiempos relativos a la última muestra: epoch al cuadrado pierde precisión
+        times = timestamps - timestamps[-1]
+        slope = None
+        if len(values) > 1:
+            centered = times - times.mean()
+            spread = float(np.dot(centered, centered))
+            if spread > 0:
+                slope = float(np.dot(centered, values - values.mean())) / spread
+
+        return _stats(
+            len(values), float(values.mean()), int(values.min()), int(values.max()),
+            slope, float(timestamps[0]), float(timestamps[-1])
+        )
+
+    def _stats_python(self, segments, now):
+        timestamps = self.columns['timestamp']
+        percentages = self.columns['percentage']
+        points = [
+            (timestamps[index], percentages[index])
+            for begin, end in segments for index in range(begin, end)
+            if percentages[index] >= 0 and timestamps[index] <= now
+        ]
+        if not points:
+            return _empty_stats()
+
+        last = points[-1][0]
+        count = len(points)
+        mean_t = sum(t - last for t, _ in points) / count
+        mean_p = sum(p for _, p in points) / count
+        spread = sum((t - last - mean_t) ** 2 for t, _ in points)
+        slope = None
+        if count > 1 and spread > 0:
+            slope = sum((t - last - mean_t) * (p - mean_p) for t, p in points) / spread
+
+        values = [p for _, p in points]
+        return _stats(count, mean_p, min(values), max(values), slope, points[0][0], last)
+
+    def stats(self):
+        return {
+            'size': self.size,
+            'capacity': self.capacity,
+            'bytes': sum(column.itemsize for column in self.columns.values()) * self.capacity
+        }
+
+
+def parse_windows(value):
+    """Ventanas en segundos de un número, una lista o un texto '60,300'"""
+    if isinstance(value, str):
+        value = value.split(',')
+    elif not isinstance(value, (list, tuple)):
+        value = [value]
+    try:
+        windows = [float(seconds) for seconds in value]
+    except TypeError:
+        raise ValueError("Ventanas no validas")
+    if not windows or len(windows) > MAX_WINDOWS or min(windows) <= 0:
+        raise ValueError("Ventanas no validas")
+    return windows
+
+
+def _clamp_int16(value):
+    return max(-32768, min(32767, int(value)))
+
+
+def _stats(count, mean, minimum, maximum, slope, start, end):
+    return {
+        'count': count,
+        'mean': round(mean, 3),
+        'min': minimum,
+        'max': maximum,
+        'slope': round(slope, 5) if slope is not None else None,
+        'start': datetime.fromtimestamp(start).isoformat(),
+        'end': datetime.fromtimestamp(end).isoformat()
+    }
+
+
+def _empty_stats():
+    return {'count': 0, 'mean': None, 'min': None, 'max': None, 'slope': None, 'start': None, 'end': None}
@@ -0,0 +1,10 @@
+"""
+Backend_camara/tests/conftest.py
+
+Los módulos del backend se importan sin paquete (como en openmv_server.py).
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,77 @@
+"""
+Backend_camara/tests/test_alerts.py
+
+Reglas de alerta con histéresis, debounce y velocidad (openmv_alerts.py).
+"""
+
+import json
+
+import pytest
+
+from openmv_alerts import AlertEngine, build_rules, load_rule_config, rules_for
+
+
+def fired(engine, percentage, timestamp, detected=True):
+    return [rule.id for rule, _ in engine.evaluate(percentage, detected, timestamp)]
+
+
+def test_threshold_fires_once_and_rearms_outside_hysteresis():
+    engine = AlertEngine([{'id': 'lleno', 'min': 100, 'hysteresis': 3}])
+
+    assert fired(engine, 100, 0) == ['lleno']
+    # Oscilar cerca del umbral no repite la alerta
+    assert fired(engine, 98, 1) == []
+    assert fired(engine, 100, 2) == []
+    # Se rearma solo al salir de [97, ...]
+    assert fired(engine, 96, 3) == []
+    assert fired(engine, 100, 4) == ['lleno']
+
+
+def test_hold_requires_the_condition_to_persist():
+    engine = AlertEngine([{'id': 'sin_deteccion', 'type': 'no_detection', 'for': 2.0}])
+
+    assert fired(engine, 0, 0.0, detected=False) == []
+    assert fired(engine, 0, 1.5, detected=False) == []
+    # Una detección reinicia la espera
+    assert fired(engine, 50, 1.8) == []
+    assert fired(engine, 0, 2.0, detected=False) == []
+    assert fired(engine, 0, 3.9, detected=False) == []
+    assert fired(engine, 0, 4.0, detected=False) == ['sin_deteccion']
+
+
+def test_rate_rule_uses_the_sliding_window():
+    engine = AlertEngine([{'id': 'rapido', 'type': 'rate', 'window': 60, 'min': 30}])
+
+    # Nada antes de media ventana de datos
+    results = [fired(engine, 10 + t, t) for t in range(0, 30, 5)]
+    assert results == [[]] * 6
+    # 1 %/s = 60 %/min desde el inicio de la ventana
+    rule, value = engine.evaluate(40, True, 30)[0]
+    assert rule.id == 'rapido' and value == pytest.approx(60.0)
+
+    engine.reset()
+    # Llenado lento: 0.25 %/s = 15 %/min
+    assert all(not engine.evaluate(10 + t / 4, True, t) for t in range(0, 120, 5))
+
+
+def test_shipped_rules_and_per_device_overrides(tmp_path):
+    path = tmp_path / 'reglas.json'
+    path.write_text(json.dumps({'devices': {'cam2': [{'id': 'alto', 'min': 90}]}}))
+
+    config = load_rule_config(str(path))
+    assert [rule['id'] for rule in rules_for(config, 'cam1')] == ['25%', '100%', 'no_detection', 'llenado_rapido']
+    assert [rule['id'] for rule in rules_for(config, 'cam2')] == ['alto']
+
+    engine = AlertEngine()
+    rule, value = engine.evaluate(25, True, 0)[0]
+    assert rule.format(25, value) == 'Nivel de llenado al 25% - 25%'
+
+
+def test_invalid_rules_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        build_rules([{'id': 'x', 'type': 'desconocida'}])
+
+    path = tmp_path / 'reglas.json'
+    path.write_text(json.dumps({'default': [{'min': 10}]}))
+    with pytest.raises(ValueError):
+        load_rule_config(str(path))
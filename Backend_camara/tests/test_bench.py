@@ -0,0 +1,35 @@
+"""
+Backend_camara/tests/test_bench.py
+
+Prueba rápida de los microbenchmarks de ingestión (bench_ingestion.py).
+"""
+
+import bench_ingestion
+from bench_ingestion import SCENARIOS, collect_frames, make_stream, print_results, run
+
+
+def test_synthetic_stream_is_deterministic():
+    first = make_stream(30, 3, 0.2, 4)
+    assert first == make_stream(30, 3, 0.2, 4)
+    raw, lines, _ = first
+    # Las líneas malformadas no impiden armar los frames
+    assert len(collect_frames(lines)) >= 25
+    assert raw.count(b'\n') == len(lines)
+
+
+def test_every_scenario_and_stage_is_measured():
+    results = run(frames=20, repeat=1)
+    for scenario in SCENARIOS:
+        for stage in ('split', 'parse', 'alertas', 'binario', 'json', 'delta_json'):
+            row = results[f"{scenario}/{stage}"]
+            assert row['us_frame'] > 0 and row['frames_s'] > 0
+
+
+def test_slower_stage_is_reported_as_regression(capsys):
+    results = {'simple/parse': {'ns_linea': 100.0, 'us_frame': 2.0, 'frames_s': 500000, 'pico_kib': 1.0},
+               'simple/json': {'ns_linea': 100.0, 'us_frame': 1.0, 'frames_s': 1000000, 'pico_kib': 1.0}}
+    baseline = {'frames': 20, 'machine': bench_ingestion.machine_info(),
+                'results': {'simple/parse': {'us_frame': 1.0}, 'simple/json': {'us_frame': 1.0}}}
+
+    assert print_results(results, baseline, 0.15, 20) == ['simple/parse']
+    assert 'REGRESION' in capsys.readouterr().out
@@ -0,0 +1,170 @@
+"""
+Backend_camara/tests/test_broadcast.py
+
+Difusión a clientes websocket con colas por cliente (openmv_broadcast.py).
+"""
+
+import asyncio
+
+import openmv_broadcast
+from openmv_broadcast import Broadcaster, ClientChannel
+from openmv_encoding import decode_preview, encode_preview
+
+
+class FakeWebsocket:
+    """Cliente que guarda lo enviado; ``blocked`` simula un cliente lento"""
+
+    def __init__(self, blocked=False):
+        self.sent = []
+        self.release = asyncio.Event()
+        if not blocked:
+            self.release.set()
+
+    async def send(self, message):
+        await self.release.wait()
+        self.sent.append(message)
+
+
+def test_payload_encoded_once_for_all_clients(monkeypatch):
+    calls = []
+    encode = openmv_broadcast.encode
+    monkeypatch.setattr(openmv_broadcast, 'encode', lambda payload, *args: calls.append(1) or encode(payload, *args))
+
+    async def run():
+        broadcaster = Broadcaster()
+        websockets = [FakeWebsocket() for _ in range(50)]
+        for websocket in websockets:
+            broadcaster.add(websocket)
+        assert broadcaster.publish('status', {'type': 'status', 'message': 'ok'}) == 50
+        await asyncio.sleep(0.01)
+        for websocket in websockets:
+            broadcaster.remove(websocket)
+        return websockets
+
+    websockets = asyncio.run(run())
+    assert len(calls) == 1
+    # Todos reciben el mismo objeto ya codificado
+    assert len({id(websocket.sent[0]) for websocket in websockets}) == 1
+
+
+def test_slow_client_drops_oldest_tank_data_but_keeps_alerts():
+    channel = ClientChannel(FakeWebsocket(blocked=True), maxsize=4)
+    channel.push('alert', 'a1')
+    for index in range(10):
+        channel.push('tank_data', f't{index}', 'cam1')
+
+    messages = [message for _, message, _, _ in channel.queue]
+    assert messages == ['a1', 't7', 't8', 't9']
+    assert channel.dropped == {'tank_data': 7}
+
+
+def test_never_drop_messages_close_the_client_at_the_hard_limit():
+    async def run():
+        channel = ClientChannel(FakeWebsocket(blocked=True), maxsize=2, hard_limit=4)
+        results = [channel.push('alert', f'a{index}') for index in range(5)]
+        return channel, results
+
+    channel, results = asyncio.run(run())
+    # Las alertas pasan el límite blando y nunca se descartan...
+    assert results[:4] == [True] * 4
+    # ...pero un cliente que no consume se desconecta
+    assert results[4] is False
+    assert channel.closed and channel.close_reason
+
+
+def test_tank_data_is_rejected_when_nothing_can_be_dropped():
+    channel = ClientChannel(FakeWebsocket(blocked=True), maxsize=2)
+    channel.push('alert', 'a1')
+    channel.push('status', 's1')
+    assert channel.push('tank_data', 't1', 'cam1') is False
+    assert channel.dropped == {'tank_data': 1}
+    assert not channel.closed
+
+
+def test_writer_sends_in_order():
+    async def run():
+        websocket = FakeWebsocket()
+        channel = ClientChannel(websocket)
+        channel.start()
+        for message in ('a', 'b', 'c'):
+            channel.push('status', message)
+        await asyncio.sleep(0.01)
+        channel.stop()
+        return websocket, channel
+
+    websocket, channel = asyncio.run(run())
+    assert websocket.sent == ['a', 'b', 'c']
+    assert channel.sent == 3
+
+
+def test_subscription_filters_types_and_devices():
+    broadcaster = Broadcaster()
+    everything = ClientChannel(FakeWebsocket(blocked=True))
+    cam2_alerts = ClientChannel(FakeWebsocket(blocked=True))
+    cam2_alerts.subscribe(types=['alert'], devices=['cam2'])
+    broadcaster.channels = {'all': everything, 'cam2': cam2_alerts}
+
+    broadcaster.publish_encoded('tank_data', 't1', 'cam1')
+    broadcaster.publish_encoded('alert', 'a1', 'cam1')
+    broadcaster.publish_encoded('tank_data', 't2', 'cam2')
+    broadcaster.publish_encoded('alert', 'a2', 'cam2')
+
+    assert [message for _, message, _, _ in everything.queue] == ['t1', 'a1', 't2', 'a2']
+    assert [message for _, message, _, _ in cam2_alerts.queue] == ['a2']
+    assert not cam2_alerts.wants_preview('cam2')
+
+
+def test_max_rate_conflates_to_the_latest_value():
+    async def run():
+        channel = ClientChannel(FakeWebsocket(blocked=True))
+        channel.subscribe(max_rate=20)
+        for index in range(5):
+            channel.offer('tank_data', f't{index}', 'cam1')
+        # Otra cámara tiene su propio intervalo
+        channel.offer('tank_data', 'u0', 'cam2')
+        first = [message for _, message, _, _ in channel.queue]
+        await asyncio.sleep(0.08)
+        return channel, first
+
+    channel, first = asyncio.run(run())
+    assert first == ['t0', 'u0']
+    assert [message for _, message, _, _ in channel.queue] == ['t0', 'u0', 't4']
+    assert channel.conflated == 3
+    assert not channel.has_pending('cam1')
+
+
+def test_previews_only_reach_explicit_subscribers():
+    broadcaster = Broadcaster()
+    telemetry = ClientChannel(FakeWebsocket(blocked=True))
+    viewer = ClientChannel(FakeWebsocket(blocked=True))
+    viewer.subscribe(types=['tank_data', 'preview'], devices=['cam1'])
+    broadcaster.channels = {'telemetry': telemetry, 'viewer': viewer}
+
+    message = encode_preview('cam1', 9, 1714557600.5, b'\xff\xd8jpeg\xff\xd9')
+    assert decode_preview(message) == ('cam1', 9, 1714557600.5, b'\xff\xd8jpeg\xff\xd9')
+    assert broadcaster.publish_preview('cam1', message) == 1
+    assert broadcaster.publish_preview('cam2', message) == 0
+    assert viewer.previews['cam1'] is message
+    assert not telemetry.previews
+
+
+def test_slow_viewer_skips_to_the_latest_preview_after_telemetry():
+    async def run():
+        websocket = FakeWebsocket(blocked=True)
+        channel = ClientChannel(websocket)
+        channel.subscribe(types=['tank_data', 'preview'])
+        channel.start()
+        channel.push('tank_data', 't1', 'cam1')
+        for seq in range(3):
+            channel.offer_preview('cam1', encode_preview('cam1', seq, 0.0, b'jpeg'))
+        channel.push('tank_data', 't2', 'cam1')
+        websocket.release.set()
+        await asyncio.sleep(0.01)
+        channel.stop()
+        return websocket, channel
+
+    websocket, channel = asyncio.run(run())
+    # La telemetría encolada sale antes que la imagen, y solo la última imagen
+    assert websocket.sent[:2] == ['t1', 't2']
+    assert [decode_preview(message)[1] for message in websocket.sent[2:]] == [2]
+    assert (channel.previews_sent, channel.previews_skipped) == (1, 2)
@@ -0,0 +1,90 @@
+"""
+Backend_camara/tests/test_compression.py
+
+Banda muerta y swinging door sobre las muestras de nivel (openmv_compression.py).
+"""
+
+import random
+from bisect import bisect_right
+
+from openmv_compression import SampleFilter, SwingingDoor
+from openmv_frames import Frame
+
+
+def walk(count, seed=7, step=0.2):
+    """Nivel con ruido y tramos planos, una muestra cada ``step`` segundos"""
+    rng = random.Random(seed)
+    level = 50.0
+    frames = []
+    for index in range(count):
+        if rng.random() < 0.7:
+            level = min(100.0, max(0.0, level + rng.uniform(-1.5, 1.5)))
+        frames.append(Frame(f'nivel_{int(level)}', round(level, 2), [], 10.0, 1000.0 + index * step))
+    return frames
+
+
+def interpolate(points, t):
+    times = [p[0] for p in points]
+    index = bisect_right(times, t)
+    if index == 0 or times[index - 1] == t:
+        return points[max(0, index - 1)][1]
+    (t0, v0), (t1, v1) = points[index - 1], points[index]
+    return v0 + (v1 - v0) * (t - t0) / (t1 - t0)
+
+
+def test_swinging_door_stays_within_deviation():
+    frames = walk(2000)
+    for deviation in (0.5, 1.0, 3.0):
+        door = SwingingDoor(deviation)
+        kept = []
+        for frame in frames:
+            kept += door.add(frame.timestamp, frame.percentage, frame)
+        kept.append(door.flush())
+
+        points = [(frame.timestamp, frame.percentage) for frame in kept]
+        assert len(points) < len(frames) / 2
+        assert points[0] == (frames[0].timestamp, frames[0].percentage)
+        for frame in frames:
+            assert abs(interpolate(points, frame.timestamp) - frame.percentage) <= deviation + 1e-9
+
+
+def test_deadband_bounds_the_displayed_level():
+    sample_filter = SampleFilter(deadband=2.0, deviation=1.0, heartbeat=3600)
+    shown = None
+    for frame in walk(2000):
+        publish, _ = sample_filter.update(frame)
+        if publish:
+            shown = frame.percentage
+        assert abs(shown - frame.percentage) < 2.0
+    assert sample_filter.published < sample_filter.received / 2
+
+
+def test_heartbeat_publishes_and_archives_a_flat_level():
+    sample_filter = SampleFilter(deadband=1.0, deviation=1.0, heartbeat=30.0)
+    results = [sample_filter.update(Frame('nivel_40', 40, [], 10.0, float(t))) for t in range(0, 100)]
+
+    assert [t for t, (publish, _) in enumerate(results) if publish] == [0, 30, 60, 90]
+    archived = [frame.timestamp for _, archive in results for frame in archive]
+    assert archived == [0.0, 29.0, 30.0, 59.0, 60.0, 89.0, 90.0]
+
+
+def test_detection_change_and_forced_frames_always_pass():
+    sample_filter = SampleFilter(deadband=5.0, deviation=5.0, heartbeat=3600)
+    first = Frame('nivel_40', 40, [], 10.0, 0.0)
+    assert sample_filter.update(first) == (True, [first])
+    assert sample_filter.update(Frame('nivel_41', 41, [], 10.0, 1.0)) == (False, [])
+
+    lost = Frame(None, None, [], 10.0, 2.0)
+    assert sample_filter.update(lost) == (True, [])
+
+    # Con una alerta se difunde y se guarda aunque el nivel no cambie
+    alert = Frame('nivel_41', 41, [], 10.0, 3.0)
+    publish, archive = sample_filter.update(alert, force=True)
+    assert publish and archive[-1] is alert
+
+
+def test_disabled_filter_passes_everything():
+    sample_filter = SampleFilter(deadband=0, deviation=0)
+    frames = walk(50)
+    assert all(sample_filter.update(frame) == (True, [frame]) for frame in frames)
+    assert sample_filter.stats()['archived'] == 50
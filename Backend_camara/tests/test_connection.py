@@ -0,0 +1,77 @@
+"""
+Backend_camara/tests/test_connection.py
+
+Supervisor de reconexión (openmv_connection.py).
+"""
+
+import asyncio
+
+from openmv_connection import ConnectionManager
+
+
+class FakeDevice:
+    device_id = 'cam1'
+    reconnectable = True
+
+    def __init__(self):
+        self.port = '/dev/ttyACM0'
+        self.is_connected = False
+        self.is_monitoring = False
+        self.on_state = None
+        self.states = []
+
+    def set_state(self, state, **info):
+        self.states.append(state)
+
+    def open(self):
+        self.is_connected = True
+        return True
+
+
+class FakeDevices(list):
+    discover_ports = False
+
+    def __init__(self, device, failures):
+        super().__init__([device])
+        self.failures = failures
+        self.scans = 0
+        self.started = []
+
+    def claimed_ports(self):
+        return set()
+
+    def scan_ports(self, exclude=()):
+        self.scans += 1
+        if self.scans <= self.failures:
+            raise OSError("fallo enumerando puertos")
+        return ['/dev/ttyACM0']
+
+    def locate(self, device, ports):
+        return ports[0]
+
+    def start_device(self, device):
+        device.is_monitoring = True
+        self.started.append(device.device_id)
+
+
+def test_scan_error_retries_with_backoff():
+    device = FakeDevice()
+    devices = FakeDevices(device, failures=2)
+
+    async def run():
+        manager = ConnectionManager(devices, base_delay=0.01, max_delay=0.02, scan_interval=0)
+        manager.start()
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if devices.started:
+                break
+        task = manager._tasks['cam1']
+        manager.stop()
+        return task
+
+    task = asyncio.run(run())
+    assert devices.started == ['cam1']
+    assert devices.scans == 3
+    assert device.states.count('reconnecting') == 2
+    # El supervisor siguió vivo hasta que se detuvo (no murió por la excepción)
+    assert task.cancelled()
@@ -0,0 +1,122 @@
+"""
+Backend_camara/tests/test_devices.py
+
+Estado por cámara (openmv_devices.py).
+"""
+
+import asyncio
+import time
+
+from openmv_devices import CameraDevice, DeviceManager
+from openmv_frames import Detection, Frame
+
+
+def frame(percentage, timestamp):
+    label = f"nivel_{percentage}"
+    return Frame(label, percentage, (Detection(label, 10, 20, 0.9),), 10.0, timestamp)
+
+
+def test_history_version_changes_only_with_new_samples():
+    device = CameraDevice('cam1', None)
+    device.add_history([frame(50, 1000.0)])
+    assert device.history_seq == 1
+
+    # La compresión no archivó nada: misma versión (caché y ETag intactos)
+    device.add_history([])
+    assert device.history_seq == 1
+    assert len(device.history) == 1
+
+
+def test_compressed_frames_keep_history_version():
+    device = CameraDevice('cam1', None)
+    # Nivel constante: después del primero la compresión no archiva muestras
+    versions = []
+    for index in range(20):
+        device.handle_frame(frame(50, 1000.0 + index * 0.1))
+        versions.append(device.history_seq)
+    assert versions[-1] == len(device.history)
+    assert versions[-1] < 20
+
+
+def test_connect_all_scans_ports_off_the_event_loop():
+    manager = DeviceManager()
+
+    def slow_scan(exclude=(), verbose=False):
+        # Enumeración con handshake de PROBE_TIMEOUT
+        time.sleep(0.3)
+        return []
+    manager.scan_ports = slow_scan
+
+    async def run():
+        manager.loop = asyncio.get_running_loop()
+        ticks = []
+
+        async def ticker():
+            while True:
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        task = asyncio.ensure_future(ticker())
+        await asyncio.sleep(0)
+        connected = await manager.connect_all()
+        task.cancel()
+        return connected, ticks
+
+    connected, ticks = asyncio.run(run())
+    assert connected == []
+    # El loop siguió atendiendo mientras se enumeraban los puertos
+    assert len(ticks) > 10
+    assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.2
+
+
+class OpenPort:
+    is_open = True
+    in_waiting = 0
+
+    def close(self):
+        self.is_open = False
+
+
+def test_connect_all_opens_cameras_in_parallel():
+    manager = DeviceManager()
+    manager.discover_ports = False
+    devices = [manager.add(f'cam{index}', f'/dev/ttyACM{index}') for index in range(3)]
+
+    def slow_open(device):
+        def open_port():
+            # Abrir el puerto espera la estabilización de la cámara
+            time.sleep(0.3)
+            device.serial_connection = OpenPort()
+            return True
+        return open_port
+    for device in devices:
+        device.open = slow_open(device)
+
+    async def run():
+        manager.loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        connected = await manager.connect_all()
+        return connected, time.monotonic() - started
+
+    connected, elapsed = asyncio.run(run())
+    assert [device.device_id for device in connected] == ['cam0', 'cam1', 'cam2']
+    assert elapsed < 0.6
+
+
+def test_each_camera_has_its_own_pipeline():
+    received = []
+    manager = DeviceManager(on_frame=lambda device, frame, *args: received.append((device.device_id, frame.percentage)))
+    cam1 = manager.add('cam1', '/dev/ttyACM0')
+    cam2 = manager.add('cam2', '/dev/ttyACM1')
+    for device in (cam1, cam2):
+        device.is_monitoring = True
+
+    # Bloques intercalados de dos cámaras, cortados en medio de una línea
+    cam1.on_serial_chunk(b'********** nivel_25 **********\nx 1\ty 2\tsco')
+    cam2.on_serial_chunk(b'********** nivel_75 **********\nx 3\ty 4\tscore 0.8\nFPS: 2\n\n')
+    cam1.on_serial_chunk(b're 0.9\nFPS: 2\n\n')
+
+    assert received == [('cam2', 75), ('cam1', 25)]
+    assert cam1.latest_data['percentage'] == 25 and cam2.latest_data['percentage'] == 75
+    assert len(cam1.history) == len(cam2.history) == 1
+    assert manager.get('cam2') is cam2 and manager.get() is cam1
@@ -0,0 +1,77 @@
+"""
+Backend_camara/tests/test_encoding.py
+
+Codificación por cliente y actualizaciones delta (openmv_encoding.py).
+"""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from openmv_broadcast import Broadcaster, ClientChannel
+from openmv_encoding import (
+    EncodedCache, client_options, compute_delta, decode, encode, normalize_encoding
+)
+
+
+def test_client_options_from_url():
+    websocket = SimpleNamespace(request=SimpleNamespace(path='/?encoding=MsgPack&delta=true&resume=41&stream=abc'))
+    assert client_options(websocket) == {'encoding': 'MsgPack', 'delta': True, 'resume': 41, 'stream': 'abc'}
+
+    defaults = client_options(SimpleNamespace(request=SimpleNamespace(path='/?resume=x')))
+    assert defaults == {'encoding': 'json', 'delta': False, 'resume': None, 'stream': None}
+
+
+def test_unknown_encoding_is_rejected():
+    assert normalize_encoding(None) == 'json'
+    assert normalize_encoding('xml') is None
+
+
+def test_msgpack_round_trip():
+    pytest.importorskip('msgpack')
+    assert normalize_encoding('MSGPACK') == 'msgpack'
+    payload = {'type': 'tank_data', 'seq': 3, 'data': {'percentage': 50, 'fps': 12.5}}
+    message = encode(payload, 'msgpack')
+    assert isinstance(message, bytes)
+    assert decode(message) == payload
+    assert len(message) < len(encode(payload))
+
+
+def test_compute_delta_only_changed_fields():
+    previous = {'percentage': 50, 'fps': 12.5, 'label': 'nivel_50'}
+    current = {'percentage': 75, 'fps': 12.5, 'label': 'nivel_75'}
+    assert compute_delta(previous, current) == {'percentage': 75, 'label': 'nivel_75'}
+    assert compute_delta(None, current) == current
+    assert compute_delta(current, current) == {}
+
+
+def test_encoded_cache_rebuilds_only_on_new_version():
+    cache = EncodedCache()
+    builds = []
+
+    def build():
+        builds.append(1)
+        return {'type': 'tank_data', 'seq': len(builds)}
+
+    first = cache.get('cam1', 7, 'json', build)
+    assert cache.get('cam1', 7, 'json', build) is first
+    assert json.loads(cache.get('cam1', 8, 'json', build))['seq'] == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_delta_and_full_clients_get_their_variant():
+    broadcaster = Broadcaster()
+    full = ClientChannel(object())
+    delta = ClientChannel(object())
+    delta.delta = True
+    broadcaster.channels = {'full': full, 'delta': delta}
+
+    payload = {'type': 'tank_data', 'device_id': 'cam1', 'seq': 2, 'data': {'percentage': 60, 'fps': 2.0}}
+    delta_payload = {'type': 'tank_delta', 'device_id': 'cam1', 'seq': 2, 'base': 1, 'data': {'percentage': 60}}
+    broadcaster.publish('tank_data', payload, 'cam1', delta_payload=delta_payload)
+
+    assert json.loads(full.queue[0][1])['type'] == 'tank_data'
+    sent = json.loads(delta.queue[0][1])
+    assert (sent['type'], sent['base'], sent['data']) == ('tank_delta', 1, {'percentage': 60})
+    assert sent['stream_seq'] == json.loads(full.queue[0][1])['stream_seq'] == 1
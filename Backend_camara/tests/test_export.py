@@ -0,0 +1,89 @@
+"""
+Backend_camara/tests/test_export.py
+
+Exportación a CSV (openmv_export.py), también desde una base sin migrar.
+"""
+
+import csv
+import sqlite3
+
+import pytest
+
+from openmv_export import TABLES, export_table, main
+from openmv_storage import SCHEMA, ensure_schema
+
+
+def baseline_db(path):
+    """Base con el esquema original, anterior a multi-cámara"""
+    conn = sqlite3.connect(path)
+    for statement in SCHEMA:
+        conn.execute(statement)
+    conn.executemany(
+        'INSERT INTO readings (percentage, label, fps, detection_x, detection_y, detection_score, timestamp) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?)',
+        [(25, 'nivel_25', 2.0, 10, 20, 0.9, '2024-05-01 10:00:00'),
+         (50, 'nivel_50', 2.0, None, None, None, '2024-05-01 10:00:01')]
+    )
+    conn.execute(
+        "INSERT INTO alerts (level, message, percentage, timestamp) "
+        "VALUES ('warning', 'Nivel bajo', 25, '2024-05-01 10:00:00')"
+    )
+    conn.commit()
+    conn.close()
+
+
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8') as stream:
+        return list(csv.reader(stream))
+
+
+def test_baseline_schema_exports_with_empty_columns(tmp_path):
+    db_path = str(tmp_path / 'original.db')
+    baseline_db(db_path)
+
+    readings = str(tmp_path / 'readings.csv')
+    assert export_table(db_path, 'readings', readings) == 2
+    rows = read_csv(readings)
+    assert rows[0] == [name for name, _ in TABLES['readings']]
+    header = rows[0]
+    first = dict(zip(header, rows[1]))
+    assert first['percentage'] == '25' and first['timestamp'] == '2024-05-01 10:00:00'
+    assert first['device_id'] == '' and first['detection_count'] == ''
+
+    alerts = str(tmp_path / 'alerts.csv')
+    assert export_table(db_path, 'alerts', alerts) == 1
+
+    # Las filas sin columna device_id no pertenecen a ninguna cámara con nombre
+    assert export_table(db_path, 'readings', readings, devices=['cam1']) == 0
+
+    # La exportación abre en solo lectura: la base sigue sin migrar
+    conn = sqlite3.connect(db_path)
+    assert 'device_id' not in {row[1] for row in conn.execute('PRAGMA table_info(readings)')}
+    conn.close()
+
+
+def test_migrated_schema_filters_by_device(tmp_path):
+    db_path = str(tmp_path / 'migrada.db')
+    baseline_db(db_path)
+    conn = sqlite3.connect(db_path)
+    ensure_schema(conn)
+    conn.execute(
+        "INSERT INTO readings (device_id, percentage, detection_count, timestamp) "
+        "VALUES ('cam1', 75, 3, '2024-05-01 10:00:02')"
+    )
+    conn.commit()
+    conn.close()
+
+    path = str(tmp_path / 'readings.csv')
+    assert export_table(db_path, 'readings', path, devices=['cam1']) == 1
+    assert export_table(db_path, 'readings', path, devices=[None]) == 2
+    assert export_table(db_path, 'readings', path) == 3
+
+
+def test_cli_on_baseline_schema(tmp_path, capsys):
+    db_path = str(tmp_path / 'original.db')
+    baseline_db(db_path)
+    main(['--db', db_path, '--output', str(tmp_path / 'salida'), '--start', '2024-05-01', '--end', '2024-05-02'])
+
+    assert 'readings: 2 filas' in capsys.readouterr().err
+    assert len(read_csv(tmp_path / 'salida' / 'alerts.csv')) == 2
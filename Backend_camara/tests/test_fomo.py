@@ -0,0 +1,125 @@
+"""
+Backend_camara/tests/test_fomo.py
+
+Post-procesamiento FOMO en el host (openmv_fomo.py) contra tensores fijos
+cuyas detecciones se calcularon a mano con las reglas de find_blobs de la
+cámara (umbral ceil(0.7 * 255) = 179, grilla 3x3, al menos 3 píxeles y
+área 3).
+"""
+
+import struct
+
+import pytest
+
+from openmv_fomo import FomoPostProcessor
+from openmv_protocol import BinaryFrameDecoder, FomoTensor, encode_tensor
+
+
+def make_tensor(seq, shape, roi, pixels):
+    """Tensor alto x ancho x clases en cero con ``pixels`` {(x, y, clase): valor}"""
+    height, width, classes = shape
+    data = bytearray(height * width * classes)
+    for (x, y, class_index), value in pixels.items():
+        data[(y * width + x) * classes + class_index] = value
+    return FomoTensor(seq, 10.0, shape, roi, bytes(data))
+
+
+def square(x0, y0, w, h, class_index, value):
+    return {(x, y, class_index): value for x in range(x0, x0 + w) for y in range(y0, y0 + h)}
+
+
+# 12x12, roi 240x240: escala 20 sin desplazamiento
+SQUARE = make_tensor(1, (12, 12, 2), (0, 0, 240, 240), {
+    # Fondo (clase 0) sobre el umbral: se ignora
+    **square(0, 0, 12, 1, 0, 250),
+    # Blob con semilla (3, 3): rect (3, 3, 3, 3) -> (60, 60, 60, 60), centro (90, 90)
+    **square(3, 3, 3, 3, 1, 200),
+    # 4 píxeles sin ningún punto de la grilla: find_blobs no lo encuentra
+    **square(7, 1, 2, 2, 1, 230),
+    # Semilla (0, 9) pero solo 2 píxeles
+    **square(0, 9, 2, 1, 1, 240),
+    # L de 3 píxeles en (9, 9): rect 2x2, media entera (255 + 180 + 181) // 3 = 205;
+    # (10, 10) está debajo del umbral y no entra en la media
+    (9, 9, 1): 255, (10, 9, 1): 180, (9, 10, 1): 181, (10, 10, 1): 100,
+})
+SQUARE_DETECTIONS = [
+    (1, 90, 90, 60, 60, 200 / 255.0),
+    (1, 200, 200, 40, 40, 205 / 255.0),
+]
+
+# 15x20, roi (10, 5, 320, 240): escala 16, x_offset 10, y_offset -35 (la
+# cámara calcula y_offset con el ancho de la salida)
+WIDE = make_tensor(2, (15, 20, 3), (10, 5, 320, 240), {
+    # Clase 1: fila de 3 píxeles desde la semilla (0, 0); 178 queda afuera (umbral 179)
+    (0, 0, 1): 179, (1, 0, 1): 255, (2, 0, 1): 200, (3, 0, 1): 178,
+    # Clase 2: rect (12, 6, 3, 2) -> x 202, y 61, w 48, h 32
+    **square(12, 6, 3, 2, 2, 190),
+})
+WIDE_DETECTIONS = [
+    (1, 34, -27, 48, 16, 211 / 255.0),
+    (2, 226, 77, 48, 32, 190 / 255.0),
+]
+
+EMPTY = make_tensor(3, (12, 12, 2), (0, 0, 240, 240), {(3, 3, 1): 178})
+
+
+def as_tuples(results):
+    return [[tuple(detection) for detection in detections] for detections in results]
+
+
+def test_scalar_matches_hand_computed_blobs():
+    processor = FomoPostProcessor(0.7)
+    assert processor.process_scalar(SQUARE) == SQUARE_DETECTIONS
+    assert processor.process_scalar(WIDE) == WIDE_DETECTIONS
+    assert processor.process_scalar(EMPTY) == []
+
+
+def test_numpy_matches_hand_computed_blobs():
+    pytest.importorskip('numpy')
+    processor = FomoPostProcessor(0.7, scalar_batch=1)
+    for tensor, expected in ((SQUARE, SQUARE_DETECTIONS), (WIDE, WIDE_DETECTIONS), (EMPTY, [])):
+        assert as_tuples(processor.process([tensor])) == [expected]
+
+
+def test_numpy_batch_of_mixed_shapes_keeps_order():
+    pytest.importorskip('numpy')
+    processor = FomoPostProcessor(0.7)
+    tensors = [SQUARE, WIDE, EMPTY] * processor.scalar_batch
+    expected = [SQUARE_DETECTIONS, WIDE_DETECTIONS, []] * processor.scalar_batch
+    assert as_tuples(processor.process(tensors)) == expected
+
+
+def test_small_batches_use_the_scalar_port():
+    processor = FomoPostProcessor(0.7)
+    calls = []
+    scalar = processor.process_scalar
+    processor.process_scalar = lambda tensor: calls.append(tensor.seq) or scalar(tensor)
+
+    assert as_tuples(processor.process([SQUARE, WIDE])) == [SQUARE_DETECTIONS, WIDE_DETECTIONS]
+    assert calls == [1, 2]
+
+
+def test_tensor_record_round_trip():
+    tensors = []
+    decoder = BinaryFrameDecoder(on_tensor=tensors.append)
+    decoder.feed(encode_tensor(WIDE.seq, WIDE.fps, WIDE.shape, WIDE.roi, WIDE.data))
+
+    assert len(tensors) == 1
+    assert tensors[0].shape == WIDE.shape and tensors[0].roi == WIDE.roi
+    assert FomoPostProcessor(0.7).process(tensors) == [WIDE_DETECTIONS]
+
+
+def test_camera_send_tensor_matches_host_encoder():
+    np = pytest.importorskip('numpy')
+    from test_protocol import camera_functions
+
+    written = []
+    send_tensor = camera_functions(
+        'send_tensor', 'send_record', 'crc16', 'cobs_encode',
+        struct=struct, np=np, _usb_out=type('Usb', (), {'write': staticmethod(written.append)})
+    )[0]
+    heatmap = np.frombuffer(WIDE.data, dtype=np.uint8).reshape(WIDE.shape) / 255.0
+    # 12.347 fps: int() truncaría a 1234, el host redondea a 1235
+    send_tensor(WIDE.seq, 12.347, heatmap, WIDE.roi)
+
+    assert b''.join(written) == encode_tensor(WIDE.seq, 12.347, WIDE.shape, WIDE.roi, WIDE.data)
@@ -0,0 +1,73 @@
+"""
+Backend_camara/tests/test_frames.py
+
+Armado de frames a partir de la salida de texto de la cámara (openmv_frames.py).
+"""
+
+from openmv_frames import FrameAssembler, parse_percentage
+
+
+def feed_lines(assembler, text):
+    frames = []
+    for line in text.split('\n'):
+        frame = assembler.feed(line)
+        if frame is not None:
+            frames.append(frame)
+    return frames
+
+
+CAPTURE = (
+    "********** nivel_25 **********\n"
+    "x 100\ty 40\tscore 0.750\n"
+    "********** nivel_50 **********\n"
+    "x 120\ty 80\tscore 0.902\n"
+    "x 60\ty 90\tscore 0.700\n"
+    "FPS: 12.50\n"
+    "\n"
+)
+
+
+def test_one_frame_per_capture():
+    frames = feed_lines(FrameAssembler(), CAPTURE + CAPTURE)
+
+    assert len(frames) == 2
+    frame = frames[0]
+    # La etiqueta y el nivel salen de la detección con mayor score
+    assert frame.label == 'nivel_50' and frame.percentage == 50
+    assert frame.fps == 12.5
+    assert [(d.label, d.x, d.y) for d in frame.detections] == [
+        ('nivel_25', 100, 40), ('nivel_50', 120, 80), ('nivel_50', 60, 90)
+    ]
+    assert frame.best_detection.score == 0.902
+
+
+def test_capture_without_detections():
+    frames = feed_lines(FrameAssembler(), "FPS: 2.00\n[Sin detecciones]\n\n")
+    assert len(frames) == 1
+    assert frames[0].detections == () and frames[0].percentage is None
+    assert frames[0].fps == 2.0
+
+
+def test_missing_blank_line_closes_frame_at_next_header():
+    text = CAPTURE.rstrip('\n') + "\n" + CAPTURE
+    frames = feed_lines(FrameAssembler(), text)
+    assert len(frames) == 2
+    assert all(len(frame.detections) == 3 for frame in frames)
+
+
+def test_malformed_lines_are_counted():
+    assembler = FrameAssembler()
+    frames = feed_lines(assembler, "********** nivel_75 **********\nx abc\ty 1\tscore 0.9\nx 1\nFPS: rapido\nFPS: 3\n\n")
+    assert assembler.parse_errors == 3
+    assert len(frames) == 1 and frames[0].detections == ()
+
+
+def test_blank_lines_between_frames_are_ignored():
+    assert feed_lines(FrameAssembler(), "\n\n\n") == []
+
+
+def test_parse_percentage():
+    assert parse_percentage('nivel_25') == 25
+    assert parse_percentage('nivel_x') is None
+    assert parse_percentage('background') is None
+    assert parse_percentage(None) is None
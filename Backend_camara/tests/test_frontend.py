@@ -0,0 +1,37 @@
+"""
+Backend_camara/tests/test_frontend.py
+
+Proceso websocket que sigue el buffer compartido (openmv_frontend.py).
+"""
+
+import pytest
+
+from openmv_frontend import FrontendServer
+from openmv_ring import RingWriter
+
+
+@pytest.fixture
+def frontend(tmp_path):
+    writer = RingWriter(slots=16, slot_size=256)
+    server = FrontendServer(writer.name, db_path=str(tmp_path / 'vacia.db'))
+    yield writer, server
+    server.ring_reader.close()
+    writer.close()
+
+
+def test_history_comes_from_the_ring_sample(frontend, monkeypatch):
+    writer, server = frontend
+    writer.publish('tank_data', b'{"type": "tank_data"}', 'cam1', stream_seq=4,
+                   sample=(1700000000.0, 75, 10.0, 30, 40, 0.8, 2))
+    writer.publish('alert', b'{"type": "alert", "data": {"rule": "nivel_bajo"}}', stream_seq=5)
+
+    # El historial y el registro de alertas no parsean el JSON de cada mensaje
+    monkeypatch.setattr('openmv_frontend.json.loads', lambda text: pytest.fail('json.loads ' + text))
+    for _, stream_seq, kind, device_id, origin, message, sample in server.ring_reader.poll():
+        server.apply_entry(kind, device_id, origin, message.decode('utf-8'), stream_seq, sample)
+    monkeypatch.undo()
+
+    assert server.history_seqs == {'cam1': 4}
+    assert len(server.histories['cam1']) == 1
+    assert server.latest['cam1'] == (4, '{"type": "tank_data"}')
+    assert server.recent_alerts() == [{'rule': 'nivel_bajo'}]
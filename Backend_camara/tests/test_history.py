@@ -0,0 +1,112 @@
+"""
+Backend_camara/tests/test_history.py
+
+Consulta de historial por rango (get_history en openmv_server.py).
+"""
+
+import asyncio
+import sqlite3
+
+from openmv_history import history_chunks, lttb
+from openmv_server import OpenMVServer
+from openmv_storage import ensure_schema, to_db_time
+
+
+def request_history(tmp_path, request):
+    db_path = str(tmp_path / 'datos.db')
+    conn = sqlite3.connect(db_path)
+    ensure_schema(conn)
+    conn.executemany(
+        'INSERT INTO readings (device_id, percentage, timestamp) VALUES (?, ?, ?)',
+        [('cam1', 10 + index, to_db_time(index * 60.0)) for index in range(10)]
+    )
+    conn.commit()
+    conn.close()
+
+    server = OpenMVServer(db_path=db_path)
+    sent = []
+    server.send_to_client = lambda websocket, payload, kind='response': sent.append(payload)
+
+    async def run():
+        server.loop = asyncio.get_running_loop()
+        await server.stream_history(object(), {'device_id': 'cam1', **request})
+
+    asyncio.run(run())
+    return {message['type']: message for message in sent}
+
+
+def test_epoch_zero_is_an_explicit_start(tmp_path):
+    messages = request_history(tmp_path, {'start': 0, 'end': 600})
+    start = messages['history_start']
+    assert (start['start'], start['end']) == (0.0, 600.0)
+    assert start['total'] == 10
+    assert messages['history_end']['success']
+
+
+def test_epoch_zero_is_an_explicit_end(tmp_path):
+    messages = request_history(tmp_path, {'start': -600, 'end': 0})
+    start = messages['history_start']
+    assert (start['start'], start['end']) == (-600.0, 0.0)
+    assert start['total'] == 0
+
+
+def readings_db(tmp_path, values, step=1.0, offset=0.5):
+    db_path = str(tmp_path / 'serie.db')
+    conn = sqlite3.connect(db_path)
+    ensure_schema(conn)
+    conn.executemany(
+        'INSERT INTO readings (device_id, percentage, timestamp) VALUES (?, ?, ?)',
+        # A mitad de segundo: ninguna lectura cae justo en el borde de un bucket
+        [('cam1', value, to_db_time(offset + index * step)) for index, value in enumerate(values)]
+    )
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def collect(chunks):
+    summary = next(chunks)
+    return summary, [point for chunk in chunks for point in chunk]
+
+
+def test_small_range_returns_raw_points(tmp_path):
+    db_path = readings_db(tmp_path, range(20))
+    summary, points = collect(history_chunks(db_path, 'cam1', 0, 20, points=50))
+    assert summary == {'total': 20, 'points': 20, 'source': 'readings'}
+    assert [point['percentage'] for point in points] == list(range(20))
+
+
+def test_minmax_buckets_keep_extremes(tmp_path):
+    # 1000 lecturas en 1000 s con un pico de 1 s en medio
+    values = [50] * 1000
+    values[437] = 99
+    db_path = readings_db(tmp_path, values)
+    summary, points = collect(history_chunks(db_path, 'cam1', 0, 1000, points=100, chunk_size=30))
+
+    assert summary['total'] == 1000 and summary['source'] == 'readings'
+    assert len(points) == 100
+    assert all(point['count'] == 10 for point in points)
+    assert points[43] == {'timestamp': 430.0, 'min': 50, 'max': 99, 'avg': 54.9, 'count': 10}
+    assert max(point['max'] for point in points) == 99
+
+
+def test_chunks_respect_chunk_size(tmp_path):
+    db_path = readings_db(tmp_path, range(100))
+    chunks = history_chunks(db_path, 'cam1', 0, 100, points=100, chunk_size=30)
+    next(chunks)
+    assert [len(chunk) for chunk in chunks] == [30, 30, 30, 10]
+
+
+def test_lttb_keeps_endpoints_and_spike():
+    series = [(float(t), 50) for t in range(1000)]
+    series[600] = (600.0, 0)
+    sampled = list(lttb(iter(series), len(series), 50))
+    assert len(sampled) == 50
+    assert sampled[0] == series[0] and sampled[-1] == series[-1]
+    assert (600.0, 0) in sampled
+    assert [t for t, _ in sampled] == sorted(t for t, _ in sampled)
+
+
+def test_lttb_passes_through_short_series():
+    series = [(0.0, 1), (1.0, 2)]
+    assert list(lttb(iter(series), 2, 10)) == series
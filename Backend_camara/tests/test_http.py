@@ -0,0 +1,93 @@
+"""
+Backend_camara/tests/test_http.py
+
+API HTTP con ETag y long-poll (openmv_http.py).
+"""
+
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+from openmv_server import OpenMVServer
+from test_frames import CAPTURE
+
+
+# Mismo frame con otro nivel: con el nivel igual la banda muerta no lo difunde
+RISEN = CAPTURE.replace('nivel_50', 'nivel_75')
+
+
+def get(server, path, **headers):
+    request = SimpleNamespace(path=path, headers=headers)
+    return server.http_api.handle(None, request)
+
+
+def make_server():
+    server = OpenMVServer(db_path=None)
+    device = server.devices.add('cam1', '/dev/ttyACM0')
+    device.is_monitoring = True
+    return server, device
+
+
+def test_etag_answers_not_modified_without_building_the_body(monkeypatch):
+    server, device = make_server()
+    device.on_serial_chunk(CAPTURE.encode(), time.perf_counter())
+
+    async def run():
+        first = await get(server, '/api/status')
+        builds = []
+        build = server.http_api.build_status
+        monkeypatch.setattr(server.http_api, 'build_status', lambda query: builds.append(1) or build(query))
+        again = await get(server, '/api/status', **{'If-None-Match': first.headers['ETag']})
+        device.on_serial_chunk(RISEN.encode(), time.perf_counter())
+        changed = await get(server, '/api/status', **{'If-None-Match': first.headers['ETag']})
+        return first, again, changed, builds
+
+    first, again, changed, builds = asyncio.run(run())
+    body = json.loads(first.body)
+    assert first.status_code == 200
+    assert body['data']['percentage'] == 50 and body['version'] == int(first.headers['X-OpenMV-Version'])
+    assert (again.status_code, again.body) == (304, b'')
+    assert changed.status_code == 200 and changed.headers['ETag'] != first.headers['ETag']
+    assert builds == [1]
+    assert (server.http_api.requests, server.http_api.not_modified) == (3, 1)
+
+
+def test_long_poll_wakes_up_on_new_data():
+    server, device = make_server()
+
+    async def run():
+        version = int((await get(server, '/api/status')).headers['X-OpenMV-Version'])
+        started = time.monotonic()
+        poll = asyncio.ensure_future(get(server, f'/api/status?version={version}&wait=5'))
+        await asyncio.sleep(0.05)
+        assert not poll.done()
+        device.on_serial_chunk(CAPTURE.encode(), time.perf_counter())
+        response = await poll
+        return version, response, time.monotonic() - started
+
+    version, response, elapsed = asyncio.run(run())
+    assert response.status_code == 200
+    assert int(response.headers['X-OpenMV-Version']) > version
+    assert elapsed < 1.0
+    assert server.http_api.long_polls == 1
+
+
+def test_long_poll_times_out_with_not_modified():
+    server, _ = make_server()
+
+    async def run():
+        return await get(server, '/api/alerts?version=0&wait=0.05')
+
+    assert asyncio.run(run()).status_code == 304
+
+
+def test_unknown_resource_and_bad_parameters():
+    server, _ = make_server()
+
+    async def run():
+        return await get(server, '/api/nada'), await get(server, '/api/history?limit=muchos')
+
+    missing, bad = asyncio.run(run())
+    assert missing.status_code == 404
+    assert bad.status_code == 400
@@ -0,0 +1,142 @@
+"""
+Backend_camara/tests/test_keyframes.py
+
+Keyframes de tank_data para clientes delta (openmv_server.py).
+"""
+
+import asyncio
+import json
+
+from openmv_encoding import KEYFRAME_INTERVAL
+from openmv_server import OpenMVServer
+
+
+class FakeDevice:
+    device_id = 'cam1'
+    last_read_time = None
+    latest_sample = None
+
+    def __init__(self):
+        self.frame_seq = 0
+        self.percentage = 0
+
+    def snapshot(self):
+        return {'percentage': self.percentage, 'timestamp': f't{self.frame_seq}'}
+
+
+def published_types(server, seqs):
+    device = FakeDevice()
+    sent = []
+    server.broadcaster.publish = lambda kind, payload, delta_payload=None, **kwargs: sent.append(
+        'tank_delta' if delta_payload else kind
+    )
+    for seq in seqs:
+        device.frame_seq = seq
+        device.percentage = seq % 100
+        server.broadcast_tank_data(device)
+    return sent
+
+
+def make_server():
+    server = OpenMVServer(db_path=None)
+    # Un cliente delta conectado
+    server.broadcaster.channels['client'] = object()
+    return server
+
+
+def test_keyframe_every_interval():
+    sent = published_types(make_server(), range(1, 3 * KEYFRAME_INTERVAL + 1))
+    assert sent.count('tank_data') == 3
+    assert sent[0] == 'tank_data'
+
+
+def test_keyframe_when_published_seqs_skip_multiples():
+    # Con compresión solo se publican los frames impares: nunca un múltiplo de 30
+    sent = published_types(make_server(), range(1, 4 * KEYFRAME_INTERVAL, 2))
+    keyframes = [index for index, kind in enumerate(sent) if kind == 'tank_data']
+    assert keyframes[0] == 0
+    assert len(keyframes) >= 4
+    # Nunca más de KEYFRAME_INTERVAL frames de la cámara sin keyframe
+    assert max(b - a for a, b in zip(keyframes, keyframes[1:])) * 2 <= KEYFRAME_INTERVAL
+
+
+class StalledWebsocket:
+    """Cliente que no consume: la cola del canal se llena"""
+    remote_address = ('127.0.0.1', 9000)
+
+    def __init__(self):
+        self.blocked = asyncio.Event()
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(json.loads(message))
+        await self.blocked.wait()
+
+
+def apply_stream(messages, state=None):
+    """Aplicar tank_data/tank_delta como un cliente delta; falla si un delta no tiene base"""
+    for message in messages:
+        if message['type'] == 'tank_data':
+            state = (message['seq'], dict(message['data']))
+        elif message['type'] == 'tank_delta':
+            assert state is not None and message['base'] == state[0], message
+            state = (message['seq'], {**state[1], **message['data']})
+    return state
+
+
+def queued(channel):
+    return [json.loads(message) for _, message, _, _ in channel.queue]
+
+
+def test_dropped_tank_data_resyncs_with_keyframe():
+    server = OpenMVServer(db_path=None)
+    device = FakeDevice()
+
+    async def run():
+        websocket = StalledWebsocket()
+        channel = server.broadcaster.add(websocket)
+        channel.delta = True
+        # Bastante más que la cola (64): se descartan tank_data y deltas
+        for seq in range(1, 200):
+            device.frame_seq = seq
+            device.percentage = seq % 100
+            server.broadcast_tank_data(device)
+            await asyncio.sleep(0)
+            # Lo que el cliente recibiría desde acá es siempre una cadena válida...
+            state = apply_stream(websocket.sent + queued(channel))
+        server.broadcaster.remove(websocket)
+        return channel, state
+
+    channel, state = asyncio.run(run())
+    assert channel.dropped.get('tank_delta')
+    # ...que termina en el estado actual de la cámara
+    assert state == (199, device.snapshot())
+
+
+def test_snapshot_client_gets_keyframe_before_deltas():
+    server = OpenMVServer(db_path=None)
+    device = FakeDevice()
+    published = []
+    server.devices.devices['cam1'] = device
+    device.latest_data = {'timestamp': 't'}
+
+    async def run():
+        for seq in (1, 2):
+            device.frame_seq = seq
+            device.percentage = seq
+            server.broadcast_tank_data(device)
+        # La compresión no publicó el frame 3: el snapshot es más nuevo que el último publicado
+        device.frame_seq = 3
+        device.percentage = 3
+        channel = server.broadcaster.add(StalledWebsocket())
+        channel.delta = True
+        server.send_snapshot(channel)
+        device.frame_seq = 4
+        device.percentage = 4
+        server.broadcast_tank_data(device)
+        published.extend(queued(channel))
+        server.broadcaster.remove(channel.websocket)
+
+    asyncio.run(run())
+    assert [message['type'] for message in published] == ['tank_data', 'tank_data']
+    assert apply_stream(published) == (4, device.snapshot())
@@ -0,0 +1,70 @@
+"""
+Backend_camara/tests/test_logging.py
+
+Logging no bloqueante y muestreo de líneas crudas (openmv_logging.py).
+"""
+
+import logging
+import queue
+
+import pytest
+
+import openmv_logging
+from openmv_logging import DroppingQueueHandler, RawLineLog, logger, raw_log_rate
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+@pytest.fixture
+def logged():
+    handler = ListHandler()
+    level = logger.level
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    yield handler.messages
+    logger.removeHandler(handler)
+    logger.setLevel(level)
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = DroppingQueueHandler(queue.Queue(2))
+    for index in range(5):
+        handler.emit(logging.makeLogRecord({'msg': f'linea {index}'}))
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+
+
+def test_raw_lines_are_rate_limited_to_the_log(monkeypatch, logged):
+    clock = [1000.0]
+    monkeypatch.setattr(openmv_logging.time, 'monotonic', lambda: clock[0])
+    raw = RawLineLog('cam1', maxlen=3, rate=2.0)
+
+    for index in range(10):
+        raw.record(f'l{index}')
+    clock[0] += 0.5
+    raw.record('l10')
+
+    # La cubeta empieza llena (rate líneas); el resto se cuenta hasta juntar otro token
+    assert logged == ['[cam1] l0', '[cam1] l1', '[cam1] l10 (8 lineas omitidas)']
+    assert [item['line'] for item in raw.recent()] == ['l8', 'l9', 'l10']
+    assert [item['line'] for item in raw.recent(1)] == ['l10']
+
+
+def test_raw_log_rate_from_environment(monkeypatch, logged):
+    monkeypatch.setenv('OPENMV_RAW_LOG_RATE', 'all')
+    assert raw_log_rate() is None
+    monkeypatch.setenv('OPENMV_RAW_LOG_RATE', 'mucho')
+    assert raw_log_rate() == 1.0
+
+    RawLineLog('cam1', rate=0).record('silencio')
+    everything = RawLineLog('cam2', rate=None)
+    everything.record('a')
+    everything.record('b')
+    assert logged == ['[cam2] a', '[cam2] b']
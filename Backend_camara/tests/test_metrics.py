@@ -0,0 +1,71 @@
+"""
+Backend_camara/tests/test_metrics.py
+
+Métricas operativas en formato Prometheus (openmv_metrics.py).
+"""
+
+import time
+
+from openmv_broadcast import ClientChannel
+from openmv_metrics import Histogram, ServerMetrics
+from openmv_server import OpenMVServer
+from test_frames import CAPTURE
+
+
+class FakeWebsocket:
+    remote_address = ('10.0.0.7', 5555)
+
+
+def samples(text):
+    """Líneas de muestra del texto Prometheus: {nombre{labels}: valor}"""
+    result = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            result[name] = value
+    return result
+
+
+def test_histogram_buckets_and_quantiles():
+    histogram = Histogram((0.001, 0.01, 0.1))
+    for value in (0.0005, 0.002, 0.003, 0.05, 2.0):
+        histogram.observe(value)
+
+    assert histogram.cumulative() == [(0.001, 1), (0.01, 3), (0.1, 4), (float('inf'), 5)]
+    assert histogram.quantile(0.5) == 0.01
+    assert histogram.quantile(0.99) == float('inf')
+    assert Histogram().to_dict() == {'count': 0, 'avg_ms': None, 'p50_ms': None, 'p99_ms': None}
+
+
+def test_render_exposes_device_and_client_counters():
+    server = OpenMVServer(db_path=None)
+    device = server.devices.add('cam1', '/dev/ttyACM0')
+    device.is_monitoring = True
+    device.on_serial_chunk((CAPTURE * 3).encode(), time.perf_counter())
+    device.process_line('x 10\ty abc\tscore 0.5')
+
+    websocket = FakeWebsocket()
+    channel = server.broadcaster.channels[websocket] = ClientChannel(websocket, maxsize=1)
+    channel.push('tank_data', 't1', 'cam1')
+    channel.push('tank_data', 't2', 'cam1')
+    server.metrics.e2e_latency.observe(0.004)
+
+    text = server.metrics.render(server)
+    values = samples(text)
+    assert '# TYPE openmv_frames_total counter' in text
+    assert values['openmv_frames_total{device="cam1"}'] == '3'
+    assert values['openmv_serial_bytes_total{device="cam1"}'] == str(len(CAPTURE) * 3)
+    assert values['openmv_parse_errors_total{device="cam1"}'] == '1'
+    assert values['openmv_clients'] == '1'
+    assert values['openmv_client_queue_depth{client="10.0.0.7:5555"}'] == '1'
+    assert values['openmv_client_dropped_total{client="10.0.0.7:5555",kind="tank_data"}'] == '1'
+    assert values['openmv_e2e_latency_seconds_bucket{le="0.005"}'] == '1'
+    assert values['openmv_e2e_latency_seconds_count'] == '1'
+    # Sin buffer compartido ni SQLite no hay familias de ring ni de storage
+    assert 'openmv_ring_lag' not in text and 'openmv_storage_backlog' not in text
+
+
+def test_label_values_are_escaped():
+    server = OpenMVServer(db_path=None)
+    server.devices.add('cam "norte"\\1', '/dev/ttyACM0')
+    assert 'openmv_frames_total{device="cam \\"norte\\"\\\\1"} 0' in ServerMetrics().render(server)
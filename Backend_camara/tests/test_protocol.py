@@ -0,0 +1,167 @@
+"""
+Backend_camara/tests/test_protocol.py
+
+Decodificación de flujos binarios grabados de la cámara (openmv_protocol.py).
+"""
+
+import ast
+import os
+
+from openmv_protocol import (
+    BinaryFrameDecoder, cobs_decode, cobs_encode, crc16, encode_frame, encode_labels, encode_preview
+)
+
+
+# Registros tal como los envía ei_object_detection.py (capturados del puerto serie)
+LABELS = bytes.fromhex('054f4d010201146e6976656c5f32350a6e6976656c5f3530448800')  # seq 0: nivel_25, nivel_50
+FRAME_7 = bytes.fromhex('064f4d01010706e20401017802500210021004e6675200')  # 50% en (120, 80), 12.5 fps
+FRAME_8 = bytes.fromhex('064f4d01010801010103a78000')  # sin detecciones
+
+LABEL_NAMES = ['nivel_25', 'nivel_50']
+
+
+def decode_all(decoder, stream, chunk_size=None):
+    chunk_size = chunk_size or len(stream)
+    frames = []
+    for offset in range(0, len(stream), chunk_size):
+        frames.extend(decoder.feed(stream[offset:offset + chunk_size]))
+    return frames
+
+
+def test_recorded_stream():
+    decoder = BinaryFrameDecoder()
+    frames = decode_all(decoder, LABELS + FRAME_7 + FRAME_8)
+
+    assert len(frames) == 2
+    first, second = frames
+    assert first.label == 'nivel_50' and first.percentage == 50
+    assert first.fps == 12.5
+    detection = first.detections[0]
+    assert (detection.x, detection.y, detection.w, detection.h) == (120, 80, 16, 16)
+    assert detection.score == 0.902
+    assert second.detections == () and second.percentage is None
+    assert decoder.stats()['records'] == 3
+    assert decoder.lost_frames == 0
+
+
+def test_byte_by_byte_matches_whole_stream():
+    stream = LABELS + FRAME_7 + FRAME_8
+    whole = decode_all(BinaryFrameDecoder(), stream)
+    split = decode_all(BinaryFrameDecoder(), stream, chunk_size=1)
+    assert [f.to_dict()['detections'] for f in whole] == [f.to_dict()['detections'] for f in split]
+
+
+def test_wire_format_is_stable():
+    assert encode_labels(0, LABEL_NAMES) == LABELS
+    assert encode_frame(7, 12.5, [(1, 120, 80, 16, 16, 0.9)]) == FRAME_7
+    assert encode_frame(8, 0, []) == FRAME_8
+
+
+def test_corrupt_crc_is_dropped():
+    corrupt = bytearray(FRAME_7)
+    # Cambiar la x de la detección (el byte sigue siendo distinto de 0x00)
+    corrupt[11] ^= 0x01
+    decoder = BinaryFrameDecoder(LABEL_NAMES)
+    frames = decode_all(decoder, bytes(corrupt) + FRAME_8)
+
+    assert len(frames) == 1
+    assert decoder.crc_errors == 1
+    # El frame 7 se perdió pero el 8 llega sin cortar el flujo
+    assert frames[0].detections == ()
+
+
+def test_truncated_cobs_is_dropped():
+    # Registro cortado por la mitad (reinicio de la cámara) seguido de uno completo
+    truncated = FRAME_7[:8] + b'\x00'
+    decoder = BinaryFrameDecoder(LABEL_NAMES)
+    frames = decode_all(decoder, truncated + FRAME_7)
+
+    assert len(frames) == 1
+    assert frames[0].percentage == 50
+    assert decoder.decode_errors + decoder.crc_errors == 1
+
+
+def test_invalid_cobs_code():
+    decoder = BinaryFrameDecoder()
+    # El primer código apunta más allá del final del bloque
+    assert decoder.feed(b'\x09\x01\x02\x00') == []
+    assert decoder.decode_errors == 1
+
+
+def test_resync_after_garbage():
+    # Texto del modo legado y basura de arranque antes del primer delimitador
+    garbage = b'\xff\xfe OpenMV v4.5 boot\r\nnivel_50\r\n\x13\x37'
+    decoder = BinaryFrameDecoder(LABEL_NAMES)
+    frames = decode_all(decoder, garbage + b'\x00' + FRAME_7 + FRAME_8, chunk_size=5)
+
+    assert [frame.percentage for frame in frames] == [50, None]
+    assert decoder.decode_errors + decoder.crc_errors == 1
+
+
+def test_oversized_garbage_without_delimiter_is_discarded():
+    decoder = BinaryFrameDecoder(LABEL_NAMES)
+    assert decoder.feed(b'\x01' * 20000) == []
+    assert decoder.decode_errors == 1
+    # El siguiente delimitador termina el resto de basura y el flujo sigue
+    assert len(decoder.feed(b'\x00' + FRAME_7)) == 1
+
+
+def test_lost_frames_counted_from_seq_gap():
+    decoder = BinaryFrameDecoder()
+    decode_all(decoder, encode_frame(1, 10, []) + encode_frame(4, 10, []))
+    assert decoder.lost_frames == 2
+
+
+def test_out_of_range_values_are_masked():
+    record = encode_frame(1, 10, [(300, -1, 70000, 2.0, 16, 1.7)])
+    frame = BinaryFrameDecoder().feed(record)[0]
+    detection = frame.detections[0]
+    assert (detection.x, detection.y, detection.w) == (0xFFFF, 70000 & 0xFFFF, 2)
+    assert detection.score == 1.0
+
+
+def test_preview_reassembly():
+    jpeg = bytes(range(256)) * 10
+    previews = []
+    decoder = BinaryFrameDecoder(on_preview=previews.append)
+    stream = b''.join(encode_preview(5, jpeg, chunk_size=300))
+    decode_all(decoder, stream, chunk_size=64)
+
+    assert len(previews) == 1
+    assert previews[0].seq == 5 and previews[0].jpeg == jpeg
+
+
+def test_cobs_round_trip():
+    for data in (b'', b'\x00', b'\x00\x00', bytes(range(1, 255)), bytes(range(256)) * 3):
+        encoded = cobs_encode(data)
+        assert b'\x00' not in encoded
+        assert cobs_decode(encoded) == data
+
+
+def camera_functions(*names, **globals_):
+    """Funciones del script de la cámara (no se puede importar: usa sensor, ml, ...)"""
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ei_object_detection.py')
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    wanted = set(names) | {'_crc16_table'}
+    nodes = [
+        node for node in tree.body
+        if (isinstance(node, ast.FunctionDef) and node.name in wanted)
+        or (isinstance(node, ast.Assign) and node.targets[0].id == 'CRC16_TABLE')
+    ]
+    namespace = dict(globals_)
+    exec(compile(ast.Module(nodes, type_ignores=[]), path, 'exec'), namespace)
+    return [namespace[name] for name in names]
+
+
+def test_camera_encoders_match_host():
+    camera_crc16, camera_cobs = camera_functions('crc16', 'cobs_encode')
+    samples = [
+        b'', b'\x00', b'\x00\x00', b'\x01' * 253, b'\x01' * 254, b'\x01' * 255, b'\x01' * 254 + b'\x00',
+        bytes(range(256)) * 3, b'\x05', b'\x05\x00', b'\x00\x05', bytes([254, 0, 0]) * 50,
+        # Tensor FOMO típico: casi todo ceros con algunos picos
+        bytes(200 if index % 97 < 4 else 0 for index in range(12 * 12 * 3 * 33)),
+    ]
+    for data in samples:
+        assert camera_crc16(data) == crc16(data)
+        assert bytes(camera_cobs(data)) == cobs_encode(data)
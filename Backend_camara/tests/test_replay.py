@@ -0,0 +1,78 @@
+"""
+Backend_camara/tests/test_replay.py
+
+Grabación y reproducción del flujo serie crudo (openmv_replay.py).
+"""
+
+import asyncio
+
+import pytest
+
+from openmv_replay import MAX_CHUNK, CaptureWriter, ReplayTransport, capture_path, iter_capture
+from openmv_serial import LineSplitter
+
+
+CHUNKS = [b'FPS: 12.5\nnivel_', b'50: 0.91\n\n', b'\x00\xff binario', b'x' * (MAX_CHUNK + 10)]
+
+
+def write_capture(path, chunks=CHUNKS):
+    writer = CaptureWriter(path)
+    for index, chunk in enumerate(chunks):
+        writer.write(chunk, 100.0 + index * 0.25)
+    writer.close()
+    return writer
+
+
+def test_capture_round_trip_keeps_bytes_and_timing(tmp_path):
+    path = tmp_path / 'cam1.omcap'
+    writer = write_capture(path)
+    assert (writer.chunks, writer.bytes) == (4, sum(map(len, CHUNKS)))
+
+    records = list(iter_capture(path))
+    # El bloque largo se parte en dos registros; el segundo no agrega espera
+    assert [delay for delay, _ in records] == [0.0, 0.25, 0.25, 0.25, 0.0]
+    assert [len(chunk) for _, chunk in records][-2:] == [MAX_CHUNK, 10]
+    assert b''.join(chunk for _, chunk in records) == b''.join(CHUNKS)
+
+
+def test_capture_path_is_safe_for_any_device_id(tmp_path):
+    path = capture_path(str(tmp_path), '/dev/ttyACM0')
+    assert path.startswith(str(tmp_path / '_dev_ttyACM0-'))
+    assert path.endswith('.omcap')
+
+
+def test_replay_as_fast_as_possible_feeds_the_parser(tmp_path):
+    path = tmp_path / 'cam1.omcap'
+    write_capture(path, CHUNKS[:2])
+    splitter = LineSplitter()
+    lines = []
+
+    async def run():
+        transport = ReplayTransport(
+            asyncio.get_running_loop(), path, lambda chunk, _: lines.extend(splitter.feed(chunk)), speed=0
+        )
+        transport.start()
+        while not transport.finished:
+            await asyncio.sleep(0.001)
+        return transport
+
+    transport = asyncio.run(run())
+    assert transport.chunks == 2
+    assert lines == ['FPS: 12.5', 'nivel_50: 0.91', '']
+
+
+def test_replay_reports_invalid_capture(tmp_path):
+    path = tmp_path / 'otra.omcap'
+    path.write_bytes(b'no es una captura')
+    errors = []
+
+    async def run():
+        transport = ReplayTransport(asyncio.get_running_loop(), path, None, errors.append, speed=0)
+        transport.start()
+        await asyncio.sleep(0.01)
+        return transport
+
+    assert asyncio.run(run()).finished
+    assert len(errors) == 1 and isinstance(errors[0], ValueError)
+    with pytest.raises(ValueError):
+        list(iter_capture(path))
@@ -0,0 +1,116 @@
+"""
+Backend_camara/tests/test_ring.py
+
+Buffer compartido entre la ingestión y los procesos websocket (openmv_ring.py).
+"""
+
+import pytest
+
+from openmv_ring import RingReader, RingWriter
+
+
+@pytest.fixture
+def ring():
+    writer = RingWriter(slots=16, slot_size=256)
+    reader = RingReader(writer.name)
+    yield writer, reader
+    reader.close()
+    writer.close()
+
+
+def test_small_messages(ring):
+    writer, reader = ring
+    writer.publish('tank_data', '{"a": 1}', 'cam1', 1.5, stream_seq=7)
+    writer.publish('alert', b'{"b": 2}', None, None, stream_seq=8)
+
+    entries = reader.poll()
+    assert [(e[1], e[2], e[3], e[5]) for e in entries] == [
+        (7, 'tank_data', 'cam1', b'{"a": 1}'),
+        (8, 'alert', None, b'{"b": 2}'),
+    ]
+    assert entries[0][4] == 1.5
+    assert reader.fragmented == 0
+
+
+def test_message_larger_than_a_slot_is_reassembled(ring):
+    writer, reader = ring
+    # Un tank_data con muchas detecciones ocupa varios slots
+    big = ('{"detections": [' + ', '.join('{"x": %d}' % i for i in range(100)) + ']}').encode()
+    assert len(big) > writer.slot_size
+    writer.publish('tank_data', big, 'cam1', stream_seq=3)
+    writer.publish('tank_data', b'{}', 'cam1', stream_seq=4)
+
+    entries = reader.poll()
+    assert [(e[1], e[5]) for e in entries] == [(3, big), (4, b'{}')]
+    assert reader.fragmented == 1 and reader.oversized == 0
+    assert reader.lost == 0
+
+
+def test_fragments_split_across_polls(ring):
+    writer, reader = ring
+    big = bytes(range(48, 58)) * 60
+    writer.publish('tank_data', big, 'cam1', stream_seq=1)
+    writer.publish('status', b'{}', stream_seq=2)
+
+    entries = []
+    while True:
+        chunk = reader.poll(limit=1)
+        if not chunk:
+            break
+        entries.extend(chunk)
+    assert [e[5] for e in entries] == [big, b'{}']
+
+
+def test_oversized_message_is_counted(ring):
+    writer, reader = ring
+    writer.publish('tank_data', b'x' * (writer.slot_size * writer.slots), 'cam1', stream_seq=1)
+    writer.publish('tank_data', b'{}', 'cam1', stream_seq=2)
+
+    assert writer.oversized == 1
+    # El contador viaja en la cabecera: los lectores de otros procesos lo ven
+    assert reader.oversized == 1
+    assert [e[1] for e in reader.poll()] == [2]
+
+
+def test_reader_that_starts_mid_message_skips_it():
+    writer = RingWriter(slots=16, slot_size=128)
+    try:
+        for seq in range(1, 6):
+            writer.publish('tank_data', bytes([48 + seq]) * 300, 'cam1', stream_seq=seq)
+        # El más antiguo disponible cae en medio de un mensaje fragmentado
+        reader = RingReader(writer.name)
+        entries = reader.poll()
+        assert entries
+        assert all(e[5] == bytes([48 + e[1]]) * 300 for e in entries)
+        assert entries[-1][1] == 5
+        reader.close()
+    finally:
+        writer.close()
+
+
+def test_lagging_reader_drops_partial_message():
+    writer = RingWriter(slots=8, slot_size=128)
+    reader = RingReader(writer.name)
+    try:
+        for seq in range(1, 20):
+            writer.publish('tank_data', bytes([65 + seq % 26]) * 200, 'cam1', stream_seq=seq)
+        entries = reader.poll()
+        assert reader.lost > 0
+        assert all(e[5] == bytes([65 + e[1] % 26]) * 200 for e in entries)
+        assert entries[-1][1] == 19
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_sample_travels_in_every_fragment(ring):
+    writer, reader = ring
+    sample = (1700000000.25, 50, 12.5, 120, 80, 0.902, 1)
+    empty = (1700000001.0, None, None, None, None, None, 0)
+    writer.publish('tank_data', b'x' * 600, 'cam1', stream_seq=1, sample=sample)
+    writer.publish('tank_data', b'{}', 'cam1', stream_seq=2, sample=empty)
+    writer.publish('alert', b'{}', stream_seq=3)
+
+    entries = reader.poll()
+    assert [(e[5], e[6]) for e in entries] == [(b'x' * 600, sample), (b'{}', empty), (b'{}', None)]
+    assert reader.fragmented == 1
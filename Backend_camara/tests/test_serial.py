@@ -0,0 +1,66 @@
+"""
+Backend_camara/tests/test_serial.py
+
+Lectura del puerto serie en bloques (openmv_serial.py).
+"""
+
+import asyncio
+import os
+
+import pytest
+import serial
+
+from openmv_serial import LineSplitter, SerialTransport
+
+
+def test_lines_split_across_chunks():
+    splitter = LineSplitter()
+    assert splitter.feed(b'x 120\ty 8') == []
+    assert splitter.feed(b'0\tscore 0.902\r\nFPS: 12.5\n\nnivel') == ['x 120\ty 80\tscore 0.902', 'FPS: 12.5', '']
+    assert splitter.feed(b'_50\n') == ['nivel_50']
+
+
+def test_garbage_without_newline_is_bounded():
+    splitter = LineSplitter(max_line_length=16)
+    assert splitter.feed(b'\xff' * 32) == []
+    # La basura se descartó: la siguiente línea sale limpia
+    assert splitter.feed(b'FPS: 2.0\n') == ['FPS: 2.0']
+
+    splitter.feed(b'resto')
+    splitter.reset()
+    assert splitter.feed(b'ok\n') == ['ok']
+
+
+def test_invalid_utf8_is_ignored():
+    assert LineSplitter().feed(b'nivel\xff_25\n') == ['nivel_25']
+
+
+@pytest.mark.skipif(not hasattr(os, 'openpty'), reason="requiere pseudo-terminales")
+def test_transport_reads_bulk_chunks_on_the_event_loop():
+    master, slave = os.openpty()
+    port = serial.Serial(os.ttyname(slave), 115200, timeout=0)
+    chunks = []
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        transport = SerialTransport(loop, port, lambda chunk, read_time: chunks.append(chunk))
+        transport.start()
+        os.write(master, b'********** nivel_50 **********\n' * 20)
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if sum(map(len, chunks)) >= 31 * 20:
+                break
+        transport.stop()
+        return transport.mode
+
+    try:
+        mode = asyncio.run(run())
+    finally:
+        port.close()
+        os.close(master)
+        os.close(slave)
+
+    assert mode == 'event_loop'
+    assert b''.join(chunks) == b'********** nivel_50 **********\n' * 20
+    # Todo lo que esperaba en el puerto se lee de una vez, no byte a byte
+    assert len(chunks) < 20
@@ -0,0 +1,192 @@
+"""
+Backend_camara/tests/test_storage.py
+
+Escritor de SQLite en lotes (openmv_storage.py).
+"""
+
+import sqlite3
+import time
+
+from openmv_compression import SampleFilter
+from openmv_frames import Detection, Frame
+from openmv_history import history_chunks
+from openmv_storage import SCHEMA, PersistenceWriter, ensure_schema, from_db_time, to_db_time
+
+
+# 2024-05-01 10:00:00 UTC, al comienzo de un minuto y de una hora
+T0 = 1714557600.0
+
+
+def frame(percentage, timestamp, fps=10.0, detections=1):
+    label = f"nivel_{percentage}"
+    return Frame(label, percentage, (Detection(label, 10, 20, 0.9),) * detections, fps, timestamp)
+
+
+def rollup(db_path, table):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(
+            f'SELECT bucket, count, percentage_sum, percentage_min, percentage_max, detections '
+            f'FROM {table} ORDER BY bucket'
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def test_rollups_use_every_frame_not_only_archived(tmp_path):
+    db_path = str(tmp_path / 'datos.db')
+    writer = PersistenceWriter(db_path, flush_interval=0.05)
+    writer.start()
+
+    # Rampa lenta con ruido de ±1: la compresión guarda pocos vértices
+    sample_filter = SampleFilter(deadband=2, deviation=2, heartbeat=3600)
+    frames = [frame(40 + index // 20 + (index % 3 == 0), T0 + index * 1.0) for index in range(200)]
+    for item in frames:
+        _, archive = sample_filter.update(item)
+        writer.put_frame('cam1', item, archive)
+    writer.stop()
+
+    assert writer.readings_written == sample_filter.archived < len(frames)
+    percentages = [item.percentage for item in frames]
+    # 200 frames cada segundo: tres minutos completos y uno parcial
+    minutes = rollup(db_path, 'readings_1m')
+    assert [row[1] for row in minutes] == [60, 60, 60, 20]
+    assert sum(row[2] for row in minutes) == sum(percentages)
+    assert rollup(db_path, 'readings_1h') == [
+        (int(T0), 200, sum(percentages), min(percentages), max(percentages), 200)
+    ]
+
+
+def query(db_path, sql):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def test_frames_are_written_in_batches(tmp_path):
+    db_path = str(tmp_path / 'datos.db')
+    writer = PersistenceWriter(db_path, batch_size=50, flush_interval=60)
+    for index in range(120):
+        writer.put_frame('cam1', frame(index % 100, T0 + index))
+    writer.start()
+    # Dos lotes llenos sin esperar flush_interval; el resto queda pendiente
+    for _ in range(100):
+        if writer.readings_written >= 100:
+            break
+        time.sleep(0.01)
+    assert (writer.readings_written, writer.batches) == (100, 2)
+
+    writer.stop()
+    assert (writer.readings_written, writer.batches) == (120, 3)
+    rows = query(db_path, 'SELECT device_id, percentage, timestamp, detection_count FROM readings ORDER BY id')
+    assert len(rows) == 120
+    assert rows[1][:2] == ('cam1', 1) and rows[1][3] == 1
+    assert from_db_time(rows[1][2]) == T0 + 1
+
+
+def test_flush_interval_bounds_latency(tmp_path):
+    db_path = str(tmp_path / 'datos.db')
+    writer = PersistenceWriter(db_path, batch_size=1000, flush_interval=0.05)
+    writer.start()
+    writer.put_frame('cam1', frame(50, T0))
+    for _ in range(100):
+        if writer.readings_written:
+            break
+        time.sleep(0.01)
+    writer.stop()
+    assert writer.readings_written == 1
+
+
+def test_alerts_and_frames_without_level(tmp_path):
+    db_path = str(tmp_path / 'datos.db')
+    writer = PersistenceWriter(db_path)
+    writer.start()
+    writer.put_frame('cam1', frame(None, T0, detections=0))
+    writer.put_alert({'device_id': 'cam1', 'level': 'critical', 'message': 'Nivel critico',
+                      'percentage': 95, 'timestamp': '2024-05-01T10:00:00+00:00'})
+    writer.stop()
+
+    assert query(db_path, 'SELECT COUNT(*) FROM readings') == [(0,)]
+    assert query(db_path, 'SELECT device_id, level, percentage, timestamp FROM alerts') == [
+        ('cam1', 'critical', 95, '2024-05-01 10:00:00.000000')
+    ]
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    writer = PersistenceWriter(str(tmp_path / 'datos.db'), max_queue=5)
+    for index in range(8):
+        writer.put_frame('cam1', frame(50, T0 + index))
+    assert (writer.backlog, writer.dropped) == (5, 3)
+
+
+def columns(conn, table):
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def test_migration_adds_columns_and_backfills_rollups(tmp_path):
+    db_path = str(tmp_path / 'original.db')
+    conn = sqlite3.connect(db_path)
+    for statement in SCHEMA:
+        conn.execute(statement)
+    # Base anterior a multi-cámara: 90 lecturas en un minuto y medio
+    conn.executemany(
+        'INSERT INTO readings (percentage, fps, timestamp) VALUES (?, ?, ?)',
+        [(index % 10, 2.0, to_db_time(T0 + index + 0.5)) for index in range(90)]
+    )
+    conn.commit()
+
+    ensure_schema(conn)
+    # Volver a abrir no repite la migración ni el recálculo
+    ensure_schema(conn)
+
+    assert {'device_id', 'detection_count'} <= columns(conn, 'readings')
+    assert 'device_id' in columns(conn, 'alerts')
+    assert conn.execute(
+        'SELECT device_id, bucket, count, percentage_min, percentage_max, fps_count FROM readings_1m ORDER BY bucket'
+    ).fetchall() == [('', int(T0), 60, 0, 9, 60), ('', int(T0) + 60, 30, 0, 9, 30)]
+    assert conn.execute('SELECT count, percentage_sum FROM readings_1h').fetchall() == [(90, 405.0)]
+    conn.close()
+
+
+def test_retention_expires_raw_rows_and_minute_rollups(tmp_path):
+    db_path = str(tmp_path / 'datos.db')
+    writer = PersistenceWriter(db_path, retention_days=1, rollup_retention_days=2, flush_interval=0.05)
+    writer.start()
+    day = 86400
+    # Hace 3 días, hace 36 horas y ahora
+    now = T0 + 10 * day
+    for age in (3 * day, 1.5 * day, 0):
+        writer.put_frame('cam1', frame(50, now - age))
+    writer.stop()
+
+    conn = sqlite3.connect(db_path)
+    try:
+        assert writer.apply_retention(conn, now=now) == 3
+        # Crudas: solo la de ahora; por minuto: hasta 2 días; por hora: todo
+        assert [from_db_time(t) for t, in conn.execute('SELECT timestamp FROM readings')] == [now]
+        assert conn.execute('SELECT COUNT(*) FROM readings_1m').fetchone() == (2,)
+        assert conn.execute('SELECT COUNT(*) FROM readings_1h').fetchone() == (3,)
+    finally:
+        conn.close()
+    assert writer.rows_expired == 3
+
+
+def test_long_ranges_are_served_from_rollups(tmp_path):
+    db_path = str(tmp_path / 'datos.db')
+    writer = PersistenceWriter(db_path)
+    writer.start()
+    # Una lectura cada 10 s durante 6 horas
+    for index in range(6 * 360):
+        writer.put_frame('cam1', frame(index % 100, T0 + index * 10))
+    writer.stop()
+
+    chunks = history_chunks(db_path, 'cam1', T0, T0 + 6 * 3600, points=300)
+    assert next(chunks) == {'total': 2160, 'points': 300, 'source': 'readings_1m'}
+    points = [point for chunk in chunks for point in chunk]
+    assert sum(point['count'] for point in points) == 2160
+    assert points[0]['fps'] == 10.0 and points[0]['detections'] == points[0]['count']
+
+    chunks = history_chunks(db_path, 'cam1', T0, T0 + 6 * 3600, points=5)
+    assert next(chunks)['source'] == 'readings_1h'
@@ -5,6 +5,8 @@ export default function Alertas() {
   const [isConnected, setIsConnected] = useState(false);
   const [filterLevel, setFilterLevel] = useState('all');
   const wsRef = useRef(null);
+  // Posición en el stream del servidor para reanudar al reconectar
+  const streamRef = useRef({ stream: null, seq: null });
 
   useEffect(() => {
     connectWebSocket();
@@ -18,7 +20,10 @@ export default function Alertas() {
 
   const connectWebSocket = () => {
     try {
-      const ws = new WebSocket('ws://localhost:8765');
+      // Al reconectar se piden solo las actualizaciones perdidas
+      const { stream, seq } = streamRef.current;
+      const query = seq !== null ? `?resume=${seq}&stream=${stream}` : '';
+      const ws = new WebSocket(`ws://localhost:8765/${query}`);
       
       ws.onopen = () => {
         console.log('Conectado al servidor de alertas');
@@ -28,6 +33,16 @@ export default function Alertas() {
       ws.onmessage = (event) => {
         try {
           const data = JSON.parse(event.data);
+
+          if (data.type === 'connection') {
+            // Sin reanudación (primera conexión o snapshot) se parte de la posición actual
+            if (data.resumed === null || data.resumed === undefined) {
+              streamRef.current.seq = data.stream_seq;
+            }
+            streamRef.current.stream = data.stream;
+          } else if (data.stream_seq > streamRef.current.seq) {
+            streamRef.current.seq = data.stream_seq;
+          }
           
           // Solo procesar alertas críticas y de advertencia
           if (data.type === 'alert' && data.data.level !== 'info') {
@@ -14,6 +14,8 @@ export default function Visualizacion() {
   const wsRef = useRef(null);
   const reconnectTimeoutRef = useRef(null);
   const monitoringStartTime = useRef(null);
+  // Posición en el stream del servidor para reanudar al reconectar
+  const streamRef = useRef({ stream: null, seq: null });
 
   // Conectar al WebSocket
   useEffect(() => {
@@ -31,7 +33,10 @@ export default function Visualizacion() {
 
   const connectWebSocket = () => {
     try {
-      const ws = new WebSocket('ws://localhost:8765');
+      // Al reconectar se piden solo las actualizaciones perdidas
+      const { stream, seq } = streamRef.current;
+      const query = seq !== null ? `?resume=${seq}&stream=${stream}` : '';
+      const ws = new WebSocket(`ws://localhost:8765/${query}`);
       
       ws.onopen = () => {
         console.log('✓ Conectado al servidor OpenMV');
@@ -43,6 +48,16 @@ export default function Visualizacion() {
       ws.onmessage = (event) => {
         try {
           const data = JSON.parse(event.data);
+
+          if (data.type === 'connection') {
+            // Sin reanudación (primera conexión o snapshot) se parte de la posición actual
+            if (data.resumed === null || data.resumed === undefined) {
+              streamRef.current.seq = data.stream_seq;
+            }
+            streamRef.current.stream = data.stream;
+          } else if (data.stream_seq > streamRef.current.seq) {
+            streamRef.current.seq = data.stream_seq;
+          }
           
           switch(data.type) {
             case 'connection':